@@ -0,0 +1,211 @@
+import glob
+import json
+import os
+import threading
+import time
+
+from order_book import CurrentOrderBook
+from order_store import get_order_store, STORAGE_BACKEND
+from persistence import get_persistence_worker
+
+WAL_FILE = 'current_orders.wal'
+CURRENT_ORDERS_FILE = 'current_orders.json'
+# The checkpoint before the current one, read if the current one is damaged
+CURRENT_ORDERS_BACKUP = CURRENT_ORDERS_FILE + '.bak'
+# Mutations logged before the whole book is checkpointed and the log rotated;
+# this bounds how much has to be replayed at startup
+CHECKPOINT_EVERY = 200
+
+
+class CurrentOrdersWAL:
+    """Write-ahead log for the open-orders book.
+
+    Every add / status change / remove is appended as one small JSON line and
+    flushed immediately (fsync is batched on the persistence worker), so a
+    mutation costs a few bytes instead of rewriting current_orders.json.
+    Every CHECKPOINT_EVERY records the log is rotated and the full book is
+    saved through save_snapshot(orders, on_done=...).  Rotated logs are kept
+    until the checkpoint after the one covering them is saved, so the previous
+    checkpoint (kept as a backup) plus the logs on disk is also complete.
+    Replaying is idempotent (each record sets or deletes one order), so
+    recovering from "checkpoint + every log still on disk" is always correct,
+    even if a crash hit between checkpoint and cleanup.
+    """
+
+    def __init__(self, save_snapshot, path=WAL_FILE, checkpoint_every=CHECKPOINT_EVERY):
+        self.save_snapshot = save_snapshot
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self._lock = threading.Lock()
+        self._file = None
+        self._generation = 0
+        self._saved_generation = 0  # Logs up to this one are in the last saved checkpoint
+        self.records_since_checkpoint = 0
+
+    # ----- recovery ---------------------------------------------------------
+
+    def _log_paths(self):
+        rotated = [p for p in glob.glob(self.path + '.*') if p.rsplit('.', 1)[1].isdigit()]
+        rotated.sort(key=lambda p: int(p.rsplit('.', 1)[1]))
+        return rotated + ([self.path] if os.path.exists(self.path) else [])
+
+    def recover(self, checkpoint_orders):
+        book = CurrentOrderBook(checkpoint_orders)
+        replayed = 0
+        for path in self._log_paths():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn final record from a crash mid-write
+                        print(f"Skipping corrupt WAL record in {path}")
+                        continue
+                    self._apply(book, record)
+                    replayed += 1
+        rotated = [p for p in self._log_paths() if p != self.path]
+        self._generation = max([int(p.rsplit('.', 1)[1]) for p in rotated], default=0)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        book.journal = self
+        print(f"Recovered {len(book)} current orders ({replayed} WAL records replayed).")  # Debug print
+        if replayed:
+            self.checkpoint(book)
+        return book
+
+    def _apply(self, book, record):
+        op = record.get('op')
+        if op == 'add':
+            # The checkpoint may already hold this order; replay overwrites it
+            book.add(record['order'], replace=True)
+        elif op == 'status':
+            book.update_status(record['order_number'], record['status'])
+        elif op == 'remove':
+            book.remove(record['order_number'])
+
+    # ----- logging ----------------------------------------------------------
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+        self.records_since_checkpoint += 1
+        get_persistence_worker().submit(('fsync', self.path), self._fsync)
+
+    def _fsync(self):
+        with self._lock:
+            if self._file and not self._file.closed:
+                os.fsync(self._file.fileno())
+
+    def log_add(self, order):
+        self._append({'op': 'add', 'order': order})
+
+    def log_status(self, order_number, status):
+        self._append({'op': 'status', 'order_number': order_number, 'status': status})
+
+    def log_remove(self, order_number):
+        self._append({'op': 'remove', 'order_number': order_number})
+
+    def needs_checkpoint(self):
+        return self.records_since_checkpoint >= self.checkpoint_every
+
+    # ----- checkpointing ----------------------------------------------------
+
+    def checkpoint(self, book):
+        # Rotate first so records logged from now on land in a fresh file,
+        # then save the snapshot; old logs go only after the save is done
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._generation += 1
+            generation = self._generation
+            os.replace(self.path, f"{self.path}.{generation}")
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self.records_since_checkpoint = 0
+        self.save_snapshot(book.to_list(), on_done=lambda: self._checkpoint_saved(generation))
+
+    def _checkpoint_saved(self, generation):
+        # The checkpoint this one replaced is now the backup: only the logs it
+        # already covers can go, the newer ones are needed to replay onto it
+        obsolete = [p for p in self._log_paths()
+                    if p != self.path and int(p.rsplit('.', 1)[1]) <= self._saved_generation]
+        self._saved_generation = max(self._saved_generation, generation)
+        get_persistence_worker().submit(None, self._remove_logs, obsolete)
+
+    def _remove_logs(self, paths):
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self):
+        with self._lock:
+            if self._file and not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+
+def save_current_orders(orders, on_done=None):
+    # Full checkpoint of the open orders (individual changes go to the WAL).
+    # Written in the background; a newer snapshot replaces one still waiting.
+    # The dicts are copied so later status changes can't race the writer.
+    snapshot = [dict(order) for order in orders]
+    worker = get_persistence_worker()
+    if STORAGE_BACKEND == 'sqlite':
+        worker.submit('current_orders', get_order_store().save_current_orders, snapshot, on_done=on_done)
+        return
+    print("Saving current orders checkpoint.")  # Debug print
+    worker.submit(('json', CURRENT_ORDERS_FILE), write_checkpoint, snapshot, on_done=on_done)
+
+
+def write_checkpoint(orders):
+    # Like write_json_atomic, but the checkpoint being replaced becomes the backup
+    tmp_path = CURRENT_ORDERS_FILE + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(orders, f, ensure_ascii=False, indent=4, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    if os.path.exists(CURRENT_ORDERS_FILE):
+        os.replace(CURRENT_ORDERS_FILE, CURRENT_ORDERS_BACKUP)
+    os.replace(tmp_path, CURRENT_ORDERS_FILE)
+
+
+def load_current_orders():
+    if STORAGE_BACKEND == 'sqlite':
+        return get_order_store().load_current_orders()
+
+    if not os.path.exists(CURRENT_ORDERS_FILE) and not os.path.exists(CURRENT_ORDERS_BACKUP):
+        print("current_orders.json does not exist. Creating an empty file.")  # Debug print
+        save_current_orders([])  # Create an empty file if it doesn't exist
+        return []
+
+    if os.path.exists(CURRENT_ORDERS_FILE):
+        try:
+            with open(CURRENT_ORDERS_FILE, 'r', encoding='utf-8') as f:
+                orders = json.load(f)
+            print(f"Loaded {len(orders)} current orders.")  # Debug print
+            return orders
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            # Keep the damaged file for inspection instead of overwriting it at the
+            # next checkpoint, and fall back to the backup below
+            corrupt_path = f"{CURRENT_ORDERS_FILE}.corrupt-{time.strftime('%Y%m%d_%H%M%S')}"
+            os.replace(CURRENT_ORDERS_FILE, corrupt_path)
+            print(f"Error decoding JSON. Moved the file to {corrupt_path}.")  # Debug print
+
+    # No usable checkpoint (damaged, or a crash between the two renames in
+    # write_checkpoint): the backup plus the WAL replay restores the open orders
+    if os.path.exists(CURRENT_ORDERS_BACKUP):
+        try:
+            with open(CURRENT_ORDERS_BACKUP, 'r', encoding='utf-8') as f:
+                orders = json.load(f)
+            print(f"Loaded {len(orders)} current orders from {CURRENT_ORDERS_BACKUP}.")  # Debug print
+            return orders
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            print(f"Error decoding JSON in {CURRENT_ORDERS_BACKUP}.")  # Debug print
+    return []
+
+
+def open_current_orders():
+    # Last checkpoint plus the write-ahead log of changes made since
+    return CurrentOrdersWAL(save_current_orders).recover(load_current_orders())
@@ -0,0 +1,95 @@
+import threading
+from collections import deque
+
+from order_events import order_id_for
+from order_search import normalize_phone
+from order_store import OrderFeed
+from persistence import get_persistence_worker
+
+# Most recent orders kept per customer for the delivery dialog
+HISTORY_SIZE = 10
+
+
+class Customer:
+    __slots__ = ('phone', 'address', 'delivery_fee', 'order_count', 'total_spent', 'last_order', 'history')
+
+    def __init__(self, phone):
+        self.phone = phone
+        self.address = None
+        self.delivery_fee = None
+        self.order_count = 0
+        self.total_spent = 0.0
+        self.last_order = None  # datetime of the latest order
+        self.history = deque(maxlen=HISTORY_SIZE)  # (order_number, datetime, total), oldest first
+
+
+class CustomerDirectory:
+    """Delivery customers by normalized phone number.
+
+    Built from the order history by one streaming pass through an OrderFeed
+    (the first catch_up(), run by the startup loader), then kept current the same
+    way: save_order() schedules a catch-up on the persistence worker right
+    after the append, which reads only the new orders.  Every order counts
+    once, when it is placed; later status changes are skipped.  The latest
+    order with an address or fee wins, so a customer who moved gets the new
+    address next time.  lookup() is a dict access on the main thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.customers = {}  # normalized phone -> Customer
+        self._counted = set()  # order_ids already added
+        self._catch_up_lock = threading.Lock()  # The startup loader and the worker may both catch up
+        self.feed = OrderFeed()
+        self.ready = False  # True once the history has been read
+
+    def schedule(self):
+        # Coalesced: one pending catch-up covers every order saved before it runs
+        get_persistence_worker().submit(('customer_directory',), self.catch_up)
+
+    def catch_up(self):
+        with self._catch_up_lock:
+            for order in self.feed.read():
+                self.add_order(order)
+        self.ready = True
+
+    def add_order(self, order):
+        phone = normalize_phone(order.get('phone_number'))
+        if not phone:
+            return
+        order_id = order_id_for(order)
+        with self._lock:
+            if order_id in self._counted:
+                return
+            self._counted.add(order_id)
+            customer = self.customers.get(phone)
+            if customer is None:
+                customer = self.customers[phone] = Customer(phone)
+            placed = order.get('datetime') or ''
+            if customer.last_order is None or placed >= customer.last_order:
+                customer.last_order = placed
+                if order.get('delivery_location'):
+                    customer.address = order['delivery_location']
+                if order.get('delivery_fee') is not None:
+                    customer.delivery_fee = order['delivery_fee']
+                customer.history.append((order.get('order_number'), placed, order.get('total') or 0.0))
+            customer.order_count += 1
+            customer.total_spent += order.get('total') or 0.0
+
+    def lookup(self, phone):
+        phone = normalize_phone(phone)
+        with self._lock:
+            return self.customers.get(phone) if phone else None
+
+
+_customer_directory = None
+_customer_directory_lock = threading.Lock()  # Also created by the startup loader thread
+
+
+def get_customer_directory():
+    global _customer_directory
+    if _customer_directory is None:
+        with _customer_directory_lock:
+            if _customer_directory is None:
+                _customer_directory = CustomerDirectory()
+    return _customer_directory
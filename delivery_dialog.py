@@ -0,0 +1,108 @@
+import tkinter as tk
+from tkinter import messagebox
+
+from customer_directory import get_customer_directory
+
+GLOBAL_FONT = ("Tajawal", 12)
+
+
+class DeliveryDialog:
+    """Phone, address and fee for a delivery order in one modal window.
+
+    The phone comes first: as soon as it matches a known customer the
+    address and the last delivery fee are filled in and the customer's
+    recent orders are listed.  Fields the cashier already typed into are
+    left alone.  After the window closes, result is (address, phone, fee),
+    or None when it was cancelled.
+    """
+
+    def __init__(self, master):
+        self.result = None
+        self.directory = get_customer_directory()
+        self.edited = set()  # Fields typed into by hand; autofill skips them
+        self.autofilling = False
+
+        self.window = tk.Toplevel(master)
+        self.window.title("بيانات التوصيل")
+        self.window.configure(bg="#ecf0f1")
+        self.window.transient(master)
+        self.window.resizable(False, False)
+
+        form = tk.Frame(self.window, bg="#ecf0f1")
+        form.pack(fill="x", padx=20, pady=(20, 10))
+        self.phone_var = tk.StringVar()
+        self.address_var = tk.StringVar()
+        self.fee_var = tk.StringVar()
+        for row, (label, var, name) in enumerate((("رقم الهاتف:", self.phone_var, 'phone'),
+                                                  ("عنوان التوصيل:", self.address_var, 'address'),
+                                                  ("رسوم التوصيل:", self.fee_var, 'fee'))):
+            tk.Label(form, text=label, font=GLOBAL_FONT, bg="#ecf0f1").grid(row=row, column=1, sticky="e", pady=5)
+            entry = tk.Entry(form, textvariable=var, font=GLOBAL_FONT, width=40, justify="right")
+            entry.grid(row=row, column=0, sticky="ew", padx=(0, 10), pady=5)
+            entry.bind("<Return>", self.confirm)
+            if name == 'phone':
+                self.phone_entry = entry
+            else:
+                var.trace_add("write", lambda *args, n=name: self.on_edit(n))
+        self.phone_var.trace_add("write", self.on_phone_change)
+
+        self.customer_label = tk.Label(self.window, text="", font=GLOBAL_FONT, bg="#ecf0f1", fg="#2980b9",
+                                       justify="right")
+        self.customer_label.pack(fill="x", padx=20)
+        self.history_list = tk.Listbox(self.window, font=GLOBAL_FONT, height=6, justify="right")
+        self.history_list.pack(fill="x", padx=20, pady=5)
+
+        buttons = tk.Frame(self.window, bg="#ecf0f1")
+        buttons.pack(fill="x", padx=20, pady=(5, 20))
+        tk.Button(buttons, text="تأكيد", command=self.confirm, bg="#2ecc71", fg="white", font=GLOBAL_FONT,
+                  bd=0, padx=10, pady=5).pack(side="left")
+        tk.Button(buttons, text="إلغاء", command=self.cancel, bg="#e74c3c", fg="white", font=GLOBAL_FONT,
+                  bd=0, padx=10, pady=5).pack(side="left", padx=10)
+
+        if not self.directory.ready:
+            self.customer_label.config(text="جاري تحميل بيانات العملاء...")
+        self.window.bind("<Escape>", self.cancel)
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel)
+        self.phone_entry.focus_set()
+        self.window.grab_set()
+
+    def show(self):
+        self.window.wait_window()
+        return self.result
+
+    def on_edit(self, name):
+        if not self.autofilling:
+            self.edited.add(name)
+
+    def on_phone_change(self, *args):
+        customer = self.directory.lookup(self.phone_var.get())
+        self.history_list.delete(0, tk.END)
+        if customer is None:
+            self.customer_label.config(text="" if self.directory.ready else "جاري تحميل بيانات العملاء...")
+            return
+        self.autofilling = True
+        try:
+            if 'address' not in self.edited and customer.address:
+                self.address_var.set(customer.address)
+            if 'fee' not in self.edited and customer.delivery_fee is not None:
+                self.fee_var.set(f"{customer.delivery_fee:g}")
+        finally:
+            self.autofilling = False
+        self.customer_label.config(text=f"عميل سابق: {customer.order_count} طلب، "
+                                        f"إجمالي {customer.total_spent:.2f} ج.م، آخر طلب {customer.last_order}")
+        for order_number, placed, total in reversed(customer.history):
+            self.history_list.insert(tk.END, f"طلب {order_number} - {placed} - {total:.2f} ج.م")
+
+    def confirm(self, event=None):
+        fee_text = self.fee_var.get().strip()
+        try:
+            fee = float(fee_text) if fee_text else 0
+        except ValueError:
+            messagebox.showerror("خطأ", "رسوم التوصيل يجب أن تكون رقماً", parent=self.window)
+            return
+        self.result = (self.address_var.get().strip(), self.phone_var.get().strip() or None, fee)
+        self.window.destroy()
+
+    def cancel(self, event=None):
+        self.result = None
+        self.window.destroy()
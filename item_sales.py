@@ -0,0 +1,137 @@
+import json
+import os
+from datetime import datetime
+from itertools import combinations
+
+from order_book import STATUS_DONE
+from order_store import get_order_store
+from persistence import get_persistence_worker
+
+MENU_FILE = 'menu.json'
+UNCATEGORIZED = "غير مصنف"
+
+
+def load_menu_categories(path=MENU_FILE):
+    # item name -> category; the first category listing a name wins
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        menu = json.load(f)
+    categories = {}
+    for category, items in menu.items():
+        for name in items:
+            categories.setdefault(name, category)
+    return categories
+
+
+class ItemSales:
+    """Item-level sales counters built from the order lines.
+
+    Fed one order at a time (add_order), so the whole history is covered by
+    a single streaming pass and every order saved afterwards is added in
+    O(lines²) without re-reading anything.  Only 'ناجح' orders count, and
+    save_order_status() feeds each one in when it is finished.  Categories
+    are looked up at query time, so menu edits apply to the existing history
+    as well.
+    """
+
+    def __init__(self):
+        self.by_item = {}  # name -> [quantity, revenue, order_count]
+        self.item_hours = {}  # name -> quantity sold per hour of day (24 slots)
+        self.orders_with = {}  # name -> number of orders containing it
+        self.pairs = {}  # (name, name) sorted -> number of orders containing both
+        self.order_count = 0
+        self.total_revenue = 0.0
+
+    def add_order(self, order):
+        if order.get('status') != STATUS_DONE:
+            return
+        try:
+            hour = datetime.strptime(order['datetime'], '%Y-%m-%d %H:%M:%S').hour
+        except (KeyError, TypeError, ValueError):
+            hour = None
+        names = set()
+        for line in order.get('items', []):
+            if not isinstance(line, dict) or not line.get('name'):
+                continue
+            name = line['name']
+            quantity = line.get('quantity', 0)
+            revenue = line.get('total', 0.0)
+            bucket = self.by_item.setdefault(name, [0, 0.0, 0])
+            bucket[0] += quantity
+            bucket[1] += revenue
+            if name not in names:
+                bucket[2] += 1
+            if hour is not None:
+                self.item_hours.setdefault(name, [0] * 24)[hour] += quantity
+            self.total_revenue += revenue
+            names.add(name)
+        if not names:
+            return
+        self.order_count += 1
+        for name in names:
+            self.orders_with[name] = self.orders_with.get(name, 0) + 1
+        for pair in combinations(sorted(names), 2):
+            self.pairs[pair] = self.pairs.get(pair, 0) + 1
+
+    # ----- queries ----------------------------------------------------------
+
+    def top_sellers(self, limit=None):
+        # (name, quantity, revenue, share of item revenue), best revenue first
+        rows = sorted(self.by_item.items(), key=lambda item: item[1][1], reverse=True)
+        if limit is not None:
+            rows = rows[:limit]
+        total = self.total_revenue or 1.0
+        return [(name, quantity, revenue, revenue / total) for name, (quantity, revenue, _) in rows]
+
+    def category_totals(self, categories):
+        # categories: item name -> category, see load_menu_categories()
+        totals = {}
+        for name, (quantity, revenue, _) in self.by_item.items():
+            bucket = totals.setdefault(categories.get(name, UNCATEGORIZED), [0, 0.0])
+            bucket[0] += quantity
+            bucket[1] += revenue
+        return sorted(((category, quantity, revenue) for category, (quantity, revenue) in totals.items()),
+                      key=lambda row: row[2], reverse=True)
+
+    def hour_heatmap(self):
+        # Hours with any sale, and each item's quantity in those hours
+        hours = [hour for hour in range(24) if any(counts[hour] for counts in self.item_hours.values())]
+        rows = [(name, [self.item_hours[name][hour] for hour in hours])
+                for name, _, _, _ in self.top_sellers() if name in self.item_hours]
+        return hours, rows
+
+    def attach_rates(self, limit=20, min_orders=1):
+        # (item, attached item, orders with both, share of the item's orders
+        # that also had the attached item), most frequent pairs first
+        rows = []
+        for (first, second), together in self.pairs.items():
+            if together < min_orders:
+                continue
+            rows.append((first, second, together, together / self.orders_with[first]))
+            rows.append((second, first, together, together / self.orders_with[second]))
+        rows.sort(key=lambda row: (row[2], row[3]), reverse=True)
+        return rows[:limit]
+
+
+_item_sales = None
+
+
+def get_item_sales():
+    # Built by one pass over the order store on first use, then kept current
+    # by record_order()
+    global _item_sales
+    if _item_sales is None:
+        get_persistence_worker().flush()  # Include orders still queued for writing
+        sales = ItemSales()
+        for order in get_order_store().iter_orders(statuses=[STATUS_DONE]):
+            sales.add_order(order)
+        _item_sales = sales
+    return _item_sales
+
+
+def record_order(order):
+    # Called for every saved order; until the report is first opened there is
+    # nothing to update (the initial pass will read the order from the store)
+    if _item_sales is not None:
+        _item_sales.add_order(order)
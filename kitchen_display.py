@@ -0,0 +1,158 @@
+import time
+import tkinter as tk
+from datetime import datetime
+
+from order_book import STATUS_IN_PROGRESS, normalize_order_number
+from order_bus import get_order_bus, ORDER_CREATED, ORDER_FINISHED, ORDER_CANCELLED, ORDER_REMOVED
+
+GLOBAL_FONT = ("Tajawal", 12)
+TICKETS_PER_ROW = 4
+# Cancelled tickets stay up (in red) this long so the cook notices (ms)
+CANCELLED_LINGER = 10000
+# Age labels are refreshed this often (ms)
+AGE_REFRESH_INTERVAL = 30000
+# Tickets older than this many minutes turn orange
+LATE_AFTER_MINUTES = 15
+
+TICKET_BG = "#ffffff"
+LATE_BG = "#f8c471"
+CANCELLED_BG = "#e74c3c"
+
+
+class KitchenDisplay:
+    """Kitchen screen with one ticket per open order.
+
+    Subscribes to the order event bus and changes only the ticket an event
+    is about: a created order adds one ticket, a finished or removed one
+    destroys it, a cancelled one turns red and goes after CANCELLED_LINGER.
+    Tickets are laid out in a grid by position, so removing one only moves
+    the tickets after it.  Nothing is reloaded from disk.
+    """
+
+    def __init__(self, master, orders=()):
+        self.window = tk.Toplevel(master)
+        self.window.title("شاشة المطبخ")
+        self.window.geometry("1200x700")
+        self.window.configure(bg="#2c3e50")
+
+        header = tk.Frame(self.window, bg="#2c3e50")
+        header.pack(fill="x")
+        tk.Label(header, text="شاشة المطبخ", font=(GLOBAL_FONT[0], 22, "bold"),
+                 bg="#2c3e50", fg="white").pack(side="right", padx=20, pady=10)
+        self.count_label = tk.Label(header, text="", font=(GLOBAL_FONT[0], 16), bg="#2c3e50", fg="white")
+        self.count_label.pack(side="left", padx=20)
+
+        self.board = tk.Frame(self.window, bg="#2c3e50")
+        self.board.pack(fill="both", expand=True, padx=10, pady=10)
+        for column in range(TICKETS_PER_ROW):
+            self.board.grid_columnconfigure(column, weight=1, uniform="ticket")
+
+        self.tickets = {}  # order number -> (frame, age label, placed datetime)
+        self.order_keys = []  # order numbers in display order
+        for order in orders:
+            if order.get('status', STATUS_IN_PROGRESS) == STATUS_IN_PROGRESS:
+                self.add_ticket(order)
+        self.update_count()
+
+        self.unsubscribe = get_order_bus().subscribe(self.on_order_event)
+        self.window.bind("<Destroy>", self.on_destroy)
+        self.window.after(AGE_REFRESH_INTERVAL, self.refresh_ages)
+
+    def on_destroy(self, event):
+        if event.widget is self.window:
+            self.unsubscribe()
+
+    def on_order_event(self, event, order):
+        if not self.window.winfo_exists():
+            return
+        if event == ORDER_CREATED:
+            self.add_ticket(order)
+        elif event == ORDER_CANCELLED:
+            self.mark_cancelled(order['order_number'])
+        elif event in (ORDER_FINISHED, ORDER_REMOVED):
+            self.remove_ticket(order['order_number'])
+        self.update_count()
+
+    # ----- tickets ----------------------------------------------------------
+
+    def add_ticket(self, order):
+        key = normalize_order_number(order['order_number'])
+        if key in self.tickets:
+            return
+        frame = tk.Frame(self.board, bg=TICKET_BG, bd=2, relief="ridge", padx=10, pady=10)
+        tk.Label(frame, text=f"طلب رقم {order['order_number']}", font=(GLOBAL_FONT[0], 18, "bold"),
+                 bg=TICKET_BG).pack(anchor="e")
+        kind = "توصيل" if order.get('delivery_location') else "استلام"
+        tk.Label(frame, text=kind, font=GLOBAL_FONT, bg=TICKET_BG, fg="#7f8c8d").pack(anchor="e")
+        for line in order.get('items', []):
+            if isinstance(line, dict):
+                text = f"{line.get('quantity', 1)} × {line.get('name', '')}"
+            else:
+                text = str(line)
+            tk.Label(frame, text=text, font=(GLOBAL_FONT[0], 14), bg=TICKET_BG, justify="right").pack(anchor="e")
+        age_label = tk.Label(frame, text="", font=GLOBAL_FONT, bg=TICKET_BG, fg="#7f8c8d")
+        age_label.pack(anchor="w")
+        try:
+            placed = datetime.strptime(order['datetime'], '%Y-%m-%d %H:%M:%S')
+        except (KeyError, TypeError, ValueError):
+            placed = datetime.now()
+        self.tickets[key] = (frame, age_label, placed)
+        self.order_keys.append(key)
+        self.place(len(self.order_keys) - 1)
+        self.update_age(key)
+
+    def place(self, index):
+        frame = self.tickets[self.order_keys[index]][0]
+        frame.grid(row=index // TICKETS_PER_ROW, column=index % TICKETS_PER_ROW, sticky="nsew", padx=5, pady=5)
+
+    def remove_ticket(self, order_number):
+        key = normalize_order_number(order_number)
+        ticket = self.tickets.pop(key, None)
+        if ticket is None:
+            return
+        index = self.order_keys.index(key)
+        del self.order_keys[index]
+        ticket[0].destroy()
+        # Only the tickets after the removed one change cells
+        for i in range(index, len(self.order_keys)):
+            self.place(i)
+
+    def mark_cancelled(self, order_number):
+        key = normalize_order_number(order_number)
+        ticket = self.tickets.get(key)
+        if ticket is None:
+            return
+        frame, age_label, _ = ticket
+        for widget in [frame] + frame.winfo_children():
+            widget.config(bg=CANCELLED_BG)
+        age_label.config(text="ملغي", fg="white")
+        self.tickets[key] = (frame, None, ticket[2])
+        self.window.after(CANCELLED_LINGER, lambda: self.expire_ticket(key))
+
+    def expire_ticket(self, key):
+        if self.window.winfo_exists():
+            self.remove_ticket(key)
+            self.update_count()
+
+    # ----- ages -------------------------------------------------------------
+
+    def update_age(self, key):
+        frame, age_label, placed = self.tickets[key]
+        if age_label is None:
+            return  # Cancelled
+        minutes = int((datetime.now() - placed).total_seconds() // 60)
+        age_label.config(text=f"منذ {minutes} دقيقة")
+        background = LATE_BG if minutes >= LATE_AFTER_MINUTES else TICKET_BG
+        if frame['bg'] != background:
+            for widget in [frame] + frame.winfo_children():
+                widget.config(bg=background)
+
+    def refresh_ages(self):
+        if not self.window.winfo_exists():
+            return
+        for key in self.order_keys:
+            self.update_age(key)
+        self.window.after(AGE_REFRESH_INTERVAL, self.refresh_ages)
+
+    def update_count(self):
+        self.count_label.config(text=f"طلبات قيد التنفيذ: {len(self.tickets)} - {time.strftime('%H:%M')}")
@@ -4,10 +4,14 @@ import hashlib
 
 class ModernLoginPanel:
     def __init__(self, master, on_login_success):
+        # master is its own window (start_login) or a frame laid over the
+        # running app (pos_gui.SessionManager), which is kept after a login
         self.master = master
-        self.master.title("Restaurant POS Login")
-        self.master.geometry("1366x768")
-        self.master.resizable(False, False)
+        self.standalone = isinstance(master, tk.Tk)
+        if self.standalone:
+            self.master.title("Restaurant POS Login")
+            self.master.geometry("1366x768")
+            self.master.resizable(False, False)
         self.on_login_success = on_login_success
 
         # Load Tajawal font
@@ -106,6 +110,16 @@ class ModernLoginPanel:
             if default_text == "Password":
                 widget.config(show="")
 
+    def reset(self):
+        # Placeholders back, so the next user starts from an empty form
+        for entry, default_text in ((self.username_entry, "Username"), (self.password_entry, "Password")):
+            entry.delete(0, "end")
+            entry.insert(0, default_text)
+            entry.config(fg="#7f8c8d", show="")
+
+    def focus(self):
+        self.username_entry.focus_set()
+
     def login(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
@@ -116,7 +130,8 @@ class ModernLoginPanel:
 
         role = self.authenticate(username, password)
         if role:
-            self.master.destroy()  # Close the login window
+            if self.standalone:
+                self.master.destroy()  # Close the login window
             self.on_login_success(username, role)  # This line is correct now
         else:
             messagebox.showerror("Login Failed", "Invalid username or password")
@@ -0,0 +1,189 @@
+import json
+import os
+import re
+
+from persistence import get_persistence_worker
+
+MENU_IDS_FILE = 'menu_ids.json'
+# Results returned for one search (the search grid shows at most this many)
+SEARCH_LIMIT = 60
+# A trigram match needs at least this share of the query's trigrams
+TRIGRAM_MIN_SHARE = 0.5
+
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')  # Harakat, Quranic marks, tatweel
+_LETTER_VARIANTS = str.maketrans({
+    '\u0623': '\u0627', '\u0625': '\u0627', '\u0622': '\u0627', '\u0671': '\u0627',  # أ إ آ ٱ -> ا
+    '\u0649': '\u064a', '\u0626': '\u064a',  # ى ئ -> ي
+    '\u0629': '\u0647',  # ة -> ه
+    '\u0624': '\u0648',  # ؤ -> و
+})
+_SEPARATORS = re.compile(r'[\s\-_/.,()]+')
+
+
+def normalize_arabic(text):
+    """Search form of a name: no diacritics or tatweel, one form per letter
+    family (alef, yaa, taa marbuta / haa, waw), Latin case-folded."""
+    text = _DIACRITICS.sub('', str(text)).translate(_LETTER_VARIANTS).casefold()
+    return ' '.join(_SEPARATORS.split(text)).strip()
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MenuItem:
+    __slots__ = ('item_id', 'category', 'name', 'price')
+
+    def __init__(self, item_id, category, name, price):
+        self.item_id = item_id
+        self.category = category
+        self.name = name
+        self.price = price
+
+
+class MenuCatalog:
+    """menu.json compiled for lookups by id and for search.
+
+    Every (category, name) pair gets an id that stays the same across runs
+    (kept in MENU_IDS_FILE) and across category renames, so two categories
+    may hold items with the same name.  The search index maps every prefix
+    of every word of a normalized name to the matching ids in menu order,
+    so each keystroke is one dict lookup for a one-word query; longer
+    queries walk the shortest word list and test each id against the other
+    words' prefix sets, which are built with the lists.  Queries with no prefix match (typos,
+    text from the middle of a word) fall back to trigram overlap.  The
+    catalog is rebuilt after menu edits; ids survive the rebuild.
+    """
+
+    def __init__(self, menu, ids=None, ids_path=MENU_IDS_FILE):
+        self.ids_path = ids_path
+        self.ids = ids if ids is not None else self._load_ids()
+        self.items = {}  # id -> MenuItem
+        self.by_category = {}  # category -> [id] in menu order
+        self._key_ids = {}  # (category, name) -> id
+        self._prefixes = {}  # normalized word prefix -> [id] in menu order
+        self._prefix_sets = {}  # normalized word prefix -> set of the same ids, for intersections
+        self._trigram_index = {}  # trigram -> set of ids
+        changed = self._compile(menu)
+        if changed:
+            self.save_ids()
+
+    # ----- ids --------------------------------------------------------------
+
+    def _load_ids(self):
+        if os.path.exists(self.ids_path):
+            try:
+                with open(self.ids_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except json.JSONDecodeError:
+                print(f"Error decoding JSON in {self.ids_path}. Assigning new item ids.")  # Debug print
+        return {'next_id': 1, 'items': {}}
+
+    def save_ids(self):
+        snapshot = {'next_id': self.ids['next_id'], 'items': dict(self.ids['items'])}
+        get_persistence_worker().submit_json(self.ids_path, snapshot, indent=2)
+
+    @staticmethod
+    def _id_key(category, name):
+        return f"{category}\x1f{name}"
+
+    def _assign_id(self, category, name):
+        key = self._id_key(category, name)
+        item_id = self.ids['items'].get(key)
+        if item_id is None:
+            item_id = self.ids['next_id']
+            self.ids['next_id'] += 1
+            self.ids['items'][key] = item_id
+            return item_id, True
+        return item_id, False
+
+    def rename_category(self, old, new):
+        # Call before rebuilding so the items keep their ids under the new name
+        prefix = self._id_key(old, '')
+        for key in [key for key in self.ids['items'] if key.startswith(prefix)]:
+            self.ids['items'][self._id_key(new, key[len(prefix):])] = self.ids['items'].pop(key)
+
+    # ----- compile ----------------------------------------------------------
+
+    def _compile(self, menu):
+        changed = False
+        live = set()
+        for category, entries in menu.items():
+            ids = self.by_category.setdefault(category, [])
+            for name, price in entries.items():
+                item_id, assigned = self._assign_id(category, name)
+                changed = changed or assigned
+                live.add(self._id_key(category, name))
+                self.items[item_id] = MenuItem(item_id, category, name, price)
+                self._key_ids[(category, name)] = item_id
+                ids.append(item_id)
+                self._index(item_id, name)
+        # Deleted items drop their ids; ids are never reused (next_id only grows)
+        for key in [key for key in self.ids['items'] if key not in live]:
+            del self.ids['items'][key]
+            changed = True
+        return changed
+
+    def _index(self, item_id, name):
+        normalized = normalize_arabic(name)
+        for word in normalized.split():
+            seen = set()
+            for end in range(1, len(word) + 1):
+                prefix = word[:end]
+                if prefix not in seen:
+                    seen.add(prefix)
+                    bucket = self._prefixes.setdefault(prefix, [])
+                    if not bucket or bucket[-1] != item_id:
+                        bucket.append(item_id)
+                        self._prefix_sets.setdefault(prefix, set()).add(item_id)
+        for trigram in _trigrams(normalized):
+            self._trigram_index.setdefault(trigram, set()).add(item_id)
+
+    # ----- lookups ----------------------------------------------------------
+
+    def get(self, item_id):
+        return self.items.get(item_id)
+
+    def item_id(self, category, name):
+        return self._key_ids.get((category, name))
+
+    def category_items(self, category):
+        return [self.items[item_id] for item_id in self.by_category.get(category, [])]
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        words = normalize_arabic(query).split()
+        if not words:
+            return []
+        lists = [self._prefixes.get(word) for word in words]
+        if all(lists):
+            if len(lists) == 1:
+                return [self.items[item_id] for item_id in lists[0][:limit]]
+            # Walk the shortest list, keep ids every other word also matches
+            ordered = sorted(words, key=lambda word: len(self._prefixes[word]))
+            others = [self._prefix_sets[word] for word in ordered[1:]]
+            matches = []
+            for item_id in self._prefixes[ordered[0]]:
+                if all(item_id in ids for ids in others):
+                    matches.append(self.items[item_id])
+                    if len(matches) >= limit:
+                        break
+            if matches:
+                return matches
+        return self._trigram_search(' '.join(words), limit)
+
+    def _trigram_search(self, query, limit):
+        query_trigrams = _trigrams(query)
+        counts = {}
+        for trigram in query_trigrams:
+            for item_id in self._trigram_index.get(trigram, ()):
+                counts[item_id] = counts.get(item_id, 0) + 1
+        needed = max(1, int(len(query_trigrams) * TRIGRAM_MIN_SHARE))
+        ranked = sorted((item_id for item_id, count in counts.items() if count >= needed),
+                        key=lambda item_id: -counts[item_id])
+        return [self.items[item_id] for item_id in ranked[:limit]]
+
+
+def build_catalog(menu, previous=None):
+    # Rebuild after a menu edit, keeping the id assignments already made
+    return MenuCatalog(menu, ids=previous.ids if previous is not None else None)
@@ -0,0 +1,188 @@
+try:
+    import numpy as np
+except ImportError:  # Analytics are optional; the rest of the POS works without numpy
+    np = None
+
+from order_book import STATUS_DONE, STATUS_CANCELLED_PREFIX
+from order_events import order_id_for
+
+WEEKDAY_NAMES = ["الاثنين", "الثلاثاء", "الأربعاء", "الخميس", "الجمعة", "السبت", "الأحد"]
+
+
+def numpy_available():
+    return np is not None
+
+
+def _timestamp(value):
+    # Missing or unparseable datetimes become NaT and are left out of time buckets
+    try:
+        return np.datetime64(value, 's')
+    except (TypeError, ValueError):
+        print(f"Invalid order datetime: {value}")  # Debug print
+        return np.datetime64('NaT', 's')
+
+
+class _Categories:
+    # String -> small int code, in first-seen order
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.names)
+            self.names.append(value)
+        return code
+
+
+class OrderAnalytics:
+    """Columnar view of the order history for vectorized queries.
+
+    Orders are read once (streamed from the order store) into flat NumPy
+    arrays: one row per order (timestamp, total, status code, delivery flag)
+    and one row per order line (owning order row, item code, quantity, line
+    total).  Every query is then a mask plus bincount / unique over those
+    arrays instead of a Python loop over dicts.  Each order appears once with
+    its latest status; revenue queries only count 'ناجح' orders.
+
+    add_orders() brings the arrays up to date with the orders read from an
+    OrderFeed since the last report: new orders are appended and orders
+    seen again (a later status change) only get their new status code.
+    """
+
+    def __init__(self, orders=()):
+        if np is None:
+            raise RuntimeError("numpy is required for order analytics")
+        self.statuses = _Categories()
+        self.items = _Categories()
+        self.rows = {}  # order_id -> row
+
+        self.timestamps = np.array([], dtype='datetime64[s]')
+        self.totals = np.array([], dtype=np.float64)
+        self.status_codes = np.array([], dtype=np.int32)
+        self.is_delivery = np.array([], dtype=bool)
+        self.line_orders = np.array([], dtype=np.int64)
+        self.line_items = np.array([], dtype=np.int32)
+        self.line_quantities = np.array([], dtype=np.int64)
+        self.line_totals = np.array([], dtype=np.float64)
+        self.add_orders(orders)
+
+    def add_orders(self, orders):
+        first_row = len(self.timestamps)
+        status_changes = {}  # row already in the arrays -> new status code
+        timestamps, totals, status_codes, delivery = [], [], [], []
+        line_orders, line_items, line_quantities, line_totals = [], [], [], []
+        for order in orders:
+            status = self.statuses.code(order.get('status', STATUS_DONE))
+            order_id = order_id_for(order)
+            row = self.rows.get(order_id)
+            if row is not None:
+                if row < first_row:
+                    status_changes[row] = status
+                else:
+                    status_codes[row - first_row] = status
+                continue
+            row = self.rows[order_id] = first_row + len(timestamps)
+            timestamps.append(_timestamp(order.get('datetime')))
+            totals.append(order.get('total') or 0.0)
+            status_codes.append(status)
+            delivery.append(bool(order.get('delivery_location')))
+            for item in order.get('items', []):
+                if not isinstance(item, dict):
+                    continue
+                line_orders.append(row)
+                line_items.append(self.items.code(item.get('name')))
+                line_quantities.append(item.get('quantity', 0))
+                line_totals.append(item.get('total', 0.0))
+
+        if timestamps:
+            self.timestamps = np.concatenate([self.timestamps, np.array(timestamps, dtype='datetime64[s]')])
+            self.totals = np.concatenate([self.totals, np.array(totals, dtype=np.float64)])
+            self.status_codes = np.concatenate([self.status_codes, np.array(status_codes, dtype=np.int32)])
+            self.is_delivery = np.concatenate([self.is_delivery, np.array(delivery, dtype=bool)])
+        if line_orders:
+            self.line_orders = np.concatenate([self.line_orders, np.array(line_orders, dtype=np.int64)])
+            self.line_items = np.concatenate([self.line_items, np.array(line_items, dtype=np.int32)])
+            self.line_quantities = np.concatenate([self.line_quantities, np.array(line_quantities, dtype=np.int64)])
+            self.line_totals = np.concatenate([self.line_totals, np.array(line_totals, dtype=np.float64)])
+        for row, status in status_changes.items():
+            self.status_codes[row] = status
+
+    # ----- masks ------------------------------------------------------------
+
+    def _status_mask(self, predicate):
+        codes = [code for code, name in enumerate(self.statuses.names) if predicate(name)]
+        return np.isin(self.status_codes, codes)
+
+    def done_mask(self):
+        return self._status_mask(lambda name: name == STATUS_DONE)
+
+    def cancelled_mask(self):
+        return self._status_mask(lambda name: name.startswith(STATUS_CANCELLED_PREFIX))
+
+    def dated_mask(self):
+        return ~np.isnat(self.timestamps)
+
+    def window_mask(self, start=None, end=None):
+        # start / end: 'YYYY-MM-DD[ HH:MM:SS]' strings or datetime objects; end is exclusive
+        mask = np.ones(len(self.timestamps), dtype=bool)
+        if start is not None:
+            mask &= self.timestamps >= np.datetime64(start, 's')
+        if end is not None:
+            mask &= self.timestamps < np.datetime64(end, 's')
+        return mask
+
+    # ----- queries ----------------------------------------------------------
+
+    def revenue_per_hour(self, start=None, end=None):
+        mask = self.done_mask() & self.window_mask(start, end) & self.dated_mask()
+        ts = self.timestamps[mask]
+        hours = ((ts - ts.astype('datetime64[D]')) // np.timedelta64(1, 'h')).astype(np.int64)
+        return np.bincount(hours, weights=self.totals[mask], minlength=24)
+
+    def revenue_per_weekday(self, start=None, end=None):
+        mask = self.done_mask() & self.window_mask(start, end) & self.dated_mask()
+        days = self.timestamps[mask].astype('datetime64[D]').astype(np.int64)
+        weekdays = (days + 3) % 7  # 1970-01-01 was a Thursday; Monday == 0
+        return np.bincount(weekdays, weights=self.totals[mask], minlength=7)
+
+    def revenue_per_item(self, start=None, end=None):
+        order_mask = self.done_mask() & self.window_mask(start, end)
+        line_mask = order_mask[self.line_orders]
+        item_codes = self.line_items[line_mask]
+        revenue = np.bincount(item_codes, weights=self.line_totals[line_mask], minlength=len(self.items.names))
+        quantity = np.bincount(item_codes, weights=self.line_quantities[line_mask], minlength=len(self.items.names))
+        order = np.argsort(-revenue)
+        return [(self.items.names[i], int(quantity[i]), float(revenue[i])) for i in order if quantity[i] > 0]
+
+    def cancellation_rate(self, start=None, end=None):
+        window = self.window_mask(start, end)
+        done = int(np.count_nonzero(self.done_mask() & window))
+        cancelled = int(np.count_nonzero(self.cancelled_mask() & window))
+        finished = done + cancelled
+        return cancelled / finished if finished else 0.0
+
+    def delivery_vs_pickup(self, start=None, end=None):
+        mask = self.done_mask() & self.window_mask(start, end)
+        delivery = mask & self.is_delivery
+        pickup = mask & ~self.is_delivery
+        return {
+            'delivery': (int(np.count_nonzero(delivery)), float(self.totals[delivery].sum())),
+            'pickup': (int(np.count_nonzero(pickup)), float(self.totals[pickup].sum())),
+        }
+
+
+class RevenueAnalytics:
+    """Columnar view of the manually entered revenue."""
+
+    def __init__(self, daily_revenue):
+        if np is None:
+            raise RuntimeError("numpy is required for revenue analytics")
+        self.shifts = _Categories()
+        self.revenue = np.array([entry[2] for entry in daily_revenue], dtype=np.float64)
+        self.revenue_shifts = np.array([self.shifts.code(entry[3]) for entry in daily_revenue], dtype=np.int32)
+
+    def revenue_per_shift(self):
+        totals = np.bincount(self.revenue_shifts, weights=self.revenue, minlength=len(self.shifts.names))
+        return list(zip(self.shifts.names, totals.tolist()))
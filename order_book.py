@@ -0,0 +1,115 @@
+from itertools import islice
+
+STATUS_IN_PROGRESS = 'قيد التنفيذ'
+STATUS_DONE = 'ناجح'
+STATUS_CANCELLED_PREFIX = 'ملغي بواسطة'
+
+
+def status_matches(status, statuses):
+    # 'ملغي بواسطة' also matches 'ملغي بواسطة <user>'
+    status = status or ''
+    return any(status == wanted or status.startswith(wanted + ' ') for wanted in statuses)
+
+
+def normalize_order_number(order_number):
+    # Tree rows hand back ints or strings depending on Tk; the index always uses int
+    return int(str(order_number).strip())
+
+
+class CurrentOrderBook:
+    """Open orders indexed by order number.
+
+    Lookup, status change and removal are O(1) dict operations instead of a
+    scan over every open order.  Insertion order is preserved so the
+    current-orders window still lists orders in the order they were placed.
+    Each status also has its own sub-index for quick per-status listing.
+    If a journal (see current_orders_wal.py) is attached, every mutation is
+    logged to it.
+    """
+
+    def __init__(self, orders=(), journal=None):
+        self._orders = {}
+        self._by_status = {}
+        self.journal = None
+        for order in orders:
+            self.add(order)
+        self.journal = journal
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __iter__(self):
+        return iter(list(self._orders.values()))
+
+    def __contains__(self, order_number):
+        return self._key(order_number) in self._orders
+
+    def _key(self, order_number):
+        try:
+            return normalize_order_number(order_number)
+        except (TypeError, ValueError):
+            return None
+
+    def _log(self, method, *args):
+        if self.journal is None:
+            return
+        getattr(self.journal, method)(*args)
+        if self.journal.needs_checkpoint():
+            self.journal.checkpoint(self)
+
+    def _index_status(self, key, status):
+        self._by_status.setdefault(status, {})[key] = None
+
+    def _unindex_status(self, key, status):
+        bucket = self._by_status.get(status)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._by_status[status]
+
+    def add(self, order, replace=False):
+        key = normalize_order_number(order['order_number'])
+        order.setdefault('status', STATUS_IN_PROGRESS)
+        if key in self._orders:
+            if not replace:
+                print(f"Duplicate current order {key}; keeping the latest copy.")  # Debug print
+            self._unindex_status(key, self._orders[key]['status'])
+        self._orders[key] = order
+        self._index_status(key, order['status'])
+        self._log('log_add', order)
+        return order
+
+    def get(self, order_number):
+        return self._orders.get(self._key(order_number))
+
+    def update_status(self, order_number, status):
+        key = self._key(order_number)
+        order = self._orders.get(key)
+        if order is None:
+            return None
+        self._unindex_status(key, order['status'])
+        order['status'] = status
+        self._index_status(key, status)
+        self._log('log_status', key, status)
+        return order
+
+    def remove(self, order_number):
+        key = self._key(order_number)
+        order = self._orders.pop(key, None)
+        if order is not None:
+            self._unindex_status(key, order['status'])
+            self._log('log_remove', key)
+        return order
+
+    def with_status(self, status):
+        return [self._orders[key] for key in self._by_status.get(status, {})]
+
+    def count_by_status(self):
+        return {status: len(keys) for status, keys in self._by_status.items()}
+
+    def fetch(self, start, count):
+        # Row-source interface for VirtualTable
+        return list(islice(self._orders.values(), start, start + count))
+
+    def to_list(self):
+        return list(self._orders.values())
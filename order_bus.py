@@ -0,0 +1,58 @@
+from order_book import STATUS_DONE, STATUS_CANCELLED_PREFIX
+
+ORDER_CREATED = 'created'
+ORDER_FINISHED = 'finished'
+ORDER_CANCELLED = 'cancelled'
+ORDER_REMOVED = 'removed'  # Taken off the open orders without finishing (owner removal)
+
+
+def event_for_status(status):
+    # Bus event for a status change, None for statuses nobody listens for
+    if status == STATUS_DONE:
+        return ORDER_FINISHED
+    if (status or '').startswith(STATUS_CANCELLED_PREFIX):
+        return ORDER_CANCELLED
+    return None
+
+
+class OrderEventBus:
+    """In-process publish/subscribe for open-order changes.
+
+    Subscribers are called synchronously, in subscription order, with
+    (event, order).  Publishing happens on the Tk main thread (from the GUI
+    handlers, or from the order server pushes RemoteOrderBook applies
+    there), so subscribers can touch widgets directly and see the change as
+    soon as the publishing handler returns.  A subscriber that raises is
+    reported and skipped; the others still get the event.
+    """
+
+    def __init__(self):
+        self._subscribers = []  # (callback, set of events or None for all)
+
+    def subscribe(self, callback, events=None):
+        entry = (callback, set(events) if events is not None else None)
+        self._subscribers.append(entry)
+        return lambda: self._unsubscribe(entry)
+
+    def _unsubscribe(self, entry):
+        if entry in self._subscribers:
+            self._subscribers.remove(entry)
+
+    def publish(self, event, order):
+        for callback, events in list(self._subscribers):
+            if events is not None and event not in events:
+                continue
+            try:
+                callback(event, order)
+            except Exception as e:
+                print(f"Order event subscriber failed on {event}: {e}")  # Debug print
+
+
+_bus = None
+
+
+def get_order_bus():
+    global _bus
+    if _bus is None:
+        _bus = OrderEventBus()
+    return _bus
@@ -0,0 +1,84 @@
+import time
+
+from order_book import STATUS_DONE, STATUS_IN_PROGRESS
+
+# Order history record types.  An order is written once, when it is placed;
+# each later status change is a small event referring to it by order_id.
+RECORD_ORDER = 'order'
+RECORD_STATUS = 'status'
+# Bumped when the history layout changes; saved positions from an older
+# format are not valid any more
+ORDER_FORMAT = 2
+
+
+def make_order_id(order_number, created):
+    # Order numbers can repeat (legacy random numbers, per-day resets); the
+    # creation time makes the id unique
+    digits = ''.join(ch for ch in str(created) if ch.isdigit())
+    return f"{digits}-{order_number}"
+
+
+def order_id_for(order):
+    return order.get('order_id') or make_order_id(order.get('order_number'), order.get('datetime'))
+
+
+def order_record(order):
+    # The immutable record written when the order is placed
+    record = {'type': RECORD_ORDER, 'order_id': order_id_for(order)}
+    record.update((key, value) for key, value in order.items() if key not in ('type', 'order_id'))
+    record.setdefault('status', STATUS_IN_PROGRESS)
+    return record
+
+
+def placed_entry(record):
+    # What normalize_history remembers of an order record
+    return record['order_id'], record.get('total'), record.get('items')
+
+
+def status_event(order_id, order_number, status, when=None):
+    return {'type': RECORD_STATUS, 'order_id': order_id, 'order_number': order_number,
+            'status': status, 'datetime': when or time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def order_view(record, status=None, status_datetime=None):
+    """The order as readers see it: the placed order with its latest status."""
+    view = {key: value for key, value in record.items() if key != 'type'}
+    if status is not None:
+        view['status'] = status
+        view['status_datetime'] = status_datetime
+    return view
+
+
+def normalize_history(orders, placed=None):
+    """Turn the old history (a full copy of the order per status change) into
+    order records plus status events.
+
+    Yields (record, source) pairs in history order.  A non-pending copy that
+    matches the last order placed under the same order number (same total
+    and items) becomes a status event for it, so pending -> cancelled ->
+    'ناجح' folds into one order with two events.  A pending copy, or one that
+    matches nothing, starts a new order.  Records already in the new layout
+    pass through unchanged.  placed seeds the last order per number (see
+    placed_entry) when resuming after part of the history was converted.
+    """
+    last = dict(placed or {})  # order_number -> (order_id, total, items) of the last order placed with it
+    for order in orders:
+        kind = order.get('type')
+        if kind == RECORD_STATUS:
+            yield order, order
+            continue
+        if kind == RECORD_ORDER:
+            last[order.get('order_number')] = placed_entry(order)
+            yield order, order
+            continue
+        order_number = order.get('order_number')
+        status = order.get('status', STATUS_DONE)
+        placed = last.get(order_number)
+        if (status != STATUS_IN_PROGRESS and placed is not None
+                and placed[1:] == (order.get('total'), order.get('items'))):
+            yield status_event(placed[0], order_number, status, order.get('datetime')), order
+            continue
+        record = order_record(order)
+        record['status'] = status
+        last[order_number] = (record['order_id'], order.get('total'), order.get('items'))
+        yield record, order
@@ -0,0 +1,319 @@
+import csv
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import tkinter as tk
+import zlib
+from array import array
+
+from order_store import get_order_store
+from persistence import get_persistence_worker
+
+EXPORT_DIR = 'exports'
+# Rows buffered per row group in the columnar format (and per progress update)
+ROW_GROUP_SIZE = 10000
+# How often the Tk main thread picks up progress (ms)
+PROGRESS_POLL_INTERVAL = 200
+
+FORMAT_CSV = 'csv'
+FORMAT_COLUMNAR = 'columnar'
+COLUMNAR_MAGIC = b'POSCOL1\n'
+COLUMNAR_SUFFIX = '.poscol'
+
+# Column types in the columnar format
+INT = 'int'
+FLOAT = 'float'
+STR = 'str'
+
+# dataset -> [(column, type)]
+SCHEMAS = {
+    'orders': [('order_id', STR), ('order_number', STR), ('datetime', STR), ('status', STR),
+               ('status_datetime', STR), ('total', FLOAT), ('delivery_fee', FLOAT),
+               ('delivery_location', STR), ('phone_number', STR), ('line_count', INT)],
+    'order_lines': [('order_id', STR), ('order_number', STR), ('datetime', STR), ('status', STR),
+                    ('name', STR), ('quantity', INT), ('price', FLOAT), ('total', FLOAT)],
+    'daily_revenue': [('date', STR), ('time', STR), ('revenue', FLOAT), ('shift_type', STR)],
+    'supplier_costs': [('date', STR), ('time', STR), ('supplier', STR), ('goods_type', STR),
+                       ('notes', STR), ('cost', FLOAT), ('payment_type', STR)],
+}
+
+
+def _int(value):
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _float(value):
+    try:
+        return float(value or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _str(value):
+    return '' if value is None else str(value)
+
+
+CONVERTERS = {INT: _int, FLOAT: _float, STR: _str}
+
+
+# ----- row sources ----------------------------------------------------------
+# Each yields tuples in SCHEMAS order.  start / end are 'YYYY-MM-DD' strings,
+# end exclusive, matching the order store's date filters.
+
+def order_rows(start=None, end=None):
+    for order in get_order_store().iter_orders(start=start, end=end):
+        items = order.get('items') or []
+        yield (order.get('order_id'), order.get('order_number'), order.get('datetime'), order.get('status'),
+               order.get('status_datetime'), order.get('total'), order.get('delivery_fee'),
+               order.get('delivery_location'), order.get('phone_number'), len(items))
+
+
+def order_line_rows(start=None, end=None):
+    for order in get_order_store().iter_orders(start=start, end=end):
+        for line in order.get('items') or []:
+            if not isinstance(line, dict):
+                line = {'name': line}
+            yield (order.get('order_id'), order.get('order_number'), order.get('datetime'), order.get('status'),
+                   line.get('name'), line.get('quantity'), line.get('price'), line.get('total'))
+
+
+def entry_rows(entries, start=None, end=None):
+    # Revenue / supplier cost entries as kept by the revenue UI: (date, time, ...)
+    for entry in entries:
+        day = entry[0].isoformat() if hasattr(entry[0], 'isoformat') else str(entry[0])
+        if (start is None or day >= start) and (end is None or day < end):
+            yield (day,) + tuple(entry[1:])
+
+
+# ----- writers --------------------------------------------------------------
+
+class CsvExportWriter:
+    suffix = '.csv'
+
+    def __init__(self, f, schema):
+        # utf-8-sig so Excel shows the Arabic text correctly
+        self.writer = csv.writer(f)
+        self.writer.writerow([name for name, _ in schema])
+
+    @staticmethod
+    def open(path):
+        return open(path, 'w', encoding='utf-8-sig', newline='')
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        pass
+
+
+class ColumnarExportWriter:
+    """Compact column-oriented binary file, written one row group at a time.
+
+    Layout: COLUMNAR_MAGIC, then row groups, then a JSON footer, its length
+    (uint32 little-endian) and COLUMNAR_MAGIC again.  In a row group every
+    column is stored separately and zlib-compressed: ints as int64, floats
+    as float64, strings as uint32 end offsets followed by the UTF-8 bytes,
+    in the writer's byte order (recorded in the footer).
+    The footer holds the schema and, per row group, the row count and each
+    column's (offset, length), so a reader can load single columns.
+    """
+
+    suffix = COLUMNAR_SUFFIX
+
+    def __init__(self, f, schema):
+        self.f = f
+        self.schema = schema
+        self.row_groups = []
+        self.f.write(COLUMNAR_MAGIC)
+
+    @staticmethod
+    def open(path):
+        return open(path, 'wb')
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        chunks = []
+        for i, (_, kind) in enumerate(self.schema):
+            values = [row[i] for row in rows]
+            if kind == INT:
+                data = array('q', values).tobytes()
+            elif kind == FLOAT:
+                data = array('d', values).tobytes()
+            else:
+                encoded = [value.encode('utf-8') for value in values]
+                ends = array('I')
+                position = 0
+                for value in encoded:
+                    position += len(value)
+                    ends.append(position)
+                data = ends.tobytes() + b''.join(encoded)
+            compressed = zlib.compress(data, 6)
+            chunks.append((self.f.tell(), len(compressed)))
+            self.f.write(compressed)
+        self.row_groups.append({'rows': len(rows), 'columns': chunks})
+
+    def close(self):
+        footer = json.dumps({'schema': self.schema, 'byteorder': sys.byteorder,
+                             'row_groups': self.row_groups}).encode('utf-8')
+        self.f.write(footer)
+        self.f.write(struct.pack('<I', len(footer)))
+        self.f.write(COLUMNAR_MAGIC)
+
+
+WRITERS = {FORMAT_CSV: CsvExportWriter, FORMAT_COLUMNAR: ColumnarExportWriter}
+
+
+def read_columnar(path, columns=None):
+    """Yield each row group of a columnar export as {column: list of values}."""
+    with open(path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path} is not a columnar export")
+        f.seek(-(len(COLUMNAR_MAGIC) + 4), os.SEEK_END)
+        (length,) = struct.unpack('<I', f.read(4))
+        f.seek(-(len(COLUMNAR_MAGIC) + 4 + length), os.SEEK_END)
+        footer = json.loads(f.read(length).decode('utf-8'))
+        schema = footer['schema']
+        swap = footer.get('byteorder', sys.byteorder) != sys.byteorder
+        wanted = [i for i, (name, _) in enumerate(schema) if columns is None or name in columns]
+        for group in footer['row_groups']:
+            result = {}
+            for i in wanted:
+                name, kind = schema[i]
+                offset, size = group['columns'][i]
+                f.seek(offset)
+                data = zlib.decompress(f.read(size))
+                if kind in (INT, FLOAT):
+                    values = array('q' if kind == INT else 'd')
+                    values.frombytes(data)
+                    if swap:
+                        values.byteswap()
+                    result[name] = values.tolist()
+                else:
+                    ends = array('I')
+                    ends.frombytes(data[:4 * group['rows']])
+                    if swap:
+                        ends.byteswap()
+                    text = data[4 * group['rows']:]
+                    values, position = [], 0
+                    for end in ends:
+                        values.append(text[position:end].decode('utf-8'))
+                        position = end
+                    result[name] = values
+            yield result
+
+
+# ----- export job -----------------------------------------------------------
+
+class ExportCancelled(Exception):
+    pass
+
+
+class ExportJob:
+    """Exports datasets on a background thread.
+
+    sources: [(dataset name, zero-argument callable returning the rows)].
+    Rows are converted and written ROW_GROUP_SIZE at a time, so memory stays
+    flat however long the history is.  Progress, completion and errors are
+    delivered on the Tk main thread through the after() poll started by
+    start(): on_progress(dataset, rows written), on_done(paths),
+    on_error(error).  Files are written under a temporary name and renamed
+    when complete; a cancelled or failed export leaves nothing behind.
+    """
+
+    def __init__(self, sources, directory=EXPORT_DIR, fmt=FORMAT_CSV, on_progress=None, on_done=None,
+                 on_error=None):
+        self.sources = sources
+        self.directory = directory
+        self.fmt = fmt
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self._events = queue.Queue()
+        self._cancelled = threading.Event()
+        self._root = None
+
+    def start(self, root):
+        self._root = root
+        threading.Thread(target=self._run, name="order-export", daemon=True).start()
+        self._root.after(PROGRESS_POLL_INTERVAL, self._deliver)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _run(self):
+        try:
+            get_persistence_worker().flush()  # Include orders still queued for writing
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = time.strftime('%Y%m%d_%H%M%S')
+            paths = [self._export(name, rows, stamp) for name, rows in self.sources]
+            self._events.put(('done', paths))
+        except ExportCancelled:
+            self._events.put(('cancelled', None))
+        except Exception as e:
+            print(f"Export failed: {e}")  # Debug print
+            self._events.put(('error', e))
+
+    def _export(self, name, rows, stamp):
+        schema = SCHEMAS[name]
+        converters = [CONVERTERS[kind] for _, kind in schema]
+        writer_class = WRITERS[self.fmt]
+        path = os.path.join(self.directory, f"{name}_{stamp}{writer_class.suffix}")
+        written = 0
+        try:
+            with writer_class.open(path + '.tmp') as f:
+                writer = writer_class(f, schema)
+                batch = []
+                for row in rows():
+                    batch.append([convert(value) for convert, value in zip(converters, row)])
+                    if len(batch) >= ROW_GROUP_SIZE:
+                        if self._cancelled.is_set():
+                            raise ExportCancelled()
+                        writer.write_rows(batch)
+                        written += len(batch)
+                        batch = []
+                        self._events.put(('progress', (name, written)))
+                writer.write_rows(batch)
+                written += len(batch)
+                writer.close()
+            os.replace(path + '.tmp', path)
+        except BaseException:
+            if os.path.exists(path + '.tmp'):
+                os.remove(path + '.tmp')
+            raise
+        self._events.put(('progress', (name, written)))
+        return path
+
+    def _deliver(self):
+        finished = False
+        try:
+            while True:
+                kind, value = self._events.get_nowait()
+                if kind == 'progress' and self.on_progress:
+                    self.on_progress(*value)
+                elif kind == 'done':
+                    finished = True
+                    if self.on_done:
+                        self.on_done(value)
+                elif kind == 'error':
+                    finished = True
+                    if self.on_error:
+                        self.on_error(value)
+                elif kind == 'cancelled':
+                    finished = True
+        except queue.Empty:
+            pass
+        if finished:
+            return
+        try:
+            self._root.after(PROGRESS_POLL_INTERVAL, self._deliver)
+        except tk.TclError:
+            # Window closed; the export still finishes in the background
+            pass
@@ -0,0 +1,267 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+
+from menu_catalog import normalize_arabic
+from order_book import STATUS_DONE, STATUS_CANCELLED_PREFIX
+from order_events import ORDER_FORMAT, order_id_for
+from order_store import OrderFeed, STORAGE_BACKEND
+from persistence import get_persistence_worker, write_json_atomic
+
+SEARCH_INDEX_FILE = 'order_search_index.json'
+# Batches appended to the index log before it is folded into SEARCH_INDEX_FILE
+INDEX_LOG_MAX_BATCHES = 200
+# Orders listed in the reports window (and indexed)
+INDEXED_STATUSES = [STATUS_DONE, STATUS_CANCELLED_PREFIX]
+
+# Term prefixes, one per searchable field
+ORDER_NUMBER = 'n:'
+PHONE = 'p:'
+ADDRESS = 'a:'
+ITEM = 'i:'
+CASHIER = 'c:'
+DAY = 'd:'
+
+_DIGITS = str.maketrans('\u0660\u0661\u0662\u0663\u0664\u0665\u0666\u0667\u0668\u0669'
+                        '\u06f0\u06f1\u06f2\u06f3\u06f4\u06f5\u06f6\u06f7\u06f8\u06f9',
+                        '01234567890123456789')  # Arabic-Indic and Persian digits
+_TERM_END = '\uffff'  # Sorts after every character used in terms
+
+
+def normalize_phone(phone):
+    # Digits only, Arabic-Indic digits as ASCII, +20 / 0020 country code as a leading 0
+    digits = ''.join(ch for ch in str(phone or '').translate(_DIGITS) if ch.isdigit())
+    if digits.startswith('0020'):
+        digits = '0' + digits[4:]
+    elif digits.startswith('20') and len(digits) == 12:
+        digits = '0' + digits[2:]
+    return digits
+
+
+def report_row(order):
+    # The row the reports table shows for an order
+    order_number = order.get('order_number', 'N/A')
+    order_date = order.get('datetime', 'N/A')
+    order_total = f"{order.get('total', 0):.2f} ج.م"
+    order_type = "توصيل" if order.get('delivery_location') else "استلام"
+    order_status = order.get('status', STATUS_DONE)  # Default to 'ناجح' if status is not set
+    return [order_number, order_date, order_total, order_type, order_status]
+
+
+def order_terms(order):
+    terms = {ORDER_NUMBER + str(order.get('order_number', ''))}
+    phone = normalize_phone(order.get('phone_number'))
+    if phone:
+        terms.add(PHONE + phone)
+    for word in normalize_arabic(order.get('delivery_location') or '').split():
+        terms.add(ADDRESS + word)
+    for line in order.get('items') or []:
+        name = line.get('name') if isinstance(line, dict) else line
+        for word in normalize_arabic(name or '').split():
+            terms.add(ITEM + word)
+    for word in normalize_arabic(order.get('cashier') or '').split():
+        terms.add(CASHIER + word)
+    day = str(order.get('datetime') or '')[:10]
+    if day:
+        terms.add(DAY + day)
+    return terms
+
+
+class OrderSearchIndex:
+    """Inverted index over the finished and cancelled orders.
+
+    Every indexed order gets a document number (in the order it was
+    indexed) and its report row; every term (order number, phone number,
+    address and item name words, cashier, day) maps to the sorted list of
+    documents containing it.  A query intersects one posting list per word,
+    so it costs the size of the lists involved, not the size of the history;
+    word prefixes and date ranges are ranges of the sorted vocabulary.
+
+    Like the shift revenue job, catch_up() runs on the persistence worker
+    and reads only the orders saved since the last run through an
+    OrderFeed.  Each run appends one batch (new documents, changed rows and
+    the feed position) to a log next to SEARCH_INDEX_FILE; every
+    INDEX_LOG_MAX_BATCHES batches the whole index is rewritten and the log
+    started over, so a restart loads the index instead of re-reading the
+    history.  Changing the storage backend or the history format rebuilds it.
+    """
+
+    def __init__(self, path=SEARCH_INDEX_FILE):
+        self.path = path
+        self.log_path = path + '.log'
+        self._lock = threading.Lock()
+        self.settings = {'backend': STORAGE_BACKEND, 'format': ORDER_FORMAT}
+        self.rows = []  # document -> report row
+        self.doc_ids = {}  # order_id -> document
+        self.postings = {}  # term -> [document] ascending
+        self._vocabulary = None  # Sorted terms, rebuilt on the first search after new terms
+        self._log_batches = 0
+        position = self._load()
+        self.feed = OrderFeed(position=position, statuses=INDEXED_STATUSES)
+
+    # ----- persistence ------------------------------------------------------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            self._discard_log()
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Error decoding JSON in {self.path}. Rebuilding the order search index.")  # Debug print
+            self._discard_log()
+            return None
+        if state.get('settings') != self.settings:
+            print("Order history changed. Rebuilding the order search index.")  # Debug print
+            self._discard_log()
+            return None
+        for order_id, row in state.get('docs', []):
+            self.doc_ids[order_id] = len(self.rows)
+            self.rows.append(row)
+        self.postings = state.get('postings', {})
+        position = state.get('position')
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        batch = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Torn last line; the feed re-reads those orders
+                    for order_id, row, terms in batch['docs']:
+                        self._add(order_id, row, terms)
+                    position = batch['position']
+                    self._log_batches += 1
+        return position
+
+    def _discard_log(self):
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+    def _save(self):
+        # Called on the persistence worker with self._lock held
+        # doc_ids is in insertion order, which is document order
+        docs = [[order_id, self.rows[doc]] for order_id, doc in self.doc_ids.items()]
+        write_json_atomic(self.path, {'settings': self.settings, 'position': self.feed.position,
+                                      'docs': docs, 'postings': self.postings})
+        self._discard_log()
+        self._log_batches = 0
+
+    # ----- indexing ---------------------------------------------------------
+
+    def _add(self, order_id, row, terms):
+        doc = self.doc_ids.get(order_id)
+        if doc is not None:
+            # Status change of an indexed order: only its row changes
+            self.rows[doc] = row
+            return
+        doc = len(self.rows)
+        self.doc_ids[order_id] = doc
+        self.rows.append(row)
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                self.postings[term] = [doc]
+                self._vocabulary = None
+            else:
+                postings.append(doc)  # doc is the largest so far, the list stays sorted
+
+    def schedule(self, on_done=None):
+        # Coalesced: one pending catch-up covers every order saved before it runs.
+        # A caller waiting on on_done gets its own job, since a later schedule()
+        # would replace the coalesced one and drop the callback
+        key = ('order_search',) if on_done is None else None
+        get_persistence_worker().submit(key, self.catch_up, on_done=on_done)
+
+    def catch_up(self):
+        batch = []
+        with self._lock:
+            for order in self.feed.read():
+                entry = [order_id_for(order), report_row(order), sorted(order_terms(order))]
+                self._add(*entry)
+                batch.append(entry)
+            if not os.path.exists(self.path) or self._log_batches >= INDEX_LOG_MAX_BATCHES:
+                self._save()
+            elif batch:
+                line = json.dumps({'position': self.feed.position, 'docs': batch}, ensure_ascii=False)
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+                self._log_batches += 1
+
+    # ----- queries ----------------------------------------------------------
+
+    def _terms_between(self, low, high):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        vocabulary = self._vocabulary
+        return vocabulary[bisect_left(vocabulary, low):bisect_left(vocabulary, high)]
+
+    def _prefix_docs(self, prefix):
+        docs = set()
+        for term in self._terms_between(prefix, prefix + _TERM_END):
+            docs.update(self.postings[term])
+        return docs
+
+    def _word_docs(self, word):
+        digits = word.translate(_DIGITS)
+        if digits.isdigit():
+            # Order number, start of a phone number or a number in the address
+            docs = set(self.postings.get(ORDER_NUMBER + digits, ()))
+            docs.update(self._prefix_docs(PHONE + normalize_phone(digits)))
+            docs.update(self.postings.get(ADDRESS + digits, ()))
+            return docs
+        docs = self._prefix_docs(ADDRESS + word)
+        docs.update(self._prefix_docs(ITEM + word))
+        docs.update(self._prefix_docs(CASHIER + word))
+        return docs
+
+    def search(self, query='', start=None, end=None):
+        """Documents matching every word of query, placed between start and
+        end ('YYYY-MM-DD', end inclusive), oldest first."""
+        with self._lock:
+            matches = None
+            if start or end:
+                matches = set()
+                for term in self._terms_between(DAY + (start or ''), DAY + (end or '') + _TERM_END):
+                    matches.update(self.postings[term])
+            for word in sorted(normalize_arabic(query).split(), key=len, reverse=True):
+                docs = self._word_docs(word)
+                matches = docs if matches is None else matches & docs
+                if not matches:
+                    return []
+            if matches is None:
+                return list(range(len(self.rows)))
+            return sorted(matches)
+
+    def row(self, doc):
+        return self.rows[doc]
+
+
+class SearchResultSource:
+    # Row source over a search result; rows are looked up only for the visible page
+    def __init__(self, index, docs):
+        self.index = index
+        self.docs = docs
+
+    def __len__(self):
+        return len(self.docs)
+
+    def fetch(self, start, count):
+        return [self.index.row(doc) for doc in self.docs[start:start + count]]
+
+    def __iter__(self):
+        return (self.index.row(doc) for doc in self.docs)
+
+
+_order_search_index = None
+_order_search_index_lock = threading.Lock()  # Also created by the startup loader thread
+
+
+def get_order_search_index():
+    global _order_search_index
+    if _order_search_index is None:
+        with _order_search_index_lock:
+            if _order_search_index is None:
+                _order_search_index = OrderSearchIndex()
+    return _order_search_index
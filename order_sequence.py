@@ -0,0 +1,132 @@
+import itertools
+import json
+import os
+import threading
+from datetime import datetime
+
+from persistence import FileLock
+from shifts import shift_for
+
+SEQUENCE_FILE = 'order_sequence.json'
+# First number handed out in each period; kept above the 1000-9999 range the
+# old random generator used so new numbers never collide with legacy history
+SEQUENCE_START = 10000
+# Numbers reserved per trip to the counter file; tills sharing the file each
+# hold their own block, so they only contend once per block
+BLOCK_SIZE = 10
+# After a corrupt counter file numbering continues this far above the highest
+# number found, leaving room for blocks other tills reserved but have not used
+RECOVERY_GAP = 100
+# 'never', 'day' or 'shift'
+RESET_POLICY = os.environ.get('POS_ORDER_NUMBER_RESET', 'never')
+
+
+class OrderNumberAllocator:
+    """Hands out unique, increasing order numbers without scanning history.
+
+    The counter file only stores the period (day / shift / 'all') and the
+    next unreserved number.  A till reserves BLOCK_SIZE numbers at a time under
+    an OS file lock and persists the reservation (temp file + fsync + rename)
+    before using any of them, so a crash can skip numbers but never reuse one.
+    If the counter file is corrupt, numbering continues above the highest
+    number of the current period found in the order history and the open
+    orders, rather than starting the period over.
+    """
+
+    def __init__(self, path=SEQUENCE_FILE, reset_policy=RESET_POLICY, block_size=BLOCK_SIZE):
+        if reset_policy not in ('never', 'day', 'shift'):
+            raise ValueError(f"Unknown order number reset policy: {reset_policy}")
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.reset_policy = reset_policy
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._period = None
+        self._next = 0
+        self._block_end = 0
+
+    def current_period(self, now=None):
+        now = now or datetime.now()
+        if self.reset_policy == 'day':
+            return now.strftime('%Y-%m-%d')
+        if self.reset_policy == 'shift':
+            business_date, shift_name = shift_for(now)
+            return f"{business_date.isoformat()} {shift_name}"
+        return 'all'
+
+    def _read_counter(self):
+        # None when the file exists but cannot be read back
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                counter = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            print(f"Error decoding JSON in {self.path}. Recovering the order number from the history.")  # Debug print
+            return None
+        return counter if isinstance(counter, dict) else None
+
+    def _recover_next(self, period, in_use):
+        # Imported here: the store is only needed in this rare case
+        from order_store import get_order_store
+        highest = SEQUENCE_START - 1
+        for order in itertools.chain(get_order_store().iter_orders(), in_use):
+            if not isinstance(order, dict):
+                continue
+            try:
+                number = int(order.get('order_number'))
+                if self.reset_policy != 'never':
+                    placed = datetime.strptime(order.get('datetime'), '%Y-%m-%d %H:%M:%S')
+                    if self.current_period(placed) != period:
+                        continue
+            except (TypeError, ValueError):
+                continue
+            highest = max(highest, number)
+        if highest < SEQUENCE_START:
+            return SEQUENCE_START
+        return highest + 1 + RECOVERY_GAP
+
+    def _write_counter(self, counter):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(counter, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _reserve_block(self, period, in_use=()):
+        with FileLock(self.lock_path):
+            counter = self._read_counter()
+            if counter is None:
+                start = self._recover_next(period, in_use)
+            elif counter.get('period') == period:
+                start = counter.get('next', SEQUENCE_START)
+            else:
+                start = SEQUENCE_START
+            self._write_counter({'period': period, 'next': start + self.block_size})
+        self._period = period
+        self._next = start
+        self._block_end = start + self.block_size
+
+    def allocate(self, in_use=()):
+        # in_use lets the caller skip numbers still held by open orders, e.g.
+        # yesterday's unfinished order after a daily reset
+        with self._lock:
+            period = self.current_period()
+            while True:
+                if period != self._period or self._next >= self._block_end:
+                    self._reserve_block(period, in_use)
+                number = self._next
+                self._next += 1
+                if number not in in_use:
+                    return number
+
+
+_allocator = None
+
+
+def get_order_number_allocator():
+    global _allocator
+    if _allocator is None:
+        _allocator = OrderNumberAllocator()
+    return _allocator
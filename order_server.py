@@ -0,0 +1,433 @@
+import itertools
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import tkinter as tk
+
+from current_orders_wal import open_current_orders
+from order_book import CurrentOrderBook
+from order_events import make_order_id
+from order_sequence import get_order_number_allocator
+from persistence import get_persistence_worker
+
+# 'host:port' or 'unix:/path/to/socket'.  Unset, every till keeps its own
+# current orders as before; set, the tills share the server's order book.
+ORDER_SERVER = os.environ.get('POS_ORDER_SERVER')
+DEFAULT_ADDRESS = '127.0.0.1:8765'
+REQUEST_TIMEOUT = 5
+# How often pushed updates are applied on the Tk main thread (ms)
+PUSH_POLL_INTERVAL = 50
+# How often the server runs the persistence worker's completion callbacks (s)
+RESULT_POLL_SECONDS = 0.1
+# Wait between reconnect attempts after the connection drops (s)
+RECONNECT_SECONDS = 2
+
+# Pushed to every connected till after a change
+EVENT_ADDED = 'added'
+EVENT_STATUS = 'status'
+EVENT_REMOVED = 'removed'
+# Delivered locally when the connection to the server drops or comes back
+EVENT_DISCONNECTED = 'disconnected'
+EVENT_RESYNC = 'resync'
+
+
+class OrderServerError(ConnectionError):
+    pass
+
+
+def parse_address(address):
+    if address.startswith('unix:'):
+        return ('unix', address[len('unix:'):])
+    host, _, port = address.rpartition(':')
+    return ('tcp', host or '127.0.0.1', int(port))
+
+
+def _encode(message):
+    return (json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+# ----- server ---------------------------------------------------------------
+
+class OrderServer:
+    """Owns the open-orders book and the order number sequence for all tills.
+
+    The protocol is one JSON object per line.  A request is
+    {"id": n, "op": ..., ...}; the reply is {"id": n, "ok": true, "result": ...}
+    or {"id": n, "ok": false, "error": ...}.  After every change the server
+    pushes {"event": "added" | "status" | "removed", ...} to every
+    connection, the one that made the change included.  Requests run one at a
+    time on the event loop, so two tills can never interleave a change.  The
+    book is the usual WAL-backed CurrentOrderBook, so the server restarts
+    from current_orders.json plus the log like a standalone till does.
+    """
+
+    def __init__(self, book=None, allocator=None):
+        self.book = book if book is not None else open_current_orders()
+        self.allocator = allocator or get_order_number_allocator()
+        self.clients = set()
+
+    async def serve(self, address):
+        import asyncio
+        kind, *where = parse_address(address)
+        if kind == 'unix':
+            if os.path.exists(where[0]):
+                os.remove(where[0])  # Stale socket from a previous run
+            server = await asyncio.start_unix_server(self.handle, path=where[0])
+        else:
+            server = await asyncio.start_server(self.handle, host=where[0], port=where[1])
+        print(f"Order server listening on {address}")  # Debug print
+        delivery = asyncio.ensure_future(self._deliver_results())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            delivery.cancel()
+            self.close()
+
+    async def _deliver_results(self):
+        import asyncio
+        # WAL checkpoints clean up their rotated logs from these callbacks
+        while True:
+            get_persistence_worker().deliver_results()
+            await asyncio.sleep(RESULT_POLL_SECONDS)
+
+    async def handle(self, reader, writer):
+        self.clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    reply = {'id': request.get('id'), 'ok': True, 'result': self.dispatch(request)}
+                except Exception as e:
+                    print(f"Order server request failed: {e}")  # Debug print
+                    reply = {'id': request.get('id') if isinstance(request, dict) else None,
+                             'ok': False, 'error': str(e)}
+                writer.write(_encode(reply))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    def dispatch(self, request):
+        op = request.get('op')
+        if op == 'list':
+            return self.book.to_list()
+        if op == 'add':
+            order = self.book.add(request['order'])
+            self.broadcast({'event': EVENT_ADDED, 'order': order})
+            return order
+        if op == 'place':
+            # Number and order in one round trip, so no number is ever taken without its order
+            order_number = self.allocator.allocate(in_use=self.book)
+            order = dict(request['order'], order_number=order_number,
+                         order_id=make_order_id(order_number, request['order'].get('datetime')))
+            order = self.book.add(order)
+            self.broadcast({'event': EVENT_ADDED, 'order': order})
+            return order
+        if op == 'update_status':
+            order = self.book.update_status(request['order_number'], request['status'])
+            if order is not None:
+                self.broadcast({'event': EVENT_STATUS, 'order_number': order['order_number'],
+                                'status': order['status']})
+            return order
+        if op == 'remove':
+            order = self.book.remove(request['order_number'])
+            if order is not None:
+                self.broadcast({'event': EVENT_REMOVED, 'order_number': order['order_number']})
+            return order
+        raise ValueError(f"Unknown operation: {op}")
+
+    def broadcast(self, message):
+        data = _encode(message)
+        for writer in list(self.clients):
+            if writer.is_closing():
+                self.clients.discard(writer)
+                continue
+            writer.write(data)
+
+    def close(self):
+        self.book.journal.checkpoint(self.book)
+        get_persistence_worker().flush()
+        self.book.journal.close()
+
+
+def run_server(address=None):
+    # asyncio is only loaded by the server process, not by every till importing the client
+    import asyncio
+    server = OrderServer()
+    try:
+        asyncio.run(server.serve(address or ORDER_SERVER or DEFAULT_ADDRESS))
+    except KeyboardInterrupt:
+        pass
+
+
+# ----- client ---------------------------------------------------------------
+
+class OrderClient:
+    """Connection to the order server, shared by every request from a till.
+
+    request() sends on the one open socket and waits for the matching reply;
+    a reader thread routes replies to their callers and queues pushed
+    events for the owner to apply (see RemoteOrderBook).  A dropped
+    connection is re-established by a reconnect timer (or by the next
+    request, whichever comes first), so a till or kitchen screen that only
+    watches keeps receiving pushes; a 'resync' event then tells the owner to
+    reload the book.
+    """
+
+    def __init__(self, address, timeout=REQUEST_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self.events = queue.Queue()
+        self._ids = itertools.count(1)
+        self._pending = {}  # request id -> queue for its reply
+        self._lock = threading.Lock()
+        self._sock = None
+        self._connected_once = False
+        self._closed = False
+        self._reconnect_timer = None
+
+    def _connect(self):
+        kind, *where = parse_address(self.address)
+        if kind == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(where[0])
+        else:
+            sock = socket.create_connection((where[0], where[1]), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(None)
+        self._sock = sock
+        threading.Thread(target=self._read_loop, args=(sock,), name="order-client", daemon=True).start()
+        if self._connected_once:
+            self.events.put({'event': EVENT_RESYNC})
+        self._connected_once = True
+
+    def request(self, op, **params):
+        request_id = next(self._ids)
+        reply_queue = queue.Queue(maxsize=1)
+        data = _encode(dict(params, id=request_id, op=op))
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._pending[request_id] = reply_queue
+                self._sock.sendall(data)
+            except OSError as e:
+                self._pending.pop(request_id, None)
+                self._drop(self._sock)
+                raise OrderServerError(f"Order server unavailable: {e}") from e
+        try:
+            reply = reply_queue.get(timeout=self.timeout)
+        except queue.Empty:
+            self._pending.pop(request_id, None)
+            raise OrderServerError("Order server did not answer")
+        if reply is None:
+            raise OrderServerError("Connection to the order server was lost")
+        if not reply.get('ok'):
+            raise OrderServerError(reply.get('error', 'Order server error'))
+        return reply.get('result')
+
+    def _read_loop(self, sock):
+        try:
+            with sock.makefile('rb') as f:
+                for line in f:
+                    message = json.loads(line)
+                    if 'event' in message:
+                        self.events.put(message)
+                        continue
+                    reply_queue = self._pending.pop(message.get('id'), None)
+                    if reply_queue is not None:
+                        reply_queue.put(message)
+        except (OSError, ValueError) as e:
+            print(f"Order server connection error: {e}")  # Debug print
+        with self._lock:
+            self._drop(sock)
+
+    def _drop(self, sock):
+        # Called with self._lock held
+        if sock is None or sock is not self._sock:
+            return
+        self._sock = None
+        try:
+            sock.close()
+        except OSError:
+            pass
+        for request_id in list(self._pending):
+            self._pending.pop(request_id).put(None)
+        self.events.put({'event': EVENT_DISCONNECTED})
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        # Called with self._lock held
+        if self._closed:
+            return
+        self._reconnect_timer = threading.Timer(RECONNECT_SECONDS, self._reconnect)
+        self._reconnect_timer.daemon = True
+        self._reconnect_timer.start()
+
+    def _reconnect(self):
+        with self._lock:
+            if self._closed or self._sock is not None:
+                return  # Closed, or a request got there first
+            try:
+                self._connect()
+            except OSError as e:
+                print(f"Order server still unavailable: {e}")  # Debug print
+                self._schedule_reconnect()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            if self._reconnect_timer is not None:
+                self._reconnect_timer.cancel()
+            self._drop(self._sock)
+
+
+class RemoteOrderBook:
+    """The server's order book as seen by one till.
+
+    Reads come from a local CurrentOrderBook mirror, so the current-orders
+    table pages through it exactly as through a standalone book.  Changes
+    go to the server and the reply is applied to the mirror straight away;
+    pushed events (this till's own included, applied idempotently) keep
+    the mirror in step with the other tills.  They are applied on the Tk
+    main thread by the after() poll set up by attach(), which then calls
+    on_change(event).  After a reconnect the mirror is reloaded and the
+    differences (orders placed, changed or gone while the connection was
+    down) are reported to on_change as added/status/removed events first,
+    so subscribers such as the kitchen display catch up.
+    """
+
+    journal = None  # The server keeps the WAL
+
+    def __init__(self, client):
+        self.client = client
+        self.mirror = CurrentOrderBook()
+        self._root = None
+        self.on_change = None
+        self.reload()
+
+    def attach(self, root, on_change=None):
+        self._root = root
+        self.on_change = on_change
+        self._root.after(PUSH_POLL_INTERVAL, self._apply_events)
+
+    def reload(self):
+        self.mirror = CurrentOrderBook(self.client.request('list'))
+
+    # ----- reads ------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.mirror)
+
+    def __iter__(self):
+        return iter(self.mirror)
+
+    def __contains__(self, order_number):
+        return order_number in self.mirror
+
+    def get(self, order_number):
+        return self.mirror.get(order_number)
+
+    def with_status(self, status):
+        return self.mirror.with_status(status)
+
+    def count_by_status(self):
+        return self.mirror.count_by_status()
+
+    def fetch(self, start, count):
+        return self.mirror.fetch(start, count)
+
+    def to_list(self):
+        return self.mirror.to_list()
+
+    # ----- changes ----------------------------------------------------------
+
+    def add(self, order, replace=False):
+        order = self.client.request('add', order=order)
+        return self.mirror.add(order, replace=True)
+
+    def place(self, order):
+        order = self.client.request('place', order=order)
+        return self.mirror.add(order, replace=True)
+
+    def update_status(self, order_number, status):
+        order = self.client.request('update_status', order_number=order_number, status=status)
+        if order is None:
+            # Finished or removed by another till meanwhile
+            self.mirror.remove(order_number)
+            return None
+        return self.mirror.update_status(order_number, status)
+
+    def remove(self, order_number):
+        order = self.client.request('remove', order_number=order_number)
+        self.mirror.remove(order_number)
+        return order
+
+    # ----- pushed events ----------------------------------------------------
+
+    def apply_event(self, event):
+        # Returns the events to report, in order: the event itself, preceded
+        # on a resync by the differences between the old and new mirror
+        kind = event.get('event')
+        if kind == EVENT_ADDED:
+            self.mirror.add(event['order'], replace=True)
+        elif kind == EVENT_STATUS:
+            self.mirror.update_status(event['order_number'], event['status'])
+        elif kind == EVENT_REMOVED:
+            self.mirror.remove(event['order_number'])
+        elif kind == EVENT_RESYNC:
+            old = self.mirror
+            self.reload()
+            return self._differences(old, self.mirror) + [event]
+        return [event]
+
+    @staticmethod
+    def _differences(old, new):
+        changes = []
+        for order in old:
+            if order['order_number'] not in new:
+                # Finished or removed elsewhere; either way it is off the open orders
+                changes.append({'event': EVENT_REMOVED, 'order_number': order['order_number']})
+        for order in new:
+            before = old.get(order['order_number'])
+            if before is None:
+                changes.append({'event': EVENT_ADDED, 'order': order})
+            elif before.get('status') != order.get('status'):
+                changes.append({'event': EVENT_STATUS, 'order_number': order['order_number'],
+                                'status': order['status']})
+        return changes
+
+    def _apply_events(self):
+        try:
+            while True:
+                event = self.client.events.get_nowait()
+                try:
+                    changes = self.apply_event(event)
+                except OrderServerError as e:
+                    print(f"Could not reload current orders: {e}")  # Debug print
+                    changes = [event]
+                if self.on_change:
+                    for change in changes:
+                        self.on_change(change)
+        except queue.Empty:
+            pass
+        try:
+            self._root.after(PUSH_POLL_INTERVAL, self._apply_events)
+        except tk.TclError:
+            # Root destroyed; stop polling
+            pass
+
+
+if __name__ == "__main__":
+    run_server(sys.argv[1] if len(sys.argv) > 1 else None)
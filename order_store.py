@@ -0,0 +1,823 @@
+import codecs
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+
+from order_book import STATUS_DONE, status_matches
+from order_events import (RECORD_STATUS, ORDER_FORMAT, normalize_history, order_record, order_view,
+                          placed_entry, status_event)
+from persistence import FileLock
+
+# Legacy single-file order history (read once, then superseded by the journal)
+ORDERS_FILE = 'orders.json'
+JOURNAL_DIR = 'orders_journal'
+# 'journal' (default) or 'sqlite'; see sqlite_store.py
+STORAGE_BACKEND = os.environ.get('POS_STORAGE_BACKEND', 'journal')
+
+# Records per journal segment before it is sealed and a new one is started
+SEGMENT_MAX_RECORDS = 5000
+# Sealed segments allowed to pile up before they are folded into the snapshot
+COMPACT_AFTER_SEGMENTS = 4
+# fsync after this many appends or this many seconds, whichever comes first
+FSYNC_BATCH_SIZE = 20
+FSYNC_INTERVAL = 1.0
+# Legacy import progress is recorded in the manifest every this many orders
+LEGACY_IMPORT_BATCH = 1000
+# Bytes read at a time when streaming the legacy orders.json array
+READ_CHUNK_SIZE = 64 * 1024
+# Status event lines start with this (json.dumps keeps the key order)
+EVENT_PREFIX = b'{"type": "' + RECORD_STATUS.encode('utf-8') + b'"'
+
+
+def _segment_name(seq):
+    return f"segment-{seq:06d}.jsonl"
+
+
+def _segment_seq(file_name):
+    return int(file_name[len("segment-"):-len(".jsonl")])
+
+
+def iter_json_array(path, offset=0, chunk_size=READ_CHUNK_SIZE):
+    """Stream the elements of a top-level JSON array file.
+
+    Yields (element, byte offset just past it) without loading the file, so
+    memory stays bounded by one element plus one chunk.  Passing a previously
+    yielded offset resumes right after that element.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        buffer = ''
+        eof = False
+        while True:
+            stripped = buffer.lstrip(' \t\r\n,[')
+            offset += len(buffer) - len(stripped)  # Separators are all ASCII
+            buffer = stripped
+            if buffer.startswith(']'):
+                return
+            if buffer:
+                try:
+                    element, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    offset += len(buffer[:end].encode('utf-8'))
+                    buffer = buffer[end:]
+                    yield element, offset
+                    continue
+            elif eof:
+                return
+            # Need more data: the buffer is empty or ends mid-element
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += text_decoder.decode(chunk, final=eof)
+
+
+def _raw_string(line, key):
+    # A string field straight from the raw line, without parsing the JSON
+    needle = f'"{key}": "'.encode('utf-8')
+    start = line.find(needle)
+    if start < 0:
+        return None
+    start += len(needle)
+    return line[start:line.find(b'"', start)].decode('utf-8', 'replace')
+
+
+def _in_range(value, start, end):
+    # start / end: 'YYYY-MM-DD[ HH:MM:SS]' strings; end is exclusive
+    if value is None:
+        return False
+    return (start is None or value >= start) and (end is None or value < end)
+
+
+def _atomic_write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class OrderJournalStore:
+    """Append-only order history.
+
+    New records are appended as JSON lines to the active segment file, so a
+    write costs O(1) no matter how long the history is.  Full segments are
+    sealed and, once a few have accumulated, compacted into a single snapshot
+    file with an order_number -> byte offset index.  Compaction runs on its
+    own thread, so the append that seals a segment does not wait for the
+    history to be copied.  MANIFEST.json records the current snapshot and
+    the last segment it covers; it is always replaced atomically so a crash
+    mid-compaction never loses or duplicates orders.
+
+    Several processes (the tills of a multi-terminal setup) may share the
+    directory: appends, compaction and reads take a lock file, and each
+    process first picks up the records and manifest changes the others made
+    since it last looked (_refresh_locked).
+
+    Each order is written once when placed; status changes are small events
+    (see order_events.py).  The latest status per order_id is kept in memory
+    (saved next to the snapshot at compaction, rebuilt for the unsealed
+    segments at open), and readers get every order once, with that status.
+    """
+
+    def __init__(self, directory=JOURNAL_DIR):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+        self.manifest_path = os.path.join(self.directory, 'MANIFEST.json')
+        self._lock = threading.RLock()
+        self._lock_path = os.path.join(self.directory, 'journal.lock')  # Appends, manifest changes, reads
+        self._compact_lock_path = os.path.join(self.directory, 'compact.lock')  # One compaction at a time
+        self._lock_depth = 0  # Nesting of _locked() in the thread holding self._lock
+        self._manifest_stamp = self._stat_manifest()
+        self._manifest = self._read_manifest()
+        self._index = self._read_index()
+        self._latest = self._read_status()  # order_id -> (status, datetime, position of the event)
+        self._recent = {}  # order_id -> (seq, offset) of order records in unsealed segments
+
+        # Everything before (_active_seq, _active_size) has been read into
+        # _latest / _recent, by this process or from the other processes' appends
+        self._active = None
+        self._active_file_seq = None  # Segment the _active handle is open on
+        self._active_seq = self._manifest.get('compacted_through', 0) + 1
+        self._active_size = 0
+        self._active_count = 0
+        self._pending_sync = 0
+        self._last_sync = time.monotonic()
+        self._compaction = None  # Background compaction thread while one runs
+        self._compact_lock = threading.Lock()  # One compaction at a time within this process
+        if self._manifest.get('format', 1) < ORDER_FORMAT:
+            # Compaction lock first, as in compact(), so two tills never migrate at once
+            with self._compact_lock, FileLock(self._compact_lock_path), self._locked():
+                if self._manifest.get('format', 1) < ORDER_FORMAT:  # Not migrated by another till meanwhile
+                    self.migrate_events()
+        with self._locked():
+            pass  # Reads the unsealed segments and opens the active one
+
+    @contextmanager
+    def _locked(self):
+        # self._lock for the threads of this process, the lock file for the
+        # other processes; re-entrant, and the first entry catches up with
+        # what the other processes wrote
+        with self._lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with FileLock(self._lock_path):
+                self._lock_depth = 1
+                try:
+                    self._refresh_locked()
+                    yield
+                finally:
+                    self._lock_depth = 0
+
+    # ----- manifest / index -------------------------------------------------
+
+    def _read_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'snapshot': None, 'index': None, 'compacted_through': 0, 'legacy_imported': False,
+                'format': ORDER_FORMAT}
+
+    def _write_manifest(self):
+        _atomic_write_json(self.manifest_path, self._manifest)
+        self._manifest_stamp = self._stat_manifest()
+
+    def _stat_manifest(self):
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _read_index(self):
+        index_file = self._manifest.get('index')
+        if not index_file:
+            return {}
+        with open(os.path.join(self.directory, index_file), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _read_status(self):
+        status_file = self._manifest.get('status')
+        if not status_file:
+            return {}
+        with open(os.path.join(self.directory, status_file), 'r', encoding='utf-8') as f:
+            return {order_id: (status, when, tuple(position))
+                    for order_id, (status, when, position) in json.load(f).items()}
+
+    def _refresh_locked(self):
+        # Called under both locks: reload the manifest if another process
+        # changed it (a compaction), then read the status events and order
+        # offsets appended since (_active_seq, _active_size)
+        stamp = self._stat_manifest()
+        if stamp != self._manifest_stamp:
+            self._manifest_stamp = stamp
+            manifest = self._read_manifest()
+            compacted = manifest.get('compacted_through', 0) != self._manifest.get('compacted_through', 0)
+            self._manifest = manifest
+            if compacted:
+                self._index = self._read_index()
+                for order_id, latest in self._read_status().items():
+                    known = self._latest.get(order_id)
+                    if known is None or known[2] < latest[2]:
+                        self._latest[order_id] = latest
+                through = manifest.get('compacted_through', 0)
+                self._recent = {order_id: location for order_id, location in self._recent.items()
+                                if location[0] > through}
+
+        for seq in self._segment_seqs():
+            if seq < self._active_seq:
+                continue
+            if seq > self._active_seq:
+                # Rolled by another process (or compacted before this one read it)
+                self._active_seq, self._active_size, self._active_count = seq, 0, 0
+            path = self._segment_path(seq)
+            for start, end, line in self._scan_file(path, self._active_size):
+                self._active_size = end
+                self._active_count += 1
+                if line.startswith(EVENT_PREFIX):
+                    event = self._parse_line(path, line)
+                    if event is not None:
+                        self._latest[event['order_id']] = (event['status'], event.get('datetime'), (seq, end))
+                else:
+                    order_id = _raw_string(line, 'order_id')
+                    if order_id:
+                        self._recent[order_id] = (seq, start)
+
+        if self._active_file_seq != self._active_seq:
+            self._open_active_segment()
+
+    # ----- segments ---------------------------------------------------------
+
+    def _segment_seqs(self):
+        # Segments already folded into the snapshot are ignored even if a crash
+        # left them on disk
+        compacted_through = self._manifest.get('compacted_through', 0)
+        seqs = [_segment_seq(name) for name in os.listdir(self.directory)
+                if name.startswith("segment-") and name.endswith(".jsonl")]
+        return sorted(seq for seq in seqs if seq > compacted_through)
+
+    def _segment_path(self, seq):
+        return os.path.join(self.directory, _segment_name(seq))
+
+    def _open_active_segment(self):
+        # Binary append mode: every write lands at the current end of the
+        # file, wherever the other processes left it
+        if self._active is not None and not self._active.closed:
+            self._sync_locked()
+            self._active.close()
+        self._active = open(self._segment_path(self._active_seq), 'ab')
+        self._active_file_seq = self._active_seq
+
+    def _roll_segment(self):
+        self._active_seq += 1
+        self._active_count = 0
+        self._active_size = 0
+        self._open_active_segment()
+        if len(self._segment_seqs()) - 1 >= COMPACT_AFTER_SEGMENTS:
+            self.compact_in_background()
+
+    # ----- writes -----------------------------------------------------------
+
+    def _append_record(self, record):
+        # Returns the (seq, start, end) the line was written at
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._locked():
+            seq = self._active_seq
+            self._active.write(line)
+            self._active.flush()
+            end = self._active.tell()
+            start = end - len(line)
+            self._active_size = end
+            self._active_count += 1
+            self._pending_sync += 1
+            if record.get('type') == RECORD_STATUS:
+                self._latest[record['order_id']] = (record['status'], record.get('datetime'), (seq, end))
+            else:
+                self._recent[record['order_id']] = (seq, start)
+            if (self._pending_sync >= FSYNC_BATCH_SIZE
+                    or time.monotonic() - self._last_sync >= FSYNC_INTERVAL):
+                self._sync_locked()
+            if self._active_count >= SEGMENT_MAX_RECORDS:
+                self._roll_segment()
+        return seq, start, end
+
+    def append(self, order):
+        # A newly placed order; its status changes go through append_status()
+        self._append_record(order_record(order))
+
+    def append_status(self, order_id, order_number, status, when=None):
+        self._append_record(status_event(order_id, order_number, status, when))
+
+    def sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if self._pending_sync and self._active and not self._active.closed:
+            self._active.flush()
+            os.fsync(self._active.fileno())
+        self._pending_sync = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()  # Let a running compaction finish its manifest
+        with self._lock:
+            if self._active and not self._active.closed:
+                self._sync_locked()
+                self._active.close()
+
+    # ----- reads ------------------------------------------------------------
+
+    def _scan_file(self, path, offset=0, until=None):
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            yield from self._scan_lines(f, offset, until)
+
+    @staticmethod
+    def _scan_lines(f, offset=0, until=None):
+        # (start, end, raw line) for every complete line from offset on,
+        # stopping at byte offset until
+        f.seek(offset)
+        position = offset
+        for line in f:
+            start = position
+            position += len(line)
+            if until is not None and position > until:
+                return
+            if not line.endswith(b'\n'):
+                # A torn last line from a crash mid-append, or an append in progress
+                return
+            if line.strip():
+                yield start, position, line
+
+    def _parse_line(self, path, line):
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            print(f"Skipping corrupt journal line in {path}")
+            return None
+
+    def _iter_file(self, path):
+        for _, _, line in self._scan_file(path):
+            order = self._parse_line(path, line)
+            if order is not None:
+                yield order
+
+    def _read_line(self, path, offset):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline().decode('utf-8'))
+
+    def end_position(self):
+        # Position just past the last appended record, by any process
+        with self._locked():
+            return (self._active_seq, self._active_size)
+
+    def _view(self, record, until=None):
+        # The order with its latest status (as of position until, if given)
+        latest = self._latest.get(record.get('order_id'))
+        if latest is None or (until is not None and latest[2] > until):
+            return order_view(record)
+        return order_view(record, latest[0], latest[1])
+
+    def scan(self, since=None, until=None, statuses=None, start=None, end=None, order_number=None):
+        """Yield (position, order) for the matching orders, oldest first.
+
+        A position is (segment seq, byte offset in that segment) just past
+        the record.  Segments are copied verbatim into the snapshot and the
+        manifest records where each one starts there, so a position stays
+        valid after compaction.  Reading resumes from `since` by seeking
+        straight to that byte offset.  Status and date filters are first
+        checked against the raw line, so lines that cannot match are never
+        parsed.  Lookups by order_number go through the offset index and
+        return None positions.
+
+        Every order comes with its latest status as of `until`.  A full scan
+        yields each order once.  A resumed scan also yields an order placed
+        before `since` again when its status changed after `since`.
+        """
+        if order_number is not None:
+            for order in self.find(order_number):
+                if self._matches(order, statuses, start, end):
+                    yield None, order
+            return
+
+        since = tuple(since) if since is not None else None
+        # Every file is opened under the lock, together with the manifest it
+        # belongs to: a compaction finishing meanwhile removes them from the
+        # directory, but the open handles keep reading the same records
+        sources = []  # (file, path, offset to start at, offset to stop at, segment seq or None for the snapshot)
+        with self._locked():
+            self._active.flush()
+            snapshot = self._manifest.get('snapshot')
+            starts = self._manifest.get('segment_starts') or [[0, 0]]
+            compacted_through = self._manifest.get('compacted_through', 0)
+            until = tuple(until if until is not None else self.end_position())
+            if snapshot and (since is None or since[0] <= compacted_through):
+                offset = 0 if since is None else self._snapshot_offset(starts, *since)
+                path = os.path.join(self.directory, snapshot)
+                sources.append((open(path, 'rb'), path, offset, None, None))
+            for seq in self._segment_seqs():
+                if seq > until[0] or (since is not None and seq < since[0]):
+                    continue
+                offset = since[1] if since is not None and seq == since[0] else 0
+                path = self._segment_path(seq)
+                sources.append((open(path, 'rb'), path, offset, until[1] if seq == until[0] else None, seq))
+        try:
+            yield from self._scan_sources(sources, starts, since, until, statuses, start, end)
+        finally:
+            for f, *_ in sources:
+                f.close()
+
+    def _scan_sources(self, sources, starts, since, until, statuses, start, end):
+        begins = [begin for _, begin in starts]
+        seen = set()  # Orders placed after since; their events add nothing
+        for f, path, offset, limit, seq in sources:
+            for _, position, line in self._scan_lines(f, offset, limit):
+                if seq is None:
+                    # Snapshot offset -> the segment it was copied from
+                    i = bisect_right(begins, position - 1) - 1
+                    position = (starts[i][0], position - starts[i][1])
+                else:
+                    position = (seq, position)
+
+                if line.startswith(EVENT_PREFIX):
+                    view = self._event_view(path, line, position, since, until, seen)
+                    if view is not None and self._matches(view, statuses, start, end):
+                        yield position, view
+                    continue
+
+                order_id = _raw_string(line, 'order_id')
+                if statuses:
+                    latest = self._latest.get(order_id)
+                    raw_status = latest[0] if latest and latest[2] <= until else _raw_string(line, 'status')
+                    if raw_status is not None and not status_matches(raw_status, statuses):
+                        continue
+                if start is not None or end is not None:
+                    raw = _raw_string(line, 'datetime')
+                    if raw is not None and not _in_range(raw, start, end):
+                        continue
+                record = self._parse_line(path, line)
+                if record is None:
+                    continue
+                view = self._view(record, until)
+                if since is not None:
+                    seen.add(record.get('order_id'))
+                if self._matches(view, statuses, start, end):
+                    yield position, view
+
+    def _event_view(self, path, line, position, since, until, seen):
+        # A full scan already gives each order its latest status
+        if since is None:
+            return None
+        event = self._parse_line(path, line)
+        if event is None or event['order_id'] in seen:
+            return None
+        latest = self._latest.get(event['order_id'])
+        if latest is not None and position < latest[2] <= until:
+            return None  # Superseded by a later change that this scan also covers
+        record = self.get_order(event['order_id'])
+        if record is None:
+            return None
+        return order_view(record, event['status'], event.get('datetime'))
+
+    def _snapshot_offset(self, starts, seq, offset):
+        for start_seq, begin in reversed(starts):
+            if start_seq <= seq:
+                return begin + offset
+        return 0
+
+    def _matches(self, order, statuses, start, end):
+        if statuses and not status_matches(order.get('status', STATUS_DONE), statuses):
+            return False
+        if (start is not None or end is not None) and not _in_range(order.get('datetime'), start, end):
+            return False
+        return True
+
+    def iter_orders(self, statuses=None, order_number=None, start=None, end=None):
+        for _, order in self.scan(statuses=statuses, start=start, end=end, order_number=order_number):
+            yield order
+
+    def load_all(self):
+        return list(self.iter_orders())
+
+    def get_order(self, order_id):
+        # The order record as placed (without later status changes).  Under
+        # the lock, so the offsets and the files they point into belong to
+        # the same manifest
+        with self._locked():
+            recent = self._recent.get(order_id)
+            if recent is not None:
+                self._active.flush()
+                return self._read_line(self._segment_path(recent[0]), recent[1])
+            order_number = order_id.rsplit('-', 1)[-1]
+            snapshot = self._manifest.get('snapshot')
+            for offset in self._index.get(order_number, []) if snapshot else []:
+                record = self._read_line(os.path.join(self.directory, snapshot), offset)
+                if record.get('order_id') == order_id:
+                    return record
+            return None
+
+    def find(self, order_number):
+        # Snapshot hits come from the offset index, unsealed segments from the
+        # in-memory offsets; each order once, with its latest status.  A few
+        # seeks, all under the lock so a compaction cannot move them meanwhile
+        matches = []
+        suffix = f"-{order_number}"
+        with self._locked():
+            self._active.flush()
+            snapshot = self._manifest.get('snapshot')
+            offsets = self._index.get(str(order_number), [])
+            if snapshot and offsets:
+                with open(os.path.join(self.directory, snapshot), 'rb') as f:
+                    for offset in offsets:
+                        f.seek(offset)
+                        matches.append(self._view(json.loads(f.readline().decode('utf-8'))))
+            recent = [location for order_id, location in self._recent.items() if order_id.endswith(suffix)]
+            for seq, offset in sorted(recent):
+                matches.append(self._view(self._read_line(self._segment_path(seq), offset)))
+        return matches
+
+    # ----- compaction -------------------------------------------------------
+
+    def _write_snapshot_files(self, through, index, starts):
+        # Index and status files for snapshot-<through>, then the manifest
+        index_name = f"snapshot-{through:06d}.idx.json"
+        status_name = f"snapshot-{through:06d}.status.json"
+        _atomic_write_json(os.path.join(self.directory, index_name), index)
+        _atomic_write_json(os.path.join(self.directory, status_name),
+                           {order_id: [status, when, list(position)]
+                            for order_id, (status, when, position) in self._latest.items()
+                            if position[0] <= through})
+        old_files = [self._manifest.get(key) for key in ('snapshot', 'index', 'status')]
+        snapshot_name = f"snapshot-{through:06d}.jsonl"
+        self._manifest.update({'snapshot': snapshot_name, 'index': index_name, 'status': status_name,
+                               'compacted_through': through, 'segment_starts': starts})
+        self._write_manifest()
+        self._index = index
+        self._remove_files(os.path.join(self.directory, name) for name in old_files
+                           if name and name not in (snapshot_name, index_name, status_name))
+
+    def _remove_files(self, paths):
+        # Readers that opened a file before the manifest changed keep their
+        # handle; where the OS refuses to remove an open file (Windows) it is
+        # left for _remove_stale_files() at the next compaction
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Could not remove {path} yet: {e}")  # Debug print
+
+    def _remove_stale_files(self):
+        # Called with self._lock held: files no manifest refers to any more
+        current = {self._manifest.get(key) for key in ('snapshot', 'index', 'status')}
+        compacted_through = self._manifest.get('compacted_through', 0)
+        stale = []
+        for name in os.listdir(self.directory):
+            if name.startswith("segment-") and name.endswith(".jsonl"):
+                if _segment_seq(name) <= compacted_through:
+                    stale.append(name)
+            elif name.startswith("snapshot-") and name not in current:
+                stale.append(name)
+        self._remove_files(os.path.join(self.directory, name) for name in stale)
+
+    def compact_in_background(self):
+        # Called with self._lock held (from _roll_segment)
+        if self._compaction is not None and self._compaction.is_alive():
+            return  # The running one picks up the newly sealed segment next time
+        self._compaction = threading.Thread(target=self.compact, name="journal-compaction", daemon=True)
+        self._compaction.start()
+
+    def compact(self):
+        # The lock file keeps the other processes from compacting meanwhile
+        with self._compact_lock, FileLock(self._compact_lock_path):
+            self._compact()
+
+    def _compact(self):
+        # Sealed segments and snapshots never change, so they are copied
+        # without holding the journal locks; appends carry on in the active segment
+        with self._locked():
+            sealed = [seq for seq in self._segment_seqs() if seq != self._active_seq]
+            if not sealed:
+                return
+            through = sealed[-1]
+            old_snapshot = self._manifest.get('snapshot')
+            index = {key: list(offsets) for key, offsets in self._index.items()}
+            starts = list(self._manifest.get('segment_starts') or ([[0, 0]] if old_snapshot else []))
+        snapshot_path = os.path.join(self.directory, f"snapshot-{through:06d}.jsonl")
+
+        # The old snapshot is copied as-is (its index stays valid) and each
+        # segment's lines are appended verbatim, remembering where the
+        # segment starts so scan() positions survive the compaction
+        with open(snapshot_path, 'wb') as out:
+            if old_snapshot:
+                with open(os.path.join(self.directory, old_snapshot), 'rb') as f:
+                    shutil.copyfileobj(f, out)
+            for seq in sealed:
+                path = self._segment_path(seq)
+                starts.append([seq, out.tell()])
+                for _, _, line in self._scan_file(path):
+                    record = self._parse_line(path, line)
+                    if record is None:
+                        continue
+                    if record.get('type') != RECORD_STATUS:
+                        index.setdefault(str(record.get('order_number')), []).append(out.tell())
+                    out.write(line)
+            out.flush()
+            os.fsync(out.fileno())
+
+        with self._locked():
+            self._write_snapshot_files(through, index, starts)
+            self._remove_files(self._segment_path(seq) for seq in sealed)
+            self._remove_stale_files()
+            self._recent = {order_id: location for order_id, location in self._recent.items()
+                            if location[0] > through}
+            print(f"Compacted order journal through segment {through}.")  # Debug print
+
+    def migrate_events(self):
+        """Rewrite the old history (a full order copy per status change) as
+        order records plus status events, in a new snapshot.
+
+        Positions saved before the migration are not valid afterwards; the
+        manifest's 'format' tells readers that persist them (ORDER_FORMAT).
+        """
+        with self._locked():
+            self._sync_locked()
+            self._active.close()
+            snapshot = self._manifest.get('snapshot')
+            sources = [os.path.join(self.directory, snapshot)] if snapshot else []
+            seqs = self._segment_seqs()
+            sources += [self._segment_path(seq) for seq in seqs]
+            through = seqs[-1] if seqs else self._manifest.get('compacted_through', 0)
+
+            def history():
+                for path in sources:
+                    yield from self._iter_file(path)
+
+            index, self._latest, self._recent = {}, {}, {}
+            copies = records = 0
+            tmp_path = os.path.join(self.directory, 'migrating.jsonl')
+            with open(tmp_path, 'wb') as out:
+                for record, _ in normalize_history(history()):
+                    copies += 1
+                    start = out.tell()
+                    out.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+                    if record['type'] == RECORD_STATUS:
+                        self._latest[record['order_id']] = (record['status'], record.get('datetime'), (0, out.tell()))
+                    else:
+                        records += 1
+                        index.setdefault(str(record.get('order_number')), []).append(start)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, os.path.join(self.directory, f"snapshot-{through:06d}.jsonl"))
+            self._manifest['format'] = ORDER_FORMAT
+            self._write_snapshot_files(through, index, [[0, 0]])
+
+            self._remove_files(self._segment_path(seq) for seq in seqs)
+            self._active_seq, self._active_size, self._active_count = through + 1, 0, 0
+            self._open_active_segment()
+            print(f"Migrated order history: {records} orders, {copies - records} status events.")  # Debug print
+
+    # ----- legacy import ----------------------------------------------------
+
+    def _imported_records(self):
+        # On resume: what normalize_history knew of the orders already
+        # imported, and the keys of every record written, so the batch after
+        # the last saved offset is not appended twice
+        placed, written = {}, set()
+        snapshot = self._manifest.get('snapshot')
+        sources = [os.path.join(self.directory, snapshot)] if snapshot else []
+        sources += [self._segment_path(seq) for seq in self._segment_seqs()]
+        for path in sources:
+            for record in self._iter_file(path):
+                if record.get('type') == RECORD_STATUS:
+                    written.add((record['order_id'], record.get('status'), record.get('datetime')))
+                else:
+                    placed[record.get('order_number')] = placed_entry(record)
+                    written.add(record['order_id'])
+        return placed, written
+
+    def import_legacy(self, path=ORDERS_FILE):
+        # Streams the array instead of json.load-ing it, folding the repeated
+        # copies of each order into status events.  Progress is saved in the
+        # manifest, so an interrupted import resumes from the last saved byte
+        # offset; records of the repeated batch already in the journal are skipped.
+        # Holds the journal lock throughout, so a second till starting at the
+        # same time waits and then finds the import done
+        with self._locked():
+            return self._import_legacy(path)
+
+    def _import_legacy(self, path):
+        if self._manifest.get('legacy_imported'):
+            return 0
+        imported = 0
+        if os.path.exists(path):
+            progress = {'offset': self._manifest.get('legacy_offset', 0)}
+            placed, written = self._imported_records() if progress['offset'] else ({}, set())
+
+            def legacy_orders():
+                for order, offset in iter_json_array(path, progress['offset']):
+                    yield order
+                    progress['offset'] = offset
+
+            try:
+                for record, _ in normalize_history(legacy_orders(), placed):
+                    if record['type'] == RECORD_STATUS:
+                        key = (record['order_id'], record.get('status'), record.get('datetime'))
+                    else:
+                        key = record['order_id']
+                    if key in written:
+                        continue
+                    self._append_record(record)
+                    imported += 1
+                    if imported % LEGACY_IMPORT_BATCH == 0:
+                        self.sync()
+                        self._manifest['legacy_offset'] = progress['offset']
+                        self._write_manifest()
+            except json.JSONDecodeError:
+                # Left unfinished: fixing the file and restarting resumes the import
+                self.sync()
+                print(f"Error decoding JSON in {path}. Imported {imported} records before the error.")
+                return imported
+            self.sync()
+        self._manifest['legacy_imported'] = True
+        self._manifest.pop('legacy_offset', None)
+        self._write_manifest()
+        print(f"Imported {imported} records from {path}.")  # Debug print
+        return imported
+
+
+class OrderFeed:
+    """Reads only the orders appended since its previous read.
+
+    Keeps the store position reached by the last read (a saved position can
+    also be passed in).  Re-opening a view that holds a feed then parses only
+    the new records: the journal seeks straight to the stored byte offset,
+    and SQLite starts after the stored row id.  read() must be consumed to
+    the end for the position to advance.
+    """
+
+    def __init__(self, store=None, position=None, **filters):
+        self.store = store or get_order_store()
+        self.position = position
+        self.filters = filters
+
+    def read(self):
+        until = self.store.end_position()
+        for _, order in self.store.scan(since=self.position, until=until, **self.filters):
+            yield order
+        self.position = until
+
+
+_order_store = None
+# The store may be opened by the startup loader thread
+# while the Tk thread asks for it
+_order_store_lock = threading.Lock()
+
+
+def get_order_store():
+    global _order_store
+    if _order_store is None:
+        with _order_store_lock:
+            if _order_store is None:
+                if STORAGE_BACKEND == 'sqlite':
+                    from sqlite_store import get_sqlite_store
+                    store = get_sqlite_store()
+                else:
+                    store = OrderJournalStore()
+                    store.import_legacy()
+                _order_store = store
+    return _order_store
+
+
+if __name__ == "__main__":
+    # python order_store.py import [orders.json]   -- one-time legacy import
+    # python order_store.py compact                -- fold sealed segments now
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    store = OrderJournalStore()
+    if command == "import":
+        store.import_legacy(sys.argv[2] if len(sys.argv) > 2 else ORDERS_FILE)
+    elif command == "compact":
+        store.compact()
+    else:
+        print("Usage: python order_store.py [import [orders.json] | compact]")
+    store.close()
@@ -0,0 +1,158 @@
+import itertools
+import json
+import os
+import queue
+import threading
+import tkinter as tk
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Distinct keys allowed in flight before submit() blocks the caller
+MAX_PENDING_WRITES = 64
+# How often the Tk main thread picks up completion / failure notices (ms)
+RESULT_POLL_INTERVAL = 100
+
+
+def write_json_atomic(path, data, indent=None):
+    # Readers never see a half-written file: write a temp file, fsync, rename
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class FileLock:
+    # Exclusive OS lock on path, shared by every process (till) using the file
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a+')
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+
+
+class PersistenceWorker:
+    """Runs disk writes on a background thread.
+
+    Jobs submitted under the same key are coalesced: if a job for that key is
+    still waiting, it is replaced by the newer one, so e.g. only the latest
+    snapshot of the current orders is written.  The replacement also moves
+    to the back of the queue, so a job always runs after everything
+    submitted before it (a catch-up scheduled after an append sees that
+    append).  Jobs without a key always run, in submission order.  Results
+    are queued and delivered on the Tk main thread by a poll scheduled with
+    after(), never from the worker thread.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING_WRITES):
+        self.max_pending = max_pending
+        self._latest = {}  # key -> job, in run order (dicts keep insertion order)
+        self._unfinished = 0  # Queued or running, for flush()
+        self._lock = threading.Condition()
+        self._results = queue.Queue()
+        self._unique_keys = itertools.count()
+        self._root = None
+        self.on_error = None
+        self._thread = threading.Thread(target=self._run, name="persistence-worker", daemon=True)
+        self._thread.start()
+
+    def attach(self, root, on_error=None):
+        # Start delivering results to Tk callbacks on this root's main loop
+        self._root = root
+        self.on_error = on_error
+        self._root.after(RESULT_POLL_INTERVAL, self._deliver_results)
+
+    def submit(self, key, func, *args, on_done=None, on_error=None):
+        if key is None:
+            key = ('unique', next(self._unique_keys))
+        with self._lock:
+            while key not in self._latest and len(self._latest) >= self.max_pending:
+                self._lock.wait()
+            if key in self._latest:
+                del self._latest[key]  # Re-inserted below, behind the jobs submitted since
+            else:
+                self._unfinished += 1
+            self._latest[key] = (func, args, on_done, on_error)
+            self._lock.notify_all()
+
+    def submit_json(self, path, data, indent=None, on_done=None, on_error=None):
+        self.submit(('json', path), write_json_atomic, path, data, indent, on_done=on_done, on_error=on_error)
+
+    def flush(self):
+        # Block until every submitted job has been written
+        with self._lock:
+            while self._unfinished:
+                self._lock.wait()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._latest:
+                    self._lock.wait()
+                key = next(iter(self._latest))
+                func, args, on_done, on_error = self._latest.pop(key)
+                self._lock.notify_all()  # Room for a blocked submit()
+            try:
+                func(*args)
+                if on_done:
+                    self._results.put((on_done, None))
+            except Exception as e:
+                print(f"Background write failed: {e}")
+                callback = on_error or self.on_error
+                if callback:
+                    self._results.put((callback, e))
+            finally:
+                with self._lock:
+                    self._unfinished -= 1
+                    self._lock.notify_all()
+
+    def deliver_results(self):
+        # Run the queued callbacks on the calling thread; the Tk poll below
+        # does this on the main loop, the order server from its event loop
+        try:
+            while True:
+                callback, error = self._results.get_nowait()
+                if error is None:
+                    callback()
+                else:
+                    callback(error)
+        except queue.Empty:
+            pass
+
+    def _deliver_results(self):
+        self.deliver_results()
+        try:
+            self._root.after(RESULT_POLL_INTERVAL, self._deliver_results)
+        except tk.TclError:
+            # Root destroyed; stop polling
+            pass
+
+
+_worker = None
+
+
+def get_persistence_worker():
+    global _worker
+    if _worker is None:
+        _worker = PersistenceWorker()
+    return _worker
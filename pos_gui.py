@@ -1,35 +1,40 @@
+from startup_timeline import get_startup_timeline  # First, so the timeline starts with the process
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog, filedialog
+from tkinter import ttk, messagebox, simpledialog
 import time
 import os
-import subprocess
-from login_panel import start_login
-from revenue_management_ui import ModernRevenueManagementUI
-import random  # Add this import at the top of the file
+import threading
+from login_panel import ModernLoginPanel
 import json
+from order_store import get_order_store
+from current_orders_wal import open_current_orders
+from order_server import ORDER_SERVER, OrderClient, OrderServerError, RemoteOrderBook, EVENT_ADDED, EVENT_STATUS, EVENT_REMOVED
+from order_bus import get_order_bus, event_for_status, ORDER_CREATED, ORDER_REMOVED
+from order_book import normalize_order_number
+from menu_catalog import MenuCatalog, build_catalog, SEARCH_LIMIT
+from order_search import get_order_search_index, SearchResultSource
+from customer_directory import get_customer_directory
+from order_sequence import get_order_number_allocator
+from virtual_table import VirtualTable
+from persistence import get_persistence_worker
+from item_sales import record_order
+from shift_revenue import get_shift_revenue_job
+from order_events import make_order_id, order_id_for
+import receipt_renderer
+from receipt_spooler import get_receipt_spooler, STATUS_PRINTED, STATUS_RETRYING
 
 # Add this constant for the font
 GLOBAL_FONT = ("Tajawal", 12)
+# Statuses listed in the reports window ('ملغي بواسطة' covers every canceller)
+REPORT_STATUSES = ['ناجح', 'ملغي بواسطة']
+# Lazy startup (default): the order store, the data derived from it and the
+# rarely used windows' modules are loaded on a thread of their own after
+# the first paint.  POS_LAZY_STARTUP=0 loads everything before the window shows.
+LAZY_STARTUP = os.environ.get('POS_LAZY_STARTUP', '1') != '0'
+# How often the Tk main thread checks whether the startup loader is done (ms)
+STARTUP_POLL_INTERVAL = 100
 
-def save_current_orders(orders):
-    with open('current_orders.json', 'w', encoding='utf-8') as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
-    print("Current orders saved successfully.")  # Debug print
-
-def load_current_orders():
-    if not os.path.exists('current_orders.json'):
-        print("current_orders.json does not exist. Creating an empty file.")  # Debug print
-        save_current_orders([])  # Create an empty file if it doesn't exist
-        return []
-    
-    try:
-        with open('current_orders.json', 'r', encoding='utf-8') as f:
-            orders = json.load(f)
-        print(f"Loaded {len(orders)} current orders.")  # Debug print
-        return orders
-    except json.JSONDecodeError:
-        print("Error decoding JSON. Returning an empty list.")  # Debug print
-        return []
+get_startup_timeline().mark('imports')
 
 def load_menu():
     if not os.path.exists('menu.json'):
@@ -46,41 +51,34 @@ def load_menu():
         return json.load(f)
 
 def save_menu(menu):
-    with open('menu.json', 'w', encoding='utf-8') as f:
-        json.dump(menu, f, ensure_ascii=False, indent=4)
+    snapshot = {category: dict(items) for category, items in menu.items()}
+    get_persistence_worker().submit_json('menu.json', snapshot, indent=4)
 
 def load_orders():
-    try:
-        with open('orders.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("orders.json not found. Returning an empty list.")
-        return []
-    except json.JSONDecodeError:
-        print("Error decoding JSON in orders.json. Returning an empty list.")
-        return []
-
-def save_order(items, total, delivery_location, order_number, phone_number, delivery_fee, status='قيد التنفيذ'):
-    orders = load_orders()
-    new_order = {
-        'order_number': order_number,
-        'items': items,
-        'total': total,
-        'delivery_location': delivery_location,
-        'phone_number': phone_number,
-        'delivery_fee': delivery_fee,
-        'datetime': time.strftime('%Y-%m-%d %H:%M:%S'),
-        'status': status
-    }
-    orders.append(new_order)
-    with open('orders.json', 'w', encoding='utf-8') as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
+    get_persistence_worker().flush()  # Make queued appends visible
+    return get_order_store().load_all()
+
+def save_order(order):
+    # Appended to the order history once, when the order is placed; the copy
+    # keeps later status changes on the open order out of the queued write
+    get_persistence_worker().submit(None, get_order_store().append, dict(order))
+    get_customer_directory().schedule()  # Runs after the append above
+
+def save_order_status(order, status):
+    # Status changes are small events referring to the saved order
+    get_persistence_worker().submit(None, get_order_store().append_status, order_id_for(order),
+                                    order['order_number'], status, time.strftime('%Y-%m-%d %H:%M:%S'))
+    record_order(dict(order, status=status))  # Keep the item sales report current
+    if status == 'ناجح':
+        get_shift_revenue_job().schedule()  # Runs after the append above
+    get_order_search_index().schedule()  # Finished and cancelled orders become searchable
 
 class ModernFoodOrderGUI:
-    def __init__(self, master, username, role):
+    def __init__(self, master, username, role, on_switch_user=None):
         self.master = master
         self.username = username
         self.role = role
+        self.on_switch_user = on_switch_user
         self.master.title(f"نظام طلب الطعام الحديث - مسجل دخول كـ {username} ({role})")
         
         # Set the window to full screen
@@ -98,17 +96,191 @@ class ModernFoodOrderGUI:
         self.master.option_add("*Font", GLOBAL_FONT)
 
         self.order = {}
+        self.order_rows = {}  # item id -> widgets of its row in the order panel
+        self.order_total = 0.0  # Running total, kept in step with self.order
         self.selected_category = None
+        self.category_grids = {}  # category -> its built tile grid, reused across switches
+        self.visible_grid = None
         self.menu_label = None  # Initialize menu_label
-        self.current_orders = load_current_orders()  # Load current orders from file
+        self.admin_sidebar_buttons = []
+        self.grid_admin_widgets = {}  # category -> [(widget, show)] of its cached grid
+        self.kitchen_displays = []
+        self.search_frame = None
+        self.search_tiles = []  # Reused result tiles, shown / hidden per query
+        self.search_results = []
+        if ORDER_SERVER:
+            # Shared with the other tills through the order server
+            self.order_client = OrderClient(ORDER_SERVER)
+            try:
+                self.current_orders = RemoteOrderBook(self.order_client)
+            except OrderServerError as e:
+                messagebox.showerror("خطأ", f"تعذر الاتصال بخادم الطلبات: {e}")
+                raise
+        else:
+            # Last checkpoint plus the write-ahead log of changes made since
+            self.order_client = None
+            self.current_orders = open_current_orders()
+        self.master.report_callback_exception = self.report_callback_exception
+        timeline = get_startup_timeline()
+        timeline.mark('current_orders')
 
         self.menu = load_menu()
+        self.catalog = MenuCatalog(self.menu)
+        timeline.mark('menu')
+        get_persistence_worker().attach(self.master, on_error=self.on_save_error)
+        if not LAZY_STARTUP:
+            self.load_in_background()
+            timeline.mark('background_ready')
         self.create_widgets()
         self.update_datetime()
+        timeline.mark('widgets')
+        self.master.after_idle(self.on_first_paint)
+        # Receipts print in the background; status changes update the sidebar
+        get_receipt_spooler().attach(self.master, on_status=self.on_print_status)
+        if self.order_client:
+            # Changes made on other tills show up without reopening the window
+            self.current_orders.attach(self.master, on_change=self.on_order_pushed)
         
         self.current_orders_window = None
         self.current_orders_tree = None
 
+    def on_first_paint(self):
+        self.master.update_idletasks()
+        get_startup_timeline().milestone('first_paint')
+        if LAZY_STARTUP:
+            # Not on the persistence worker: saves, flush() and the reports must not queue behind it
+            self.background_loader = threading.Thread(target=self.run_background_load, name="startup-loader",
+                                                      daemon=True)
+            self.background_loader.start()
+            self.master.after(STARTUP_POLL_INTERVAL, self.check_background_loaded)
+
+    def run_background_load(self):
+        try:
+            self.load_in_background()
+        except Exception as e:
+            print(f"Background loading failed: {e}")  # Debug print
+
+    def check_background_loaded(self):
+        if self.background_loader.is_alive():
+            self.master.after(STARTUP_POLL_INTERVAL, self.check_background_loaded)
+        else:
+            self.on_background_loaded()
+
+    def load_in_background(self):
+        # Runs on the startup loader thread after the first paint (lazy
+        # startup) or before the widgets are built
+        timeline = get_startup_timeline()
+        get_order_store()
+        timeline.mark('order_store')
+        get_shift_revenue_job().catch_up()  # Orders saved since the last run
+        get_order_search_index().catch_up()
+        get_customer_directory().catch_up()  # One pass over the history, ready before most deliveries
+        timeline.mark('derived_data')
+        if LAZY_STARTUP:
+            # Warm the module cache so the first click on these windows does not pay for the imports
+            import revenue_management_ui
+            import kitchen_display
+            import delivery_dialog
+            timeline.mark('deferred_imports')
+
+    def on_background_loaded(self):
+        get_startup_timeline().milestone('background_ready')
+
+    def on_save_error(self, error):
+        messagebox.showerror("خطأ", f"فشل حفظ البيانات: {error}")
+
+    def report_callback_exception(self, exc_type, exc_value, exc_traceback):
+        if isinstance(exc_value, OrderServerError):
+            messagebox.showerror("خطأ", f"تعذر الاتصال بخادم الطلبات: {exc_value}")
+            return
+        tk.Tk.report_callback_exception(self.master, exc_type, exc_value, exc_traceback)
+
+    def publish_order_event(self, event, order):
+        # With the order server every till, this one included, publishes
+        # from the server's pushes instead (see on_order_pushed)
+        if not self.order_client:
+            get_order_bus().publish(event, order)
+
+    def on_order_pushed(self, push):
+        kind = push.get('event')
+        if kind == EVENT_ADDED:
+            get_order_bus().publish(ORDER_CREATED, push['order'])
+        elif kind == EVENT_STATUS:
+            event = event_for_status(push['status'])
+            order = self.current_orders.get(push['order_number'])
+            if event and order:
+                get_order_bus().publish(event, order)
+        elif kind == EVENT_REMOVED:
+            get_order_bus().publish(ORDER_REMOVED, {'order_number': push['order_number']})
+        self.refresh_current_orders()
+
+    def show_kitchen_display(self):
+        from kitchen_display import KitchenDisplay
+        self.kitchen_displays.append(KitchenDisplay(self.master, self.current_orders))
+
+    # ----- user switching ---------------------------------------------------
+
+    def switch_user(self, username, role):
+        # Same window, menu and orders; only the user and the admin widgets change
+        self.close_session_windows()
+        self.username = username
+        self.role = role
+        self.master.title(f"نظام طلب الطعام الحديث - مسجل دخول كـ {username} ({role})")
+        is_admin = role == "admin"
+        for widgets in self.grid_admin_widgets.values():
+            for widget, show in widgets:
+                self.show_admin_widget(widget, show, is_admin)
+        self.refresh_categories()
+
+    def close_session_windows(self):
+        # Windows opened by the previous user; the kitchen screens stay up
+        self.kitchen_displays = [display for display in self.kitchen_displays if display.window.winfo_exists()]
+        kitchen_windows = {display.window for display in self.kitchen_displays}
+        for widget in self.master.winfo_children():
+            if isinstance(widget, tk.Toplevel) and widget not in kitchen_windows:
+                widget.destroy()
+
+    def admin_widget(self, widgets, widget, show):
+        # Built for every user, shown only to admins; switch_user toggles it
+        widgets.append((widget, show))
+        self.show_admin_widget(widget, show, self.role == "admin")
+
+    @staticmethod
+    def show_admin_widget(widget, show, visible):
+        if visible:
+            if not widget.winfo_manager():
+                show()
+        elif widget.winfo_manager() == 'grid':
+            widget.grid_remove()
+        elif widget.winfo_manager() == 'pack':
+            widget.pack_forget()
+
+    def request_user_switch(self):
+        if self.on_switch_user:
+            self.on_switch_user()
+
+    def close_current_orders(self):
+        if self.order_client:
+            get_persistence_worker().flush()  # Wait for queued writes
+            self.order_client.close()
+            return
+        self.current_orders.journal.checkpoint(self.current_orders)  # Checkpoint current orders before closing
+        get_persistence_worker().flush()  # Wait for queued writes
+        self.current_orders.journal.close()
+
+    def on_print_status(self, job):
+        spooler = get_receipt_spooler()
+        if spooler.failed:
+            self.print_status_label.config(text=f"فشل طباعة {len(spooler.failed)} - اضغط لإعادة المحاولة", fg="#e74c3c")
+        elif job.status == STATUS_RETRYING:
+            self.print_status_label.config(text=f"إعادة محاولة طباعة {job.title}", fg="#f39c12")
+        elif job.status == STATUS_PRINTED:
+            self.print_status_label.config(text=f"تمت طباعة {job.title}", fg="white")
+
+    def retry_failed_prints(self, event=None):
+        if get_receipt_spooler().retry_failed():
+            self.print_status_label.config(text="جاري إعادة الطباعة...", fg="white")
+
     def exit_fullscreen(self, event=None):
         self.master.attributes('-fullscreen', False)
         self.master.geometry("1366x768")
@@ -142,31 +314,18 @@ class ModernFoodOrderGUI:
             btn.bind("<Enter>", lambda e, b=btn: b.config(bg="#3498db"))
             btn.bind("<Leave>", lambda e, b=btn: b.config(bg="#34495e"))
 
-        if self.role == "admin":
-            add_category_btn = tk.Button(self.sidebar, text="إضافة فئة", command=self.add_category,
-                                         bg="#27ae60", fg="white", font=GLOBAL_FONT, bd=0, padx=10, pady=5)
-            add_category_btn.pack(fill="x", padx=10, pady=5)
-            add_category_btn.bind("<Enter>", lambda e, b=add_category_btn: b.config(bg="#2ecc71"))
-            add_category_btn.bind("<Leave>", lambda e, b=add_category_btn: b.config(bg="#27ae60"))
-
-            edit_category_btn = tk.Button(self.sidebar, text="تعديل فئة", command=self.edit_category,
-                                         bg="#f39c12", fg="white", font=GLOBAL_FONT, bd=0, padx=10, pady=5)
-            edit_category_btn.pack(fill="x", padx=10, pady=5)
-            edit_category_btn.bind("<Enter>", lambda e, b=edit_category_btn: b.config(bg="#d35400"))
-            edit_category_btn.bind("<Leave>", lambda e, b=edit_category_btn: b.config(bg="#f39c12"))
-
-            view_reports_btn = tk.Button(self.sidebar, text="عرض التقارير", command=self.view_reports,
-                                         bg="#9b59b6", fg="white", font=GLOBAL_FONT, bd=0, padx=10, pady=5)
-            view_reports_btn.pack(fill="x", padx=10, pady=5)
-            view_reports_btn.bind("<Enter>", lambda e, b=view_reports_btn: b.config(bg="#8e44ad"))
-            view_reports_btn.bind("<Leave>", lambda e, b=view_reports_btn: b.config(bg="#9b59b6"))
-
-            # Add Developer Info button (only for admin)
-            developer_btn = tk.Button(self.sidebar, text="مطور التطبيق", command=self.show_developer_info,
-                                      bg="#3498db", fg="white", font=GLOBAL_FONT, bd=0, padx=10, pady=5)
-            developer_btn.pack(fill="x", padx=10, pady=5)
-            developer_btn.bind("<Enter>", lambda e, b=developer_btn: b.config(bg="#2980b9"))
-            developer_btn.bind("<Leave>", lambda e, b=developer_btn: b.config(bg="#3498db"))
+        # Created for every user, packed for admins only (refresh_categories re-applies this on a switch)
+        for text, command, bg, hover in (("إضافة فئة", self.add_category, "#27ae60", "#2ecc71"),
+                                         ("تعديل فئة", self.edit_category, "#f39c12", "#d35400"),
+                                         ("عرض التقارير", self.view_reports, "#9b59b6", "#8e44ad"),
+                                         ("مطور التطبيق", self.show_developer_info, "#3498db", "#2980b9")):
+            btn = tk.Button(self.sidebar, text=text, command=command,
+                            bg=bg, fg="white", font=GLOBAL_FONT, bd=0, padx=10, pady=5)
+            btn.bind("<Enter>", lambda e, b=btn, c=hover: b.config(bg=c))
+            btn.bind("<Leave>", lambda e, b=btn, c=bg: b.config(bg=c))
+            self.admin_sidebar_buttons.append(btn)
+            if self.role == "admin":
+                btn.pack(fill="x", padx=10, pady=5)
 
         # Add exit button (for all roles)
         exit_btn = tk.Button(self.sidebar, text="إغلاق التطبيق", command=self.exit_application,
@@ -175,10 +334,23 @@ class ModernFoodOrderGUI:
         exit_btn.bind("<Enter>", lambda e, b=exit_btn: b.config(bg="#c0392b"))
         exit_btn.bind("<Leave>", lambda e, b=exit_btn: b.config(bg="#e74c3c"))
 
+        if self.on_switch_user:
+            self.switch_user_btn = tk.Button(self.sidebar, text="تبديل المستخدم", command=self.request_user_switch,
+                                             bg="#7f8c8d", fg="white", font=GLOBAL_FONT, bd=0, padx=10, pady=5)
+            self.switch_user_btn.pack(fill="x", padx=10, pady=5, side="bottom")
+            self.switch_user_btn.bind("<Enter>", lambda e, b=self.switch_user_btn: b.config(bg="#95a5a6"))
+            self.switch_user_btn.bind("<Leave>", lambda e, b=self.switch_user_btn: b.config(bg="#7f8c8d"))
+
         # Add datetime label
         self.datetime_label = tk.Label(self.sidebar, text="", font=GLOBAL_FONT, bg="#2c3e50", fg="white")
         self.datetime_label.pack(side="bottom", pady=10)
 
+        # Printer status; click to retry failed receipts
+        self.print_status_label = tk.Label(self.sidebar, text="", font=(GLOBAL_FONT[0], 10), bg="#2c3e50",
+                                           fg="white", wraplength=230, cursor="hand2")
+        self.print_status_label.pack(side="bottom", pady=5)
+        self.print_status_label.bind("<Button-1>", self.retry_failed_prints)
+
     def update_datetime(self):
         current_time = time.strftime("%Y-%m-%d %H:%M:%S")
         try:
@@ -193,6 +365,15 @@ class ModernFoodOrderGUI:
         self.menu_label = tk.Label(self.content, text="اختر فئة", font=(GLOBAL_FONT[0], 24, "bold"), bg="#ecf0f1")
         self.menu_label.pack(pady=(20, 10))
 
+        search_bar = tk.Frame(self.content, bg="#ecf0f1")
+        search_bar.pack(fill="x", padx=20, pady=(0, 10))
+        tk.Label(search_bar, text="بحث:", font=GLOBAL_FONT, bg="#ecf0f1").pack(side="right")
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", self.on_search_change)
+        self.search_entry = tk.Entry(search_bar, textvariable=self.search_var, font=GLOBAL_FONT, justify="right")
+        self.search_entry.pack(side="right", fill="x", expand=True, padx=10)
+        self.search_entry.bind("<Return>", self.add_first_search_result)
+
         self.menu_canvas = tk.Canvas(self.content, bg="#ecf0f1", highlightthickness=0)
         self.menu_canvas.pack(side="left", fill="both", expand=True)
 
@@ -231,21 +412,49 @@ class ModernFoodOrderGUI:
         current_orders_btn.bind("<Enter>", lambda e, b=current_orders_btn: b.config(bg="#2980b9"))
         current_orders_btn.bind("<Leave>", lambda e, b=current_orders_btn: b.config(bg="#3498db"))
 
+        kitchen_btn = tk.Button(self.order_frame, text="شاشة المطبخ", command=self.show_kitchen_display,
+                                bg="#16a085", fg="white", font=GLOBAL_FONT, bd=0, padx=10, pady=5)
+        kitchen_btn.pack(pady=(0, 20), padx=20, fill="x")
+        kitchen_btn.bind("<Enter>", lambda e, b=kitchen_btn: b.config(bg="#138d75"))
+        kitchen_btn.bind("<Leave>", lambda e, b=kitchen_btn: b.config(bg="#16a085"))
+
     def select_category(self, category):
+        if self.search_var.get():
+            self.search_var.set('')  # Leaves search mode
         self.selected_category = category
         if self.menu_label:
             self.menu_label.config(text=category)
-        
-        for widget in self.menu_frame.winfo_children():
-            widget.destroy()
 
+        # Swap the cached grid in; it is only built on first use or after invalidation
+        if self.visible_grid is not None:
+            self.visible_grid.pack_forget()
+        grid_frame = self.category_grids.get(category)
+        if grid_frame is None:
+            grid_frame = self.build_category_grid(category)
+            self.category_grids[category] = grid_frame
+        grid_frame.pack(expand=True, fill="both")
+        self.visible_grid = grid_frame
+
+        self.menu_canvas.update_idletasks()
+        self.menu_canvas.configure(scrollregion=self.menu_canvas.bbox("all"))
+
+    def invalidate_category(self, category):
+        # Drop a category's cached grid after its items (or name) changed
+        grid_frame = self.category_grids.pop(category, None)
+        self.grid_admin_widgets.pop(category, None)
+        if grid_frame is not None:
+            if grid_frame is self.visible_grid:
+                self.visible_grid = None
+            grid_frame.destroy()
+
+    def build_category_grid(self, category):
         # Create a frame to hold the grid
         grid_frame = tk.Frame(self.menu_frame, bg="#ecf0f1")
-        grid_frame.pack(expand=True, fill="both")
+        admin_widgets = self.grid_admin_widgets[category] = []
 
         row = 0
         col = 0
-        items = list(self.menu[category].items())
+        items = self.catalog.category_items(category)
         num_items = len(items)
         num_columns = 3
 
@@ -258,95 +467,207 @@ class ModernFoodOrderGUI:
             tk.Frame(grid_frame, height=100, bg="#ecf0f1").grid(row=row, column=0, columnspan=num_columns)
             row += 1
 
-        for item, price in items:
+        for menu_item in items:
+            item = menu_item.name
             frame = tk.Frame(grid_frame, bg="white", bd=1, relief="raised", width=200, height=150)
             frame.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
             frame.grid_propagate(False)  # Prevent the frame from shrinking
 
             tk.Label(frame, text=item, font=(GLOBAL_FONT[0], 12, "bold"), bg="white", justify="right").pack(pady=(10, 5))
-            tk.Label(frame, text=f"{price:.2f} ج.م", font=(GLOBAL_FONT[0], 10), bg="white").pack()
+            tk.Label(frame, text=f"{menu_item.price:.2f} ج.م", font=(GLOBAL_FONT[0], 10), bg="white").pack()
             
             btn_frame = tk.Frame(frame, bg="white")
             btn_frame.pack(pady=10)
 
-            add_btn = tk.Button(btn_frame, text="إضافة", command=lambda i=item: self.add_to_order(i),
+            add_btn = tk.Button(btn_frame, text="إضافة", command=lambda i=menu_item.item_id: self.add_to_order(i),
                                 bg="#3498db", fg="white", font=GLOBAL_FONT, bd=0, padx=5, pady=2)
             add_btn.pack(side="left", padx=2)
             add_btn.bind("<Enter>", lambda e, b=add_btn: b.config(bg="#2980b9"))
             add_btn.bind("<Leave>", lambda e, b=add_btn: b.config(bg="#3498db"))
 
-            if self.role == "admin":
-                edit_btn = tk.Button(btn_frame, text="تعديل", command=lambda i=item: self.edit_item(category, i),
-                                     bg="#f39c12", fg="white", font=GLOBAL_FONT, bd=0, padx=5, pady=2)
-                edit_btn.pack(side="left", padx=2)
-                edit_btn.bind("<Enter>", lambda e, b=edit_btn: b.config(bg="#d35400"))
-                edit_btn.bind("<Leave>", lambda e, b=edit_btn: b.config(bg="#f39c12"))
-
-                delete_btn = tk.Button(btn_frame, text="حذف", command=lambda i=item: self.delete_item(category, i),
-                                       bg="#e74c3c", fg="white", font=GLOBAL_FONT, bd=0, padx=5, pady=2)
-                delete_btn.pack(side="left", padx=2)
-                delete_btn.bind("<Enter>", lambda e, b=delete_btn: b.config(bg="#c0392b"))
-                delete_btn.bind("<Leave>", lambda e, b=delete_btn: b.config(bg="#e74c3c"))
+            edit_btn = tk.Button(btn_frame, text="تعديل", command=lambda i=item: self.edit_item(category, i),
+                                 bg="#f39c12", fg="white", font=GLOBAL_FONT, bd=0, padx=5, pady=2)
+            self.admin_widget(admin_widgets, edit_btn, lambda b=edit_btn: b.pack(side="left", padx=2))
+            edit_btn.bind("<Enter>", lambda e, b=edit_btn: b.config(bg="#d35400"))
+            edit_btn.bind("<Leave>", lambda e, b=edit_btn: b.config(bg="#f39c12"))
+
+            delete_btn = tk.Button(btn_frame, text="حذف", command=lambda i=item: self.delete_item(category, i),
+                                   bg="#e74c3c", fg="white", font=GLOBAL_FONT, bd=0, padx=5, pady=2)
+            self.admin_widget(admin_widgets, delete_btn, lambda b=delete_btn: b.pack(side="left", padx=2))
+            delete_btn.bind("<Enter>", lambda e, b=delete_btn: b.config(bg="#c0392b"))
+            delete_btn.bind("<Leave>", lambda e, b=delete_btn: b.config(bg="#e74c3c"))
 
             col += 1
             if col >= num_columns:
                 col = 0
                 row += 1
 
-        if self.role == "admin":
-            add_item_btn = tk.Button(grid_frame, text="إضافة صنف جديد", command=lambda: self.add_item(category),
-                                     bg="#27ae60", fg="white", font=GLOBAL_FONT, bd=0, padx=10, pady=5)
-            add_item_btn.grid(row=row+1, column=0, columnspan=num_columns, pady=20, padx=10, sticky="ew")
-            add_item_btn.bind("<Enter>", lambda e, b=add_item_btn: b.config(bg="#2ecc71"))
-            add_item_btn.bind("<Leave>", lambda e, b=add_item_btn: b.config(bg="#27ae60"))
+        add_item_btn = tk.Button(grid_frame, text="إضافة صنف جديد", command=lambda: self.add_item(category),
+                                 bg="#27ae60", fg="white", font=GLOBAL_FONT, bd=0, padx=10, pady=5)
+        self.admin_widget(admin_widgets, add_item_btn,
+                          lambda r=row + 1: add_item_btn.grid(row=r, column=0, columnspan=num_columns, pady=20,
+                                                              padx=10, sticky="ew"))
+        add_item_btn.bind("<Enter>", lambda e, b=add_item_btn: b.config(bg="#2ecc71"))
+        add_item_btn.bind("<Leave>", lambda e, b=add_item_btn: b.config(bg="#27ae60"))
 
         # Configure grid weights to center horizontally
         for i in range(num_columns):
             grid_frame.grid_columnconfigure(i, weight=1)
 
+        return grid_frame
+
+    # ----- menu search ------------------------------------------------------
+
+    def on_search_change(self, *args):
+        query = self.search_var.get()
+        if not query.strip():
+            self.hide_search_results()
+            if self.selected_category:
+                self.select_category(self.selected_category)
+            elif self.menu_label:
+                self.menu_label.config(text="اختر فئة")
+            return
+        self.show_search_results(self.catalog.search(query, limit=SEARCH_LIMIT))
+
+    def show_search_results(self, results):
+        self.search_results = results
+        if self.visible_grid is not None:
+            self.visible_grid.pack_forget()
+            self.visible_grid = None
+        if self.search_frame is None:
+            self.search_frame = tk.Frame(self.menu_frame, bg="#ecf0f1")
+            for i in range(3):
+                self.search_frame.grid_columnconfigure(i, weight=1)
+        self.search_frame.pack(expand=True, fill="both")
+        self.menu_label.config(text=f"نتائج البحث ({len(results)})" if results else "لا توجد نتائج")
+
+        # Tiles are created once and reconfigured, so typing never rebuilds the grid
+        for index, menu_item in enumerate(results):
+            if index == len(self.search_tiles):
+                self.search_tiles.append(self.create_search_tile())
+            tile = self.search_tiles[index]
+            tile['name'].config(text=menu_item.name)
+            tile['category'].config(text=menu_item.category)
+            tile['price'].config(text=f"{menu_item.price:.2f} ج.م")
+            tile['add'].config(command=lambda i=menu_item.item_id: self.add_to_order(i))
+            tile['frame'].grid(row=index // 3, column=index % 3, padx=10, pady=10, sticky="nsew")
+        for tile in self.search_tiles[len(results):]:
+            tile['frame'].grid_remove()
+
         self.menu_canvas.update_idletasks()
         self.menu_canvas.configure(scrollregion=self.menu_canvas.bbox("all"))
-
-    def add_to_order(self, item):
+        self.menu_canvas.yview_moveto(0)
+
+    def create_search_tile(self):
+        frame = tk.Frame(self.search_frame, bg="white", bd=1, relief="raised", width=200, height=150)
+        frame.grid_propagate(False)
+        name_label = tk.Label(frame, font=(GLOBAL_FONT[0], 12, "bold"), bg="white", justify="right")
+        name_label.pack(pady=(10, 0))
+        category_label = tk.Label(frame, font=(GLOBAL_FONT[0], 9), bg="white", fg="#7f8c8d")
+        category_label.pack()
+        price_label = tk.Label(frame, font=(GLOBAL_FONT[0], 10), bg="white")
+        price_label.pack()
+        add_btn = tk.Button(frame, text="إضافة", bg="#3498db", fg="white", font=GLOBAL_FONT, bd=0, padx=5, pady=2)
+        add_btn.pack(pady=10)
+        add_btn.bind("<Enter>", lambda e, b=add_btn: b.config(bg="#2980b9"))
+        add_btn.bind("<Leave>", lambda e, b=add_btn: b.config(bg="#3498db"))
+        return {'frame': frame, 'name': name_label, 'category': category_label, 'price': price_label, 'add': add_btn}
+
+    def hide_search_results(self):
+        self.search_results = []
+        if self.search_frame is not None:
+            self.search_frame.pack_forget()
+
+    def add_first_search_result(self, event=None):
+        if self.search_results:
+            self.add_to_order(self.search_results[0].item_id)
+
+    def refresh_catalog(self):
+        # Recompile after a menu edit; item ids carry over
+        self.catalog = build_catalog(self.menu, self.catalog)
+        if self.search_var.get().strip():
+            self.on_search_change()
+
+    # ----- current order ----------------------------------------------------
+
+    def add_to_order(self, item_id):
+        # Keyed by id, so same-named items from two categories stay separate lines
         quantity = 1
-        if item in self.order:
-            self.order[item]['quantity'] += quantity
+        if item_id in self.order:
+            self.order[item_id]['quantity'] += quantity
         else:
-            self.order[item] = {'quantity': quantity, 'price': self.menu[self.selected_category][item]}
-        self.update_order_display()
+            menu_item = self.catalog.get(item_id)
+            if menu_item is None:
+                return  # Deleted from the menu meanwhile
+            self.order[item_id] = {'quantity': quantity, 'price': menu_item.price, 'name': menu_item.name}
+        self.order_total += self.order[item_id]['price'] * quantity
+        self.update_order_row(item_id)
+
+    def create_order_row(self, item):
+        frame = tk.Frame(self.order_list, bg="#bdc3c7")
+        frame.pack(fill="x", pady=5)
+
+        name_label = tk.Label(frame, bg="#bdc3c7", font=GLOBAL_FONT, justify="right")
+        name_label.pack(side="left")
+        price_label = tk.Label(frame, bg="#bdc3c7", font=GLOBAL_FONT)
+        price_label.pack(side="right")
+
+        btn_frame = tk.Frame(frame, bg="#bdc3c7")
+        btn_frame.pack(side="right", padx=5)
+
+        minus_btn = tk.Button(btn_frame, text="-", command=lambda i=item: self.decrease_quantity(i),
+                              bg="#e74c3c", fg="white", font=GLOBAL_FONT, width=2, bd=0)
+        minus_btn.pack(side="left", padx=2)
+        plus_btn = tk.Button(btn_frame, text="+", command=lambda i=item: self.increase_quantity(i),
+                             bg="#2ecc71", fg="white", font=GLOBAL_FONT, width=2, bd=0)
+        plus_btn.pack(side="left", padx=2)
+
+        row = {'frame': frame, 'name_label': name_label, 'price_label': price_label}
+        self.order_rows[item] = row
+        return row
+
+    def update_order_row(self, item):
+        # Only the row for this item is created, updated or removed
+        details = self.order.get(item)
+        row = self.order_rows.get(item)
+        if details is None:
+            if row:
+                row['frame'].destroy()
+                del self.order_rows[item]
+        else:
+            if row is None:
+                row = self.create_order_row(item)
+            row['name_label'].config(text=f"{details['name']} (x{details['quantity']})")
+            row['price_label'].config(text=f"{details['price'] * details['quantity']:.2f} ج.م")
+        if not self.order:
+            self.order_total = 0.0  # Drop any accumulated float drift
+        self.total_var.set(f"الإجمالي: {self.order_total:.2f} ج.م")
 
     def update_order_display(self):
-        for widget in self.order_list.winfo_children():
-            widget.destroy()
-
-        for item, details in self.order.items():
-            frame = tk.Frame(self.order_list, bg="#bdc3c7")
-            frame.pack(fill="x", pady=5)
-                                                
-            tk.Label(frame, text=f"{item} (x{details['quantity']})", bg="#bdc3c7", font=GLOBAL_FONT, justify="right").pack(side="left")
-            tk.Label(frame, text=f"{details['price'] * details['quantity']:.2f} ج.م", bg="#bdc3c7", font=GLOBAL_FONT).pack(side="right")
-            
-            btn_frame = tk.Frame(frame, bg="#bdc3c7")
-            btn_frame.pack(side="right", padx=5)
-            
-            minus_btn = tk.Button(btn_frame, text="-", command=lambda i=item: self.decrease_quantity(i),
-                                  bg="#e74c3c", fg="white", font=GLOBAL_FONT, width=2, bd=0)
-            minus_btn.pack(side="left", padx=2)
-            plus_btn = tk.Button(btn_frame, text="+", command=lambda i=item: self.increase_quantity(i),
-                                 bg="#2ecc71", fg="white", font=GLOBAL_FONT, width=2, bd=0)
-            plus_btn.pack(side="left", padx=2)
-
-        self.total_var.set(f"الإجمالي: {self.calculate_total():.2f} ج.م")
+        # Full rebuild, only needed when self.order is replaced wholesale
+        for row in self.order_rows.values():
+            row['frame'].destroy()
+        self.order_rows = {}
+        self.order_total = self.calculate_total()
+        for item in self.order:
+            self.update_order_row(item)
+        self.total_var.set(f"الإجمالي: {self.order_total:.2f} ج.م")
+
+    def clear_order(self):
+        self.order = {}
+        self.update_order_display()
 
     def increase_quantity(self, item):
         self.order[item]['quantity'] += 1
-        self.update_order_display()
+        self.order_total += self.order[item]['price']
+        self.update_order_row(item)
 
     def decrease_quantity(self, item):
         self.order[item]['quantity'] -= 1
+        self.order_total -= self.order[item]['price']
         if self.order[item]['quantity'] <= 0:
             del self.order[item]
-        self.update_order_display()
+        self.update_order_row(item)
 
     def calculate_total(self):
         return sum(details['price'] * details['quantity'] for details in self.order.values())
@@ -356,9 +677,6 @@ class ModernFoodOrderGUI:
             messagebox.showerror("خطأ", "طلبك فارغ.")
             return
 
-        # Generate a random order number
-        order_number = random.randint(1000, 9999)
-
         # Prompt for delivery option
         delivery_option = messagebox.askyesno("خيار التوصيل", "هل تريد توصيل الطلب؟")
         delivery_location = None
@@ -366,182 +684,73 @@ class ModernFoodOrderGUI:
         delivery_fee = 0
 
         if delivery_option:
-            delivery_location = simpledialog.askstring("عنوان التوصيل", "أدخل عنوان التوصيل:")
-            if not delivery_location:
+            # Known phone numbers fill in the address and last fee
+            from delivery_dialog import DeliveryDialog
+            details = DeliveryDialog(self.master).show()
+            if not details or not details[0]:
                 messagebox.showwarning("تحذير", "لم يتم إدخال عنوان التوصيل. سيتم معاملة الطلب كطلب استلام.")
             else:
-                phone_number = simpledialog.askstring("رقم الهاتف", "أدخل رقم هاتف العميل:")
-                delivery_fee = simpledialog.askfloat("رسوم التوصيل", "أدخل رسوم التوصيل:")
-
-        # Icons
-        whatsapp_icon = "\U0001F4AC"
-        phone_icon = "\U0001F4DE"
-        location_icon = "\U0001F4CD"
+                delivery_location, phone_number, delivery_fee = details
 
         # Current date and time
         current_datetime = time.strftime('%Y-%m-%d %H:%M:%S')
 
-        order_summary = f"""
-{'=' * 40}
-             مطعم غنو               
-{'=' * 40}
-
-رقم الاوردر: {order_number}
-التاريخ والوقت: {current_datetime}
-
-{whatsapp_icon} هاتف: "01092392579"
-{location_icon} العنوان: مفارق مشتهر امام مسجد الشهداء
-
-{'=' * 40}
-{'الصنف':<20}{'الكمية':<10}{'السعر':<10}{'الإجمالي':<10}
-{'-' * 40}
-"""
-
         order_items = []
         total = 0
-        for item, details in self.order.items():
+        for details in self.order.values():
             quantity = details['quantity']
             price = details['price']
             item_total = quantity * price
             total += item_total
-            order_summary += f"{item:<20}{quantity:<10}{price:<10.2f}{item_total:<10.2f}\n"
             order_items.append({
-                'name': item,
+                'name': details['name'],
                 'quantity': quantity,
                 'price': price,
                 'total': item_total
             })
 
-        total += delivery_fee  # Add delivery fee to total
-
-        order_summary += f"""
-{'-' * 40}
-{'الإجمالي:':<30}{total:>10.2f}
-{'=' * 40}
-
-{'طريقة الاستلام:':<20}{"توصيل" if delivery_location else "استلام من المطعم"}
-"""
+        total += delivery_fee or 0  # Add delivery fee to total
 
-        if delivery_location:
-            order_summary += f"""{'عنوان التوصيل:':<20}{delivery_location}
-{phone_icon} رقم الهاتف: {phone_number}
-{'رسوم التوصيل:':<20}{delivery_fee:.2f} ج.م
-"""
-
-        order_summary += f"""
-{'=' * 40}
-            شكراً لزيارتكم مطعم غنو            
-              نتمنى لكم وجبة شهية             
-{'=' * 40}
-"""
-
-        # Print the order summary
-        self.print_report(order_summary)
-
-        # Add to current orders
-        self.current_orders.append({
-            'order_number': order_number,
+        order = {
             'items': order_items,
             'total': total,
             'delivery_location': delivery_location,
             'phone_number': phone_number,
             'delivery_fee': delivery_fee,
             'datetime': current_datetime,
+            'cashier': self.username,
             'status': 'قيد التنفيذ'  # Add this line
-        })
-        save_current_orders(self.current_orders)
+        }
+        if self.order_client:
+            # The server numbers and adds the order in one round trip
+            order = self.current_orders.place(order)
+        else:
+            # Next number from the shared, persisted sequence
+            order_number = get_order_number_allocator().allocate(in_use=self.current_orders)
+            order = self.current_orders.add(dict(order, order_id=make_order_id(order_number, current_datetime),
+                                                 order_number=order_number))
+        order_number = order['order_number']
 
         # Save the order to the main orders database
-        save_order(order_items, total, delivery_location, order_number, phone_number, delivery_fee, 'قيد التنفيذ')
-
-        self.clear_order()
+        save_order(order)
+        self.publish_order_event(ORDER_CREATED, order)
 
-    def print_report(self, content):
-        file_path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text files", "*.txt")])
-        if file_path:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            try:
-                subprocess.run(["notepad", "/p", file_path], check=True)
-            except subprocess.CalledProcessError:
-                messagebox.showerror("خطأ", "فشل في طباعة التقرير.")
+        # Queue the receipt; the spooler prints it without holding up the order
+        receipt_renderer.spool(lambda writer: receipt_renderer.write_order_receipt(writer, order),
+                               f"الطلب {order_number}")
 
-    def print_order(self, order):
-        content = self.generate_order_summary(order)
-        self.print_report(content)
+        self.clear_order()
+        get_startup_timeline().milestone('first_order')
 
     def generate_order_summary(self, order):
-        summary = f"""
-{'=' * 40}
-             مطعم غنو               
-{'=' * 40}
-
-رقم الاوردر: {order['order_number']}
-التاريخ والوقت: {order['datetime']}
-
-{'=' * 40}
-{'الصنف':<20}{'الكمية':<10}{'السعر':<10}{'الإجمالي':<10}
-{'-' * 40}
-"""
-        for item in order['items']:
-            summary += f"{item['name']:<20}{item['quantity']:<10}{item['price']:<10.2f}{item['total']:<10.2f}\n"
-
-        summary += f"""
-{'-' * 40}
-{'الإجمالي:':<30}{order['total']:>10.2f}
-{'=' * 40}
-
-{'طريقة الاستلام:':<20}{"توصيل" if order['delivery_location'] else "استلام من المطعم"}
-"""
-
-        if order['delivery_location']:
-            summary += f"""{'عنوان التوصيل:':<20}{order['delivery_location']}
-رقم الهاتف: {order['phone_number']}
-{'رسوم التوصيل:':<20}{order['delivery_fee']:.2f}
-"""
-
-        summary += f"""
-{'=' * 40}
-            شكراً لزيارتكم مطعم غنو            
-              نتمنى لكم وجبة شهية             
-{'=' * 40}
-"""
-        return summary
+        return receipt_renderer.render_text(
+            lambda writer: receipt_renderer.write_order_receipt(writer, order, contact=False))
 
     def print_order(self, order):
-        content = f"رقم الطلب: {order['order_number']}\n"
-        content += f"التاريخ والوقت: {order['datetime']}\n\n"
-        content += "الأصناف:\n"
-        for item in order['items']:
-            content += f"{item['name']} x{item['quantity']} - {item['price'] * item['quantity']:.2f} ج.م\n"
-        content += f"\nالإجمالي: {order['total']:.2f} ج.م\n"
-        
-        if order['delivery_location']:
-            content += f"\nنوع الطلب: توصيل"
-            content += f"\nعنوان التوصيل: {order['delivery_location']}"
-            content += f"\nرقم الهاتف: {order['phone_number']}"
-            content += f"\nرسوم التوصيل: {order['delivery_fee']:.2f} ج.م"
-        else:
-            content += f"\nنوع الطلب: استلام من المطعم"
-
-        self.print_report(content)
-
-    def save_order_summary(self, order_summary):
-        file_path = filedialog.asksaveasfilename(defaultextension=".txt",
-                                                 filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
-        if file_path:
-            with open(file_path, "w", encoding="utf-8") as file:
-                file.write(order_summary)
-            return file_path
-        return None
-
-    def print_file(self, file_path):
-        if sys.platform == "win32":
-            os.startfile(file_path, "print")
-        else:
-            subprocess.run(["lpr", file_path])
+        receipt_renderer.spool(lambda writer: receipt_renderer.write_order_receipt(writer, order, contact=False),
+                               f"الطلب {order['order_number']}")
 
-    def save_order_summary(self, order_summary):
+    def save_order_summary(self, write):
         # Create an 'order_reports' folder if it doesn't exist
         reports_folder = os.path.join(os.getcwd(), 'order_reports')
         if not os.path.exists(reports_folder):
@@ -552,18 +761,11 @@ class ModernFoodOrderGUI:
         file_name = f"order_summary_{timestamp}.txt"
         file_path = os.path.join(reports_folder, file_name)
 
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(order_summary)
+        receipt_renderer.save_text(write, file_path)
 
         print(f"Order summary saved to: {file_path}")  # Debug print
         return file_path
 
-    def print_file(self, file_path):
-        try:
-            subprocess.run(["notepad", "/p", file_path], check=True)
-        except subprocess.CalledProcessError:
-            messagebox.showerror("خطأ", "فشل في طباعة الطلب.")
-
     def view_reports(self):
         if self.role != "admin":
             messagebox.showerror("خطأ", "ليس لديك صلاحية لعرض التقارير")
@@ -573,63 +775,76 @@ class ModernFoodOrderGUI:
         reports_window.geometry("1000x600")  # Increased width to accommodate new column
         reports_window.configure(bg="#ecf0f1")
 
-        # Load only completed or cancelled orders
-        reports = [order for order in load_orders() if order.get('status', '') in ['ناجح', 'ملغي بواسطة']]
-        print(f"Loaded {len(reports)} reports")  # Debug print
-        
+        # Only completed or cancelled orders, from the search index; the
+        # table is filled once its catch-up has read everything saved so far
+        search_index = get_order_search_index()
+        index_ready = False
+
         # Create a frame for search
         search_frame = tk.Frame(reports_window, bg="#ecf0f1")
         search_frame.pack(fill="x", padx=10, pady=10)
 
-        tk.Label(search_frame, text="بحث برقم الطلب:", bg="#ecf0f1", font=GLOBAL_FONT).pack(side="left", padx=(0, 10))
+        tk.Label(search_frame, text="بحث (رقم الطلب، الهاتف، العنوان، الصنف، الكاشير):", bg="#ecf0f1",
+                 font=GLOBAL_FONT).pack(side="left", padx=(0, 10))
         search_entry = tk.Entry(search_frame, font=GLOBAL_FONT)
         search_entry.pack(side="left", expand=True, fill="x")
 
-        def search_reports():
-            search_term = search_entry.get()
-            filtered_reports = [order for order in reports if str(order.get('order_number', '')) == search_term]
-            populate_listbox(filtered_reports if search_term else reports)
+        dates_frame = tk.Frame(reports_window, bg="#ecf0f1")
+        dates_frame.pack(fill="x", padx=10)
+        tk.Label(dates_frame, text="من تاريخ (YYYY-MM-DD):", bg="#ecf0f1", font=GLOBAL_FONT).pack(side="left")
+        start_entry = tk.Entry(dates_frame, font=GLOBAL_FONT, width=12)
+        start_entry.pack(side="left", padx=(5, 15))
+        tk.Label(dates_frame, text="إلى تاريخ:", bg="#ecf0f1", font=GLOBAL_FONT).pack(side="left")
+        end_entry = tk.Entry(dates_frame, font=GLOBAL_FONT, width=12)
+        end_entry.pack(side="left", padx=5)
+        result_label = tk.Label(dates_frame, text="", bg="#ecf0f1", font=GLOBAL_FONT)
+        result_label.pack(side="right")
+
+        def search_reports(event=None):
+            if not index_ready:
+                return
+            start = start_entry.get().strip() or None
+            end = end_entry.get().strip() or None
+            for value in (start, end):
+                if value is not None:
+                    try:
+                        time.strptime(value, "%Y-%m-%d")
+                    except ValueError:
+                        messagebox.showerror("خطأ", "صيغة التاريخ غير صحيحة. استخدم YYYY-MM-DD")
+                        return
+            # Only the visible rows are looked up as the table scrolls
+            docs = search_index.search(search_entry.get(), start=start, end=end)
+            tree.set_source(SearchResultSource(search_index, docs))
+            result_label.config(text=f"عدد النتائج: {len(docs)}")
 
         search_button = tk.Button(search_frame, text="بحث", command=search_reports,
                                   bg="#3498db", fg="white", font=GLOBAL_FONT, bd=0, padx=10, pady=5)
         search_button.pack(side="left", padx=(10, 0))
+        for entry in (search_entry, start_entry, end_entry):
+            entry.bind("<Return>", search_reports)
 
         # Create a frame for the listbox and scrollbar
         listbox_frame = tk.Frame(reports_window, bg="#ecf0f1")
         listbox_frame.pack(fill="both", expand=True, padx=10, pady=10)
 
-        # Create a treeview to display the reports
+        # Create a virtualized table to display the reports
         columns = ("رقم الطلب", "التاريخ والوقت", "الإجمالي", "نوع الطلب", "الحالة")
-        tree = ttk.Treeview(listbox_frame, columns=columns, show='headings')
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=100, anchor="center")
-
-        tree.column("رقم الطلب", width=100)
-        tree.column("التاريخ والوقت", width=150)
-        tree.column("الإجمالي", width=100)
-        tree.column("نوع الطلب", width=100)
-        tree.column("الحالة", width=100)
-
-        tree.pack(side="left", fill="both", expand=True)
-
-        # Create a scrollbar for the treeview
-        scrollbar = ttk.Scrollbar(listbox_frame, orient="vertical", command=tree.yview)
-        scrollbar.pack(side="right", fill="y")
-        tree.configure(yscrollcommand=scrollbar.set)
-
-        def populate_listbox(orders):
-            tree.delete(*tree.get_children())
-            for order in orders:
-                order_number = order.get('order_number', 'N/A')
-                order_date = order.get('datetime', 'N/A')
-                order_total = f"{order.get('total', 0):.2f} ج.م"
-                order_type = "توصيل" if order.get('delivery_location') else "استلام"
-                order_status = order.get('status', 'ناجح')  # Default to 'ناجح' if status is not set
-                tree.insert("", "end", values=(order_number, order_date, order_total, order_type, order_status))
-
-        # Initial population of the treeview
-        populate_listbox(reports)
+        tree = VirtualTable(listbox_frame, columns, bg="#ecf0f1", selectmode="browse")
+        tree.set_columns(columns)
+        tree.tree.column("التاريخ والوقت", width=150)
+        tree.pack(fill="both", expand=True)
+
+        # Initial population of the table, off the Tk thread while the index catches up
+        result_label.config(text="جاري تحميل التقارير...")
+
+        def on_index_ready():
+            nonlocal index_ready
+            if not reports_window.winfo_exists():
+                return
+            index_ready = True
+            search_reports()
+
+        search_index.schedule(on_done=on_index_ready)
 
         # Create a frame for the buttons
         buttons_frame = tk.Frame(reports_window, bg="#ecf0f1")
@@ -645,56 +860,31 @@ class ModernFoodOrderGUI:
         close_button.pack(side="left")
 
         def print_selected_report(tree):
-            selected_item = tree.selection()
-            if not selected_item:
+            selected_rows = tree.selected_rows()
+            if not selected_rows:
                 messagebox.showwarning("تحذير", "لم يتم اختيار تقرير للطباعة.")
                 return
 
-            selected_report = reports[tree.index(selected_item[0])]
-            order_number = selected_report.get('order_number', 'N/A')
-            order_status = selected_report.get('status', 'ناجح')  # Get the status
-            order_summary = f"===== ملخص الطلب =====\nمطعم غنو\n====================\n\n"
-            order_summary += f"رقم الطلب: {order_number}\n"
-            order_summary += f"حالة الطلب: {order_status}\n\n"  # Add status to the summary
-            for item in selected_report['items']:
-                if isinstance(item, dict):
-                    order_summary += f"{item['name']}: {item['quantity']} x {item['price']:.2f} ج.م = {item['total']:.2f} ج.م\n"
-                elif isinstance(item, str):
-                    order_summary += f"{item}\n"
-                else:
-                    order_summary += f"{str(item)}\n"
-            order_summary += f"\nالإجمالي: {selected_report['total']:.2f} ج.م"
-            if selected_report.get('delivery_location'):
-                order_summary += f"\nعنوان التوصيل: {selected_report['delivery_location']}"
-
-            file_path = self.save_order_summary(order_summary)
-            if file_path:
-                self.print_file(file_path)
+            # Rows only hold the summary; the full order comes from the store's index
+            order_number, order_date, _, _, _ = selected_rows[0]
+            selected_report = next((order for order in get_order_store().iter_orders(order_number=order_number)
+                                    if order.get('datetime') == order_date), None)
+            if selected_report is None:
+                messagebox.showerror("خطأ", "لم يتم العثور على الطلب")
+                return
+
+            def write(writer):
+                receipt_renderer.write_order_report(writer, selected_report)
+
+            self.save_order_summary(write)
+            receipt_renderer.spool(write, f"الطلب {order_number}")
 
         # Print All Reports button
         def print_all_reports():
-            if reports:
-                content = "جميع التقارير\n\n"
-                for order in reports:
-                    content += f"رقم الطلب: {order.get('order_number', 'غير معروف')}\n"
-                    content += f"التاريخ: {order.get('datetime', 'غير معروف')}\n"
-                    content += f"الإجمالي: {order.get('total', 0):.2f} ج.م\n"
-                    content += f"الحالة: {order.get('status', 'ناجح')}\n"  # Add status to the summary
-                    delivery_location = order.get('delivery_location', '')
-                    if delivery_location:
-                        content += f"توصيل إلى: {delivery_location}\n"
-                    else:
-                        content += "استلام من المطعم\n"
-                    content += "الأصناف:\n"
-                    for item in order.get('items', []):
-                        if isinstance(item, dict):
-                            content += f"{item.get('name', 'غير معروف')}: {item.get('quantity', 0)} x {item.get('price', 0):.2f} ج.م = {item.get('total', 0):.2f} ج.م\n"
-                        elif isinstance(item, str):
-                            content += f"{item}\n"
-                        else:
-                            content += f"{str(item)}\n"
-                    content += "\n"
-                self.print_report(content)
+            if len(tree.source):
+                # Streamed from the store into the spool file, one order at a time
+                receipt_renderer.spool(lambda writer: receipt_renderer.write_all_reports(
+                    writer, get_order_store().iter_orders(statuses=REPORT_STATUSES)), "جميع التقارير")
             else:
                 messagebox.showinfo("تنبيه", "لا توجد تقارير للطباعة.")
 
@@ -716,16 +906,6 @@ class ModernFoodOrderGUI:
             btn.bind("<Enter>", on_enter)
             btn.bind("<Leave>", on_leave)
 
-    def print_report(self, content):
-        file_path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text files", "*.txt")])
-        if file_path:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            try:
-                subprocess.run(["notepad", "/p", file_path], check=True)
-            except subprocess.CalledProcessError:
-                messagebox.showerror("خطأ", "فشل في طباعة التقرير.")
-
     def show_developer_info(self):
         if self.role != "admin":
             messagebox.showerror("خطأ", "ليس لديك صلاحية لعرض معلومات المطور")
@@ -762,12 +942,15 @@ class ModernFoodOrderGUI:
         if self.role != "admin":
             messagebox.showerror("خطأ", "ليس لديك صلاحية لإدارة الإيرادات")
             return
+        # Imported on first use: it pulls in NumPy for the analytics report
+        from revenue_management_ui import ModernRevenueManagementUI
         revenue_window = tk.Toplevel(self.master)
         revenue_app = ModernRevenueManagementUI(revenue_window)
 
     def exit_application(self):
         if messagebox.askyesno("تأكيد الخروج", "هل أنت متأكد من إغلاق التطبيق؟"):
-            save_current_orders(self.current_orders)  # Save current orders before closing
+            self.close_current_orders()
+            get_order_store().close()
             self.master.destroy()
 
     def edit_item(self, category, item):
@@ -775,6 +958,8 @@ class ModernFoodOrderGUI:
         new_price = simpledialog.askfloat("تعديل السعر", f"أدخل السعر الجديد لـ {item}:", initialvalue=current_price)
         if new_price is not None:
             self.menu[category][item] = new_price
+            self.refresh_catalog()
+            self.invalidate_category(category)
             self.select_category(category)  # Refresh the display
             save_menu(self.menu)  # Save the updated menu
             messagebox.showinfo("نجاح", f"تم تحديث سعر {item} إلى {new_price:.2f} ج.م")
@@ -782,6 +967,8 @@ class ModernFoodOrderGUI:
     def delete_item(self, category, item):
         if messagebox.askyesno("تأكيد الحذف", f"هل أنت متأكد من حذف {item}؟"):
             del self.menu[category][item]
+            self.refresh_catalog()
+            self.invalidate_category(category)
             self.select_category(category)  # Refresh the display
             save_menu(self.menu)  # Save the updated menu
             messagebox.showinfo("نجاح", f"تم حذف {item} من القائمة")
@@ -795,6 +982,8 @@ class ModernFoodOrderGUI:
             new_price = simpledialog.askfloat("إضافة صنف", f"أدخل سعر {new_item}:")
             if new_price is not None:
                 self.menu[category][new_item] = new_price
+                self.refresh_catalog()
+                self.invalidate_category(category)
                 self.select_category(category)  # Refresh the display
                 save_menu(self.menu)  # Save the updated menu
                 messagebox.showinfo("نجاح", f"تمت إضافة {new_item} بسعر {new_price:.2f} ج.م")
@@ -804,6 +993,7 @@ class ModernFoodOrderGUI:
         if new_category:
             if new_category not in self.menu:
                 self.menu[new_category] = {}
+                self.refresh_catalog()
                 self.refresh_categories()  # Use refresh_categories instead of create_sidebar
                 messagebox.showinfo("نجاح", f"تمت إضافة الفئة {new_category} بنجاح")
                 save_menu(self.menu)  # Save the updated menu
@@ -824,6 +1014,13 @@ class ModernFoodOrderGUI:
         new_category_name = simpledialog.askstring("تعديل فئة", f"أدخل الاسم الجديد لـ '{category_to_edit}':")
         if new_category_name and new_category_name != category_to_edit:
             self.menu[new_category_name] = self.menu.pop(category_to_edit)
+            self.catalog.rename_category(category_to_edit, new_category_name)
+            self.refresh_catalog()
+            # The cached grid's buttons are bound to the old name
+            was_selected = self.selected_category == category_to_edit
+            self.invalidate_category(category_to_edit)
+            if was_selected:
+                self.select_category(new_category_name)
             self.refresh_categories()  # Use refresh_categories instead of create_sidebar
             messagebox.showinfo("نجاح", f"تم تغيير اسم الفئة من '{category_to_edit}' إلى '{new_category_name}'")
             save_menu(self.menu)  # Save the updated menu
@@ -833,7 +1030,7 @@ class ModernFoodOrderGUI:
     def refresh_categories(self):
         # Remove category buttons and the "الفئات" label
         for widget in self.sidebar.winfo_children():
-            if isinstance(widget, tk.Button) and widget.cget('text') not in ["إضافة فئة", "تعديل فئة", "عرض التقارير", "مطور التطبيق", "إغلاق التطبيق"]:
+            if isinstance(widget, tk.Button) and widget not in self.admin_sidebar_buttons and widget.cget('text') not in ["إغلاق التطبيق", "تبديل المستخدم"]:
                 widget.destroy()
             elif isinstance(widget, tk.Label) and widget.cget('text') == "الفئات":
                 widget.destroy()
@@ -848,21 +1045,26 @@ class ModernFoodOrderGUI:
             btn.bind("<Leave>", lambda e, b=btn: b.config(bg="#34495e"))
 
         # Ensure admin buttons are at the bottom
-        admin_buttons = [widget for widget in self.sidebar.winfo_children() if isinstance(widget, tk.Button) and widget.cget('text') in ["إضافة فئة", "تعديل فئة", "عرض التقارير", "مطور التطبيق"]]
         exit_button = next((widget for widget in self.sidebar.winfo_children() if isinstance(widget, tk.Button) and widget.cget('text') == "إغلاق التطبيق"), None)
 
-        for btn in admin_buttons:
+        for btn in self.admin_sidebar_buttons:
             btn.pack_forget()
-            btn.pack(fill="x", padx=10, pady=5)
+            if self.role == "admin":
+                btn.pack(fill="x", padx=10, pady=5)
 
         if exit_button:
             exit_button.pack_forget()
             exit_button.pack(fill="x", padx=10, pady=5, side="bottom")
+        if self.on_switch_user:
+            self.switch_user_btn.pack_forget()
+            self.switch_user_btn.pack(fill="x", padx=10, pady=5, side="bottom")
 
         # Ensure datetime label is at the bottom
         if hasattr(self, 'datetime_label') and self.datetime_label.winfo_exists():
             self.datetime_label.pack_forget()
             self.datetime_label.pack(side="bottom", pady=10)
+            self.print_status_label.pack_forget()
+            self.print_status_label.pack(side="bottom", pady=5)
 
         # Update the view
         self.sidebar.update()
@@ -897,25 +1099,19 @@ class ModernFoodOrderGUI:
         style.map('Treeview', background=[('selected', '#3498db')])
         style.configure("Treeview.Heading", background="#3498db", foreground="white", font=(GLOBAL_FONT[0], 12, "bold"))
 
+        # Virtualized table reading straight from the order book
         columns = ("رقم الطلب", "الأصناف", "الإجمالي", "نوع الطلب", "حالة الطلب")
-        self.current_orders_tree = ttk.Treeview(tree_frame, columns=columns, show='headings', style="Treeview")
-
-        # Define headings
-        for col in columns:
-            self.current_orders_tree.heading(col, text=col)
-            self.current_orders_tree.column(col, width=100, anchor="center")
+        # Selection is kept by order number, so it stays on the same order as orders come and go
+        self.current_orders_tree = VirtualTable(tree_frame, columns, format_row=self.format_current_order_row,
+                                                row_key=lambda order: normalize_order_number(order['order_number']),
+                                                style="Treeview", selectmode="browse")
+        self.current_orders_tree.set_columns(columns)
 
         # Adjust column widths
-        self.current_orders_tree.column("رقم الطلب", width=100)
-        self.current_orders_tree.column("الأصناف", width=400)
-        self.current_orders_tree.column("الإجمالي", width=150)
-        self.current_orders_tree.column("نوع الطلب", width=150)
-        self.current_orders_tree.column("حالة الطلب", width=150)
-
-        # Add a scrollbar
-        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.current_orders_tree.yview)
-        self.current_orders_tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.current_orders_tree.tree.column("الأصناف", width=400)
+        self.current_orders_tree.tree.column("الإجمالي", width=150)
+        self.current_orders_tree.tree.column("نوع الطلب", width=150)
+        self.current_orders_tree.tree.column("حالة الطلب", width=150)
 
         self.current_orders_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
@@ -952,26 +1148,34 @@ class ModernFoodOrderGUI:
             owner_remove_btn.bind("<Enter>", lambda e: owner_remove_btn.config(bg="#6c3483"))
             owner_remove_btn.bind("<Leave>", lambda e: owner_remove_btn.config(bg="#8e44ad"))
 
+    def format_current_order_row(self, order):
+        items_str = ", ".join([f"{item['name']} (x{item['quantity']})" for item in order['items']])
+        order_type = "توصيل" if order['delivery_location'] else "استلام"
+        order_status = order.get('status', 'قيد التنفيذ')
+        return (order['order_number'], items_str, f"{order['total']:.2f} ج.م", order_type, order_status)
+
     def refresh_current_orders(self):
-        if not self.current_orders_tree:
+        if not self.current_orders_tree or not self.current_orders_tree.winfo_exists():
             return
-        self.current_orders_tree.delete(*self.current_orders_tree.get_children())
-        for order in self.current_orders:
-            items_str = ", ".join([f"{item['name']} (x{item['quantity']})" for item in order['items']])
-            order_type = "توصيل" if order['delivery_location'] else "استلام"
-            order_status = order.get('status', 'قيد التنفيذ')
-            self.current_orders_tree.insert("", tk.END, values=(order['order_number'], items_str, f"{order['total']:.2f} ج.م", order_type, order_status))
+        # Only the rows on screen are re-rendered
+        if self.current_orders_tree.source is not self.current_orders:
+            self.current_orders_tree.set_source(self.current_orders)
+        else:
+            self.current_orders_tree.refresh()
+
+    def selected_current_order_number(self):
+        selected_rows = self.current_orders_tree.selected_rows()
+        return selected_rows[0]['order_number'] if selected_rows else None
 
     def update_order_as_cancelled(self):
         if not self.current_orders_tree:
             return
-        selected_item = self.current_orders_tree.selection()
-        if not selected_item:
+        order_number = self.selected_current_order_number()
+        if order_number is None:
             messagebox.showwarning("تحذير", "الرجاء اختيار طلب لتحديثه كملغي")
             return
 
-        order_number = self.current_orders_tree.item(selected_item)['values'][0]
-        order = next((o for o in self.current_orders if str(o['order_number']) == str(order_number)), None)
+        order = self.current_orders.get(order_number)
         
         if order:
             if order['status'].startswith('ملغي بواسطة'):
@@ -980,56 +1184,26 @@ class ModernFoodOrderGUI:
 
             if messagebox.askyesno("تأكيد", f"هل أنت متأكد من تحديث الطلب رقم {order_number} كملغي؟"):
                 cancel_reason = f"ملغي بواسطة {self.username}"
-                order['status'] = cancel_reason
-                # Save the cancelled order to the main orders database
-                save_order(order['items'], order['total'], order['delivery_location'], order['order_number'], 
-                           order['phone_number'], order['delivery_fee'], cancel_reason)
-                save_current_orders(self.current_orders)  # Save after updating order
+                if self.current_orders.update_status(order_number, cancel_reason) is None:
+                    # Finished or removed on another till meanwhile
+                    messagebox.showerror("خطأ", "لم يتم العثور على الطلب")
+                    self.refresh_current_orders()
+                    return
+                # Record the cancellation in the main orders database
+                save_order_status(order, cancel_reason)
+                self.publish_order_event(event_for_status(cancel_reason), order)
                 messagebox.showinfo("نجاح", f"تم تحديث الطلب رقم {order_number} كملغي")
                 
-                # Update the tree item to show the new status
-                current_values = list(self.current_orders_tree.item(selected_item)['values'])
-                current_values[-1] = cancel_reason  # Update the last column (status)
-                self.current_orders_tree.item(selected_item, values=current_values)
-        else:
-            messagebox.showerror("خطأ", "لم يتم العثور على الطلب")
-
-    def finish_order(self):
-        if not self.current_orders_tree:
-            return
-        selected_item = self.current_orders_tree.selection()
-        if not selected_item:
-            messagebox.showwarning("تحذير", "الرجاء اختيار طلب لإنهائه")
-            return
-
-        order_number = self.current_orders_tree.item(selected_item)['values'][0]
-        order = next((o for o in self.current_orders if str(o['order_number']) == str(order_number)), None)
-        if order:
-            if order['status'].startswith('ملغي بواسطة'):
-                messagebox.showwarning("تحذير", f"لا يمكن إنهاء الطلب رقم {order_number} لأنه ملغي")
-                return
-            
-            # Update order status to 'ناجح'
-            order['status'] = 'ناجح'
-            
-            # Save the order to the main orders database
-            save_order(order['items'], order['total'], order['delivery_location'], order['order_number'], 
-                       order['phone_number'], order['delivery_fee'], 'ناجح')
-            
-            # Remove from current orders
-            self.current_orders = [o for o in self.current_orders if str(o['order_number']) != str(order_number)]
-            save_current_orders(self.current_orders)  # Save after removing order
-            messagebox.showinfo("نجاح", f"تم إنهاء الطلب رقم {order_number}")
-            self.current_orders_tree.delete(selected_item)
-            self.refresh_current_orders()
+                # Re-render the visible rows to show the new status
+                self.refresh_current_orders()
         else:
             messagebox.showerror("خطأ", "لم يتم العثور على الطلب")
 
     def owner_remove_order(self):
         if not self.current_orders_tree:
             return
-        selected_item = self.current_orders_tree.selection()
-        if not selected_item:
+        order_number = self.selected_current_order_number()
+        if order_number is None:
             messagebox.showwarning("تحذير", "الرجاء اختيار طلب لحذفه")
             return
 
@@ -1038,63 +1212,98 @@ class ModernFoodOrderGUI:
             messagebox.showerror("خطأ", "كلمة المرور غير صحيحة")
             return
 
-        order_number = self.current_orders_tree.item(selected_item)['values'][0]
-        order = next((o for o in self.current_orders if str(o['order_number']) == str(order_number)), None)
+        order = self.current_orders.get(order_number)
         
         if order:
             if messagebox.askyesno("تأكيد", f"هل أنت متأكد من حذف الطلب رقم {order_number}؟"):
                 # Remove from current orders
-                self.current_orders = [o for o in self.current_orders if str(o['order_number']) != str(order_number)]
-                save_current_orders(self.current_orders)  # Save after removing order
+                self.current_orders.remove(order_number)
+                self.publish_order_event(ORDER_REMOVED, order)
                 messagebox.showinfo("نجاح", f"تم حذف الطلب رقم {order_number}")
-                self.current_orders_tree.delete(selected_item)
+                self.current_orders_tree.clear_selection()
                 self.refresh_current_orders()
         else:
             messagebox.showerror("خطأ", "لم يتم العثور على الطلب")
         
     def on_closing(self):
         if messagebox.askyesno("تأكيد الخروج", "هل أنت متأكد أنك تريد إغلاق التطبيق؟"):
-            save_current_orders(self.current_orders)  # Save current orders before closing
+            self.close_current_orders()
+            get_order_store().close()
             self.master.destroy()
 
     def finish_order(self):
         if not self.current_orders_tree:
             return
-        selected_item = self.current_orders_tree.selection()
-        if not selected_item:
+        order_number = self.selected_current_order_number()
+        if order_number is None:
             messagebox.showwarning("تحذير", "الرجاء اختيار طلب لإنهائه")
             return
 
-        order_number = self.current_orders_tree.item(selected_item)['values'][0]
-        order = next((o for o in self.current_orders if str(o['order_number']) == str(order_number)), None)
+        order = self.current_orders.get(order_number)
         if order:
             if order['status'].startswith('ملغي بواسطة'):
                 messagebox.showerror("خطأ", "لا يمكن إنهاء طلب ملغي إلا بواسطة المدير")
                 return
             
             # Update order status to 'ناجح'
-            order['status'] = 'ناجح'
+            if self.current_orders.update_status(order_number, 'ناجح') is None:
+                # Finished or removed on another till meanwhile
+                messagebox.showerror("خطأ", "لم يتم العثور على الطلب")
+                self.refresh_current_orders()
+                return
             
-            # Save the order to the main orders database
-            save_order(order['items'], order['total'], order['delivery_location'], order['order_number'], 
-                       order['phone_number'], order['delivery_fee'], 'ناجح')
+            # Record the status change in the main orders database
+            save_order_status(order, 'ناجح')
+            self.publish_order_event(event_for_status('ناجح'), order)
             
             # Remove from current orders
-            self.current_orders = [o for o in self.current_orders if str(o['order_number']) != str(order_number)]
-            save_current_orders(self.current_orders)  # Save after removing order
+            self.current_orders.remove(order_number)
             messagebox.showinfo("نجاح", f"تم إنهاء الطلب رقم {order_number}")
-            self.current_orders_tree.delete(selected_item)
+            self.current_orders_tree.clear_selection()
             self.refresh_current_orders()
         else:
             messagebox.showerror("خطأ", "لم يتم العثور على الطلب")
 
-def start_pos_system(username, role):
-    root = tk.Tk()
-    app = ModernFoodOrderGUI(root, username, role)
-    root.protocol("WM_DELETE_WINDOW", app.on_closing)
-    root.mainloop()
+class SessionManager:
+    """One Tk root for the whole run, with the login shown over it.
+
+    The first login builds ModernFoodOrderGUI (menu, current orders, order
+    store).  "تبديل المستخدم" brings the login overlay back over the running
+    app; the next login only rebinds the user and role (switch_user), so a
+    shift handover does not reload anything from disk.
+    """
+
+    def __init__(self):
+        self.root = tk.Tk()
+        self.root.title("Restaurant POS Login")
+        self.root.geometry("1366x768")
+        self.app = None
+        self.overlay = tk.Frame(self.root, bg="#f4f7fa")
+        self.login_panel = ModernLoginPanel(self.overlay, self.on_login)
+        self.show_login()
+
+    def show_login(self):
+        self.login_panel.reset()
+        self.overlay.place(x=0, y=0, relwidth=1, relheight=1)
+        self.overlay.lift()
+        self.login_panel.focus()
+        get_startup_timeline().mark('login_shown')
+
+    def on_login(self, username, role):
+        get_startup_timeline().mark('login')
+        self.overlay.place_forget()
+        if self.app is None:
+            self.app = ModernFoodOrderGUI(self.root, username, role, on_switch_user=self.show_login)
+            self.root.protocol("WM_DELETE_WINDOW", self.app.on_closing)
+            self.overlay.lift()  # Stays above the app's widgets next time it is shown
+        else:
+            self.app.switch_user(username, role)
+
+    def run(self):
+        self.root.mainloop()
 
 if __name__ == "__main__":
-    start_login(start_pos_system)
+    get_startup_timeline().echo()
+    SessionManager().run()
 
 
@@ -0,0 +1,281 @@
+import io
+import os
+from functools import lru_cache
+from string import Formatter
+
+from receipt_spooler import get_receipt_spooler
+
+# 'text' for the Windows/lpr text path, 'escpos' for thermal printers fed raw
+RECEIPT_FORMAT = os.environ.get('POS_RECEIPT_FORMAT', 'text')
+# ESC/POS code page: Python codec and the printer's code table number for it
+# (ESC t n).  PC864 (Arabic) is table 37 on most Epson-compatible printers.
+ESCPOS_ENCODING = os.environ.get('POS_ESCPOS_ENCODING', 'cp864')
+ESCPOS_CODE_TABLE = int(os.environ.get('POS_ESCPOS_CODE_TABLE', '37'))
+
+RULE = '=' * 40
+DASH = '-' * 40
+RESTAURANT_NAME = "مطعم غنو"
+RESTAURANT_PHONE = "01092392579"
+RESTAURANT_ADDRESS = "مفارق مشتهر امام مسجد الشهداء"
+WHATSAPP_ICON = "\U0001F4AC"
+PHONE_ICON = "\U0001F4DE"
+LOCATION_ICON = "\U0001F4CD"
+UNKNOWN = "غير معروف"
+
+# Templates use str.format fields for the per-order values.  The fixed
+# layout (rules, padded column headings) is filled in here, once, when the
+# module loads.
+TEMPLATES = {
+    # Order receipt (place_order) and order summary (generate_order_summary)
+    'receipt_top': f"\n{RULE}\n",
+    'receipt_title': f"             {RESTAURANT_NAME}               \n",
+    'receipt_header': f"""{RULE}
+
+رقم الاوردر: {{order_number}}
+التاريخ والوقت: {{datetime}}
+
+""",
+    'receipt_contact': f"""{WHATSAPP_ICON} هاتف: "{RESTAURANT_PHONE}"
+{LOCATION_ICON} العنوان: {RESTAURANT_ADDRESS}
+
+""",
+    'receipt_columns': f"""{RULE}
+{'الصنف':<20}{'الكمية':<10}{'السعر':<10}{'الإجمالي':<10}
+{DASH}
+""",
+    'receipt_item': "{name:<20}{quantity:<10}{price:<10.2f}{total:<10.2f}\n",
+    'receipt_total': f"""
+{DASH}
+{'الإجمالي:':<30}{{total:>10.2f}}
+{RULE}
+
+{'طريقة الاستلام:':<20}{{pickup}}
+""",
+    'receipt_delivery': f"""{'عنوان التوصيل:':<20}{{delivery_location}}
+{PHONE_ICON} رقم الهاتف: {{phone_number}}
+{'رسوم التوصيل:':<20}{{delivery_fee:.2f}} ج.م
+""",
+    'receipt_footer': f"""
+{RULE}
+            شكراً لزيارتكم {RESTAURANT_NAME}
+              نتمنى لكم وجبة شهية
+{RULE}
+""",
+    # Single order from the reports window
+    'report_header': f"""===== ملخص الطلب =====
+{RESTAURANT_NAME}
+====================
+
+رقم الطلب: {{order_number}}
+حالة الطلب: {{status}}
+
+""",
+    'report_total': "\nالإجمالي: {total:.2f} ج.م",
+    'report_delivery': "\nعنوان التوصيل: {delivery_location}",
+    # All reports
+    'all_reports_title': "جميع التقارير\n\n",
+    'all_reports_order': """رقم الطلب: {order_number}
+التاريخ: {datetime}
+الإجمالي: {total:.2f} ج.م
+الحالة: {status}
+""",
+    'all_reports_delivery': "توصيل إلى: {delivery_location}\n",
+    'all_reports_pickup': "استلام من المطعم\n",
+    'all_reports_items': "الأصناف:\n",
+    'all_reports_end': "\n",
+    # Order lines in reports; legacy lines may be plain strings
+    'report_item': "{name}: {quantity} x {price:.2f} ج.م = {total:.2f} ج.م\n",
+    'report_raw_item': "{item!s}\n",
+}
+
+
+class Template:
+    """A str.format template parsed once into literal text and field lookups."""
+
+    def __init__(self, source):
+        self.pieces = []  # str literals and (field, format_spec, conversion) tuples
+        for literal, field, spec, conversion in Formatter().parse(source):
+            if literal:
+                self.pieces.append(literal)
+            if field is not None:
+                self.pieces.append((field, spec, conversion))
+
+    def render_into(self, parts, values):
+        append = parts.append
+        for piece in self.pieces:
+            if isinstance(piece, str):
+                append(piece)
+                continue
+            field, spec, conversion = piece
+            value = values[field]
+            if conversion == 's':
+                value = str(value)
+            elif conversion == 'r':
+                value = repr(value)
+            append(format(value, spec))
+
+
+@lru_cache(maxsize=None)
+def get_template(name):
+    return Template(TEMPLATES[name])
+
+
+def _emit(parts, name, values=None):
+    get_template(name).render_into(parts, values or {})
+
+
+def _text(name, values=None):
+    parts = []
+    _emit(parts, name, values)
+    return ''.join(parts)
+
+
+# ----- writers --------------------------------------------------------------
+# The render functions hand writers whole chunks (one per section or order),
+# so output goes to the file or spooler as it is produced.
+
+class TextWriter:
+    def __init__(self, out):
+        self.out = out
+
+    def start(self):
+        pass
+
+    def write(self, text):
+        self.out.write(text)
+
+    def emphasis(self, text):
+        self.out.write(text)
+
+    def finish(self):
+        pass
+
+
+class EscPosWriter:
+    # Raw ESC/POS for thermal printers; `out` is a binary file.  Characters
+    # missing from the code page (the emoji icons) print as '?'.
+    INIT = b'\x1b@'
+    BOLD_ON = b'\x1bE\x01'
+    BOLD_OFF = b'\x1bE\x00'
+    FEED_AND_CUT = b'\x1dV\x42\x03'
+
+    def __init__(self, out, encoding=ESCPOS_ENCODING, code_table=ESCPOS_CODE_TABLE):
+        self.out = out
+        self.encoding = encoding
+        self.code_table = code_table
+
+    def start(self):
+        self.out.write(self.INIT + b'\x1bt' + bytes([self.code_table]))
+
+    def write(self, text):
+        self.out.write(text.encode(self.encoding, errors='replace'))
+
+    def emphasis(self, text):
+        self.out.write(self.BOLD_ON)
+        self.write(text)
+        self.out.write(self.BOLD_OFF)
+
+    def finish(self):
+        self.out.write(self.FEED_AND_CUT)
+
+
+WRITERS = {'text': TextWriter, 'escpos': EscPosWriter}
+
+
+def render(write, out, fmt='text'):
+    """Run write(writer) with a writer for `fmt` writing to `out`."""
+    writer = WRITERS[fmt](out)
+    writer.start()
+    write(writer)
+    writer.finish()
+
+
+def render_text(write):
+    out = io.StringIO()
+    render(write, out)
+    return out.getvalue()
+
+
+def save_text(write, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        render(write, f)
+
+
+def spool(write, title="", fmt=None):
+    # Rendered on the spooler's worker straight into the spool file.  `write`
+    # may run again if spooling is retried, so it must not share iterators.
+    fmt = fmt or RECEIPT_FORMAT
+    return get_receipt_spooler().submit(lambda f: render(write, f, fmt), title, binary=fmt != 'text')
+
+
+# ----- documents ------------------------------------------------------------
+
+def _line_values(line):
+    return {'name': line.get('name', UNKNOWN), 'quantity': line.get('quantity', 0),
+            'price': line.get('price', 0), 'total': line.get('total', 0)}
+
+
+def _emit_report_items(parts, items):
+    for line in items:
+        if isinstance(line, dict):
+            _emit(parts, 'report_item', _line_values(line))
+        else:
+            _emit(parts, 'report_raw_item', {'item': line})
+
+
+def write_order_receipt(writer, order, contact=True):
+    """The customer receipt; contact=False leaves out the restaurant's phone
+    and address (the reprinted order summary)."""
+    writer.write(_text('receipt_top'))
+    writer.emphasis(_text('receipt_title'))
+
+    parts = []
+    _emit(parts, 'receipt_header', order)
+    if contact:
+        _emit(parts, 'receipt_contact')
+    _emit(parts, 'receipt_columns')
+    for line in order['items']:
+        _emit(parts, 'receipt_item', line)
+    delivery_location = order.get('delivery_location')
+    _emit(parts, 'receipt_total', {'total': order['total'],
+                                   'pickup': "توصيل" if delivery_location else "استلام من المطعم"})
+    if delivery_location:
+        _emit(parts, 'receipt_delivery', {'delivery_location': delivery_location,
+                                          'phone_number': order.get('phone_number'),
+                                          'delivery_fee': order.get('delivery_fee') or 0})
+    _emit(parts, 'receipt_footer')
+    writer.write(''.join(parts))
+
+
+def write_order_report(writer, order):
+    parts = []
+    _emit(parts, 'report_header', {'order_number': order.get('order_number', UNKNOWN),
+                                   'status': order.get('status', 'ناجح')})
+    _emit_report_items(parts, order.get('items', []))
+    _emit(parts, 'report_total', {'total': order.get('total', 0)})
+    if order.get('delivery_location'):
+        _emit(parts, 'report_delivery', order)
+    writer.write(''.join(parts))
+
+
+def write_all_reports(writer, orders):
+    """Every order in `orders` (any iterable, typically a store scan).
+
+    One chunk per order is written and dropped, so the time is linear in
+    the number of orders and memory does not grow with the history.
+    """
+    writer.write(_text('all_reports_title'))
+    for order in orders:
+        parts = []
+        _emit(parts, 'all_reports_order', {'order_number': order.get('order_number', UNKNOWN),
+                                           'datetime': order.get('datetime', UNKNOWN),
+                                           'total': order.get('total', 0),
+                                           'status': order.get('status', 'ناجح')})
+        if order.get('delivery_location'):
+            _emit(parts, 'all_reports_delivery', order)
+        else:
+            _emit(parts, 'all_reports_pickup')
+        _emit(parts, 'all_reports_items')
+        _emit_report_items(parts, order.get('items', []))
+        _emit(parts, 'all_reports_end')
+        writer.write(''.join(parts))
@@ -0,0 +1,305 @@
+import itertools
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import tkinter as tk
+
+# Rendered receipts wait here until the backend has printed them; files left
+# over from a crash are printed at the next start
+SPOOL_DIR = os.environ.get('POS_SPOOL_DIR', 'print_spool')
+# 'notepad', 'shell', 'lpr', 'file' or 'local' (see BACKENDS)
+PRINT_BACKEND = os.environ.get('POS_PRINT_BACKEND', 'notepad' if sys.platform == 'win32' else 'lpr')
+PRINT_WORKERS = int(os.environ.get('POS_PRINT_WORKERS', '1'))
+# Receipts that arrive within this window of each other go out as one batch
+BATCH_WINDOW = 0.3
+BATCH_MAX = 10
+# Seconds to wait before each retry; a job fails after len(RETRY_DELAYS) retries
+RETRY_DELAYS = (2, 10, 30)
+# How often the Tk main thread picks up status changes (ms)
+STATUS_POLL_INTERVAL = 200
+
+# Spool file names; raw files hold printer commands (ESC/POS) rather than text
+TEXT_SUFFIX = '.txt'
+RAW_SUFFIX = '.bin'
+
+STATUS_QUEUED = 'queued'
+STATUS_PRINTED = 'printed'
+STATUS_RETRYING = 'retrying'
+STATUS_FAILED = 'failed'
+
+
+# ----- backends -------------------------------------------------------------
+# A backend takes a list of spooled file paths and prints them, calling
+# printed(path) for each file as soon as it is handed off and raising on
+# failure.  Files reported as printed are removed from the spool and never
+# retried, so a failure half way through a batch does not print the first
+# receipts twice.
+
+class NotepadBackend:
+    def print_files(self, paths, printed):
+        for path in paths:
+            subprocess.run(["notepad", "/p", path], check=True)
+            printed(path)
+
+
+class ShellBackend:
+    # The Windows shell's "print" verb for the file type
+    def print_files(self, paths, printed):
+        for path in paths:
+            os.startfile(path, "print")
+            printed(path)
+
+
+class LprBackend:
+    def __init__(self, printer=None):
+        self.printer = printer or os.environ.get('POS_PRINTER')
+
+    def print_files(self, paths, printed):
+        # One lpr call per batch; ESC/POS files go to the printer unfiltered
+        options = ["-P", self.printer] if self.printer else []
+        text = [path for path in paths if not path.endswith(RAW_SUFFIX)]
+        raw = [path for path in paths if path.endswith(RAW_SUFFIX)]
+        if text:
+            subprocess.run(["lpr"] + options + text, check=True, timeout=60)
+            for path in text:
+                printed(path)
+        if raw:
+            subprocess.run(["lpr"] + options + ["-o", "raw"] + raw, check=True, timeout=60)
+            for path in raw:
+                printed(path)
+
+
+class FileSinkBackend:
+    # Keeps the receipts as files instead of printing them
+    def __init__(self, directory=None):
+        self.directory = directory or os.environ.get('POS_PRINT_SINK_DIR', 'order_reports')
+
+    def print_files(self, paths, printed):
+        os.makedirs(self.directory, exist_ok=True)
+        for path in paths:
+            shutil.copy(path, os.path.join(self.directory, os.path.basename(path)))
+            printed(path)
+
+
+class LocalBackend:
+    # Stand-in for machines without a printer: writes the receipt to stdout
+    def print_files(self, paths, printed):
+        for path in paths:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                print(f.read())
+            printed(path)
+
+
+BACKENDS = {
+    'notepad': NotepadBackend,
+    'shell': ShellBackend,
+    'lpr': LprBackend,
+    'file': FileSinkBackend,
+    'local': LocalBackend,
+}
+
+
+def register_backend(name, factory):
+    BACKENDS[name] = factory
+
+
+# ----- spooler --------------------------------------------------------------
+
+class PrintJob:
+    def __init__(self, job_id, title, content=None, path=None, binary=False):
+        self.job_id = job_id
+        self.title = title
+        self.content = content  # str/bytes, or a callable writing the receipt to a file
+        self.path = path
+        self.binary = binary
+        self.attempts = 0
+        self.status = STATUS_QUEUED
+        self.error = None
+
+
+class ReceiptSpooler:
+    """Prints receipts in the background.
+
+    submit() only queues the job, so the caller (place_order) never waits on
+    the printer.  A worker writes the receipt to SPOOL_DIR, waits briefly for
+    more jobs so a rush goes out in one batch, and hands the batch to the
+    backend.  Receipts a failed batch did not print are retried after
+    RETRY_DELAYS, then marked failed and left in the spool for
+    retry_failed().  Status changes are
+    delivered on the Tk main thread through the after() poll set up by
+    attach().
+    """
+
+    def __init__(self, backend=None, spool_dir=SPOOL_DIR, workers=PRINT_WORKERS):
+        self.backend = backend or BACKENDS[PRINT_BACKEND]()
+        self.spool_dir = spool_dir
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._queue = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.failed = []
+        self._status = queue.Queue()
+        self._root = None
+        self.on_status = None
+        self._recover()
+        for number in range(workers):
+            threading.Thread(target=self._run, name=f"receipt-spooler-{number}", daemon=True).start()
+
+    def _recover(self):
+        # Receipts spooled but not printed before the last exit
+        for name in sorted(os.listdir(self.spool_dir)):
+            if name.endswith('.tmp'):
+                # Half-written when the last run stopped; its job was never acknowledged
+                try:
+                    os.remove(os.path.join(self.spool_dir, name))
+                except OSError:
+                    pass
+            elif name.endswith((TEXT_SUFFIX, RAW_SUFFIX)):
+                self._queue.put(PrintJob(next(self._ids), name, path=os.path.join(self.spool_dir, name),
+                                         binary=name.endswith(RAW_SUFFIX)))
+
+    def attach(self, root, on_status=None):
+        self._root = root
+        self.on_status = on_status
+        self._root.after(STATUS_POLL_INTERVAL, self._deliver_status)
+
+    def submit(self, content, title="", binary=False):
+        job = PrintJob(next(self._ids), title, content=content, binary=binary)
+        self._queue.put(job)
+        return job
+
+    def submit_file(self, path, title=""):
+        # An already written file; printed from a copy in the spool
+        with open(path, 'r', encoding='utf-8') as f:
+            return self.submit(f.read(), title or os.path.basename(path))
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def retry_failed(self):
+        with self._lock:
+            jobs, self.failed = self.failed, []
+        for job in jobs:
+            job.attempts = 0
+            self._set_status(job, STATUS_QUEUED)
+            self._queue.put(job)
+        return len(jobs)
+
+    # ----- worker -----------------------------------------------------------
+
+    def _spool(self, job):
+        if job.path is not None:
+            return
+        suffix = RAW_SUFFIX if job.binary else TEXT_SUFFIX
+        name = f"{time.strftime('%Y%m%d_%H%M%S')}_{job.job_id:06d}{suffix}"
+        path = os.path.join(self.spool_dir, name)
+        try:
+            with (open(path + '.tmp', 'wb') if job.binary else open(path + '.tmp', 'w', encoding='utf-8')) as f:
+                if callable(job.content):
+                    job.content(f)
+                else:
+                    f.write(job.content)
+        except Exception:
+            try:
+                os.remove(path + '.tmp')
+            except OSError:
+                pass
+            raise
+        os.replace(path + '.tmp', path)
+        job.path = path
+        job.content = None
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + BATCH_WINDOW
+        while len(batch) < BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            ready = []
+            for job in batch:
+                try:
+                    self._spool(job)
+                    ready.append(job)
+                except OSError as e:
+                    print(f"Could not spool receipt {job.title}: {e}")
+                    self._fail(job, e)
+                except Exception as e:
+                    # A rendering error (bad order data): retrying gives the same result
+                    print(f"Could not render receipt {job.title}: {e}")
+                    self._fail(job, e, retry=False)
+            if not ready:
+                continue
+            printed = set()
+            error = None
+            try:
+                self.backend.print_files([job.path for job in ready], printed.add)
+            except Exception as e:
+                print(f"Printing failed: {e}")
+                error = e
+            for job in ready:
+                if error is not None and job.path not in printed:
+                    # Only the receipts that did not go out are retried
+                    self._fail(job, error)
+                    continue
+                try:
+                    os.remove(job.path)
+                except OSError:
+                    pass
+                self._set_status(job, STATUS_PRINTED)
+
+    def _fail(self, job, error, retry=True):
+        job.attempts += 1
+        job.error = error
+        if retry and job.attempts <= len(RETRY_DELAYS):
+            self._set_status(job, STATUS_RETRYING)
+            timer = threading.Timer(RETRY_DELAYS[job.attempts - 1], self._queue.put, args=(job,))
+            timer.daemon = True
+            timer.start()
+        else:
+            with self._lock:
+                self.failed.append(job)
+            self._set_status(job, STATUS_FAILED)
+
+    # ----- status -----------------------------------------------------------
+
+    def _set_status(self, job, status):
+        job.status = status
+        self._status.put(job)
+
+    def _deliver_status(self):
+        try:
+            while True:
+                job = self._status.get_nowait()
+                if self.on_status:
+                    self.on_status(job)
+        except queue.Empty:
+            pass
+        try:
+            self._root.after(STATUS_POLL_INTERVAL, self._deliver_status)
+        except tk.TclError:
+            # Root destroyed; stop polling
+            pass
+
+
+_spooler = None
+
+
+def get_receipt_spooler():
+    global _spooler
+    if _spooler is None:
+        _spooler = ReceiptSpooler()
+    return _spooler
@@ -0,0 +1,92 @@
+def _cost_value(entry):
+    try:
+        return float(entry[5])
+    except (TypeError, ValueError):
+        print(f"Invalid cost value: {entry[5]}")
+        return None
+
+
+class RevenueAggregates:
+    """Running totals over the revenue and supplier-cost rows.
+
+    Built in one pass when the data is loaded, then kept up to date by
+    add_/remove_ calls from the add, edit and delete handlers, so reports
+    only walk the buckets (days, shifts, months, suppliers, payment types)
+    instead of every row ever entered.  Each bucket is [amount, row_count]
+    and disappears when its last row is removed.
+    """
+
+    def __init__(self, daily_revenue=(), supplier_costs=()):
+        self.by_day = {}
+        self.by_shift = {}
+        self.by_month_revenue = {}
+        self.by_month_costs = {}
+        self.by_supplier = {}
+        self.by_payment_type = {}
+        self.total_revenue = 0.0
+        self.total_costs = 0.0
+        for entry in daily_revenue:
+            self.add_revenue(entry)
+        for entry in supplier_costs:
+            self.add_cost(entry)
+
+    def _bump(self, buckets, key, amount, count):
+        bucket = buckets.setdefault(key, [0.0, 0])
+        bucket[0] += amount
+        bucket[1] += count
+        if bucket[1] <= 0:
+            del buckets[key]
+
+    # Daily revenue rows: (date, time, revenue, shift_type)
+    def _apply_revenue(self, entry, sign):
+        day = entry[0].isoformat()
+        amount = sign * entry[2]
+        self._bump(self.by_day, day, amount, sign)
+        self._bump(self.by_shift, (day, entry[3]), amount, sign)
+        self._bump(self.by_month_revenue, day[:7], amount, sign)
+        self.total_revenue += amount
+
+    def add_revenue(self, entry):
+        self._apply_revenue(entry, 1)
+
+    def remove_revenue(self, entry):
+        self._apply_revenue(entry, -1)
+
+    # Supplier cost rows: (date, time, supplier, goods_type, notes, cost, payment_type)
+    def _apply_cost(self, entry, sign):
+        cost = _cost_value(entry)
+        if cost is None:
+            return
+        amount = sign * cost
+        self._bump(self.by_month_costs, entry[0].isoformat()[:7], amount, sign)
+        self._bump(self.by_supplier, entry[2], amount, sign)
+        self._bump(self.by_payment_type, entry[6], amount, sign)
+        self.total_costs += amount
+
+    def add_cost(self, entry):
+        self._apply_cost(entry, 1)
+
+    def remove_cost(self, entry):
+        self._apply_cost(entry, -1)
+
+    # ----- queries ----------------------------------------------------------
+
+    def has_shift(self, entry_date, shift_type):
+        return (entry_date.isoformat(), shift_type) in self.by_shift
+
+    def monthly_totals(self):
+        months = sorted(set(self.by_month_revenue) | set(self.by_month_costs))
+        return [(month,
+                 self.by_month_revenue.get(month, [0.0])[0],
+                 self.by_month_costs.get(month, [0.0])[0])
+                for month in months]
+
+    def shift_totals(self):
+        return [(day, shift_type, bucket[0]) for (day, shift_type), bucket in sorted(self.by_shift.items())]
+
+    def supplier_totals(self):
+        return sorted(((supplier, bucket[0], bucket[1]) for supplier, bucket in self.by_supplier.items()),
+                      key=lambda row: row[1], reverse=True)
+
+    def payment_type_totals(self):
+        return [(payment_type, bucket[0], bucket[1]) for payment_type, bucket in sorted(self.by_payment_type.items())]
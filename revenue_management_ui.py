@@ -1,9 +1,24 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 from datetime import date, timedelta, datetime
 import time
 import json
 import os
+from bisect import bisect_left, insort
+from order_store import STORAGE_BACKEND, OrderFeed
+from sqlite_store import get_sqlite_store
+from virtual_table import VirtualTable, ListRowSource
+from persistence import get_persistence_worker
+from revenue_aggregates import RevenueAggregates
+from item_sales import get_item_sales, load_menu_categories
+from shift_revenue import get_shift_revenue_job
+from shifts import shift_for
+from order_analytics import OrderAnalytics, RevenueAnalytics, numpy_available, WEEKDAY_NAMES
+import order_export
+
+# Rows are kept sorted on (date, time) so tables and reports never re-sort
+def entry_key(entry):
+    return (entry[0], entry[1])
 
 # Constants
 GLOBAL_FONT = ("Tajawal", 12)
@@ -25,6 +40,12 @@ class ModernRevenueManagementUI:
         self.configure_styles()
 
         self.data_file = "revenue_management.json"
+        # With the SQLite backend every edit is written as a single-row
+        # statement and the reports are aggregated in SQL
+        self.db = get_sqlite_store() if STORAGE_BACKEND == 'sqlite' else None
+        self.order_analytics = None  # Built on first use of the analytics report, caught up on each use
+        self.order_analytics_feed = None
+        self.export_job = None  # Running export, if any
         self.load_data()
 
         self.create_widgets()
@@ -53,6 +74,7 @@ class ModernRevenueManagementUI:
             ("الإيرادات اليومية", self.show_daily_revenue),
             ("تكاليف الموردين", self.show_supplier_costs),
             ("التقارير", self.show_reports),
+            ("تصدير البيانات", self.show_export),
             ("إغلاق التطبيق", self.exit_application)
         ]
 
@@ -86,7 +108,8 @@ class ModernRevenueManagementUI:
         ttk.Label(frame, text="إضافة إيراد يومي", font=(GLOBAL_FONT[0], 16, "bold")).grid(row=0, column=0, columnspan=2, pady=10)
 
         ttk.Label(frame, text="التاريخ:").grid(row=1, column=0, sticky="e", pady=5)
-        self.date_label = ttk.Label(frame, text=date.today().strftime("%Y-%m-%d"), font=GLOBAL_FONT)
+        # The business date: after midnight the night shift still belongs to the day before
+        self.date_label = ttk.Label(frame, text=shift_for(datetime.now())[0].strftime("%Y-%m-%d"), font=GLOBAL_FONT)
         self.date_label.grid(row=1, column=1, sticky="w", pady=5)
 
         ttk.Label(frame, text="الإيراد:").grid(row=2, column=0, sticky="e", pady=5)
@@ -101,6 +124,9 @@ class ModernRevenueManagementUI:
         add_button = ttk.Button(frame, text="إضافة الإيراد", command=self.add_daily_revenue)
         add_button.grid(row=4, column=1, sticky="e", pady=10)
 
+        derive_button = ttk.Button(frame, text="احتساب من الطلبات", command=self.fill_revenue_from_orders)
+        derive_button.grid(row=4, column=0, sticky="w", pady=10)
+
         # Add table
         self.daily_revenue_table = ttk.Treeview(frame, columns=("date", "time", "revenue", "shift_type"), show="headings")
         self.daily_revenue_table.heading("date", text="التاريخ")
@@ -220,6 +246,124 @@ class ModernRevenueManagementUI:
         delete_button = ttk.Button(button_frame, text="حذف", command=self.delete_supplier_cost)
         delete_button.pack(side="left", padx=5)
 
+    def show_export(self):
+        self.clear_content()
+        frame = ttk.Frame(self.content_frame)
+        frame.pack(padx=20, pady=20, fill="both", expand=True)
+
+        ttk.Label(frame, text="تصدير البيانات", font=(GLOBAL_FONT[0], 16, "bold")).grid(row=0, column=0, columnspan=2, pady=10)
+
+        # Date range; both ends included, empty means unbounded
+        ttk.Label(frame, text="من تاريخ (YYYY-MM-DD):").grid(row=1, column=0, sticky="e", pady=5)
+        self.export_start_entry = ttk.Entry(frame)
+        self.export_start_entry.insert(0, date.today().replace(month=1, day=1).strftime("%Y-%m-%d"))
+        self.export_start_entry.grid(row=1, column=1, sticky="ew", pady=5)
+
+        ttk.Label(frame, text="إلى تاريخ (YYYY-MM-DD):").grid(row=2, column=0, sticky="e", pady=5)
+        self.export_end_entry = ttk.Entry(frame)
+        self.export_end_entry.insert(0, date.today().strftime("%Y-%m-%d"))
+        self.export_end_entry.grid(row=2, column=1, sticky="ew", pady=5)
+
+        ttk.Label(frame, text="البيانات:").grid(row=3, column=0, sticky="ne", pady=5)
+        datasets_frame = ttk.Frame(frame)
+        datasets_frame.grid(row=3, column=1, sticky="w", pady=5)
+        self.export_datasets = {}
+        for name, text in (("orders", "الطلبات"), ("order_lines", "أصناف الطلبات"),
+                           ("daily_revenue", "الإيرادات اليومية"), ("supplier_costs", "تكاليف الموردين")):
+            var = tk.BooleanVar(value=True)
+            ttk.Checkbutton(datasets_frame, text=text, variable=var).pack(anchor="w")
+            self.export_datasets[name] = var
+
+        ttk.Label(frame, text="الصيغة:").grid(row=4, column=0, sticky="e", pady=5)
+        self.export_format = tk.StringVar(value=order_export.FORMAT_CSV)
+        format_frame = ttk.Frame(frame)
+        format_frame.grid(row=4, column=1, sticky="w", pady=5)
+        ttk.Radiobutton(format_frame, text="CSV", variable=self.export_format,
+                        value=order_export.FORMAT_CSV).pack(side="left", padx=5)
+        ttk.Radiobutton(format_frame, text="ملف عمودي مضغوط", variable=self.export_format,
+                        value=order_export.FORMAT_COLUMNAR).pack(side="left", padx=5)
+
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=5, column=0, columnspan=2, pady=10)
+        ttk.Button(button_frame, text="بدء التصدير", command=self.start_export).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="إلغاء", command=self.cancel_export).pack(side="left", padx=5)
+
+        self.export_progress = ttk.Progressbar(frame, mode="indeterminate")
+        self.export_progress.grid(row=6, column=0, columnspan=2, sticky="ew", pady=5)
+        self.export_status_label = ttk.Label(frame, text="")
+        self.export_status_label.grid(row=7, column=0, columnspan=2, pady=5)
+
+        frame.grid_columnconfigure(1, weight=1)
+
+    def start_export(self):
+        if self.export_job is not None:
+            messagebox.showwarning("تحذير", "يوجد تصدير قيد التنفيذ")
+            return
+        try:
+            start = self.export_start_entry.get().strip() or None
+            end = self.export_end_entry.get().strip() or None
+            if start:
+                datetime.strptime(start, "%Y-%m-%d")
+            if end:
+                # The store's end bound is exclusive
+                end = (datetime.strptime(end, "%Y-%m-%d").date() + timedelta(days=1)).strftime("%Y-%m-%d")
+        except ValueError:
+            messagebox.showerror("خطأ", "الرجاء إدخال التاريخ بصيغة YYYY-MM-DD")
+            return
+
+        # The revenue lists are small; copies keep the export independent of later edits
+        daily_revenue = list(self.daily_revenue_data)
+        supplier_costs = list(self.supplier_costs_data)
+        sources = {
+            'orders': lambda: order_export.order_rows(start, end),
+            'order_lines': lambda: order_export.order_line_rows(start, end),
+            'daily_revenue': lambda: order_export.entry_rows(daily_revenue, start, end),
+            'supplier_costs': lambda: order_export.entry_rows(supplier_costs, start, end),
+        }
+        selected = [(name, sources[name]) for name, var in self.export_datasets.items() if var.get()]
+        if not selected:
+            messagebox.showwarning("تحذير", "الرجاء اختيار البيانات المراد تصديرها")
+            return
+        directory = filedialog.askdirectory(title="اختر مجلد التصدير")
+        if not directory:
+            return
+
+        self.export_job = order_export.ExportJob(selected, directory, self.export_format.get(),
+                                                 on_progress=self.on_export_progress,
+                                                 on_done=self.on_export_done, on_error=self.on_export_error)
+        self.export_job.start(self.master)
+        self.export_progress.start(10)
+        self.export_status_label.config(text="جاري التصدير...")
+
+    def cancel_export(self):
+        if self.export_job is not None:
+            self.export_job.cancel()
+            self.export_job = None
+            self.stop_export_progress("تم إلغاء التصدير")
+
+    def stop_export_progress(self, text):
+        try:
+            self.export_progress.stop()
+            self.export_status_label.config(text=text)
+        except tk.TclError:
+            pass  # The export view was replaced by another page
+
+    def on_export_progress(self, dataset, rows):
+        try:
+            self.export_status_label.config(text=f"جاري التصدير: {dataset} - {rows} صف")
+        except tk.TclError:
+            pass
+
+    def on_export_done(self, paths):
+        self.export_job = None
+        self.stop_export_progress("تم التصدير")
+        messagebox.showinfo("نجاح", "تم تصدير الملفات:\n" + "\n".join(paths))
+
+    def on_export_error(self, error):
+        self.export_job = None
+        self.stop_export_progress("فشل التصدير")
+        messagebox.showerror("خطأ", f"فشل التصدير: {error}")
+
     def update_checkboxes(self, selected):
         self.payment_type.set(selected)
 
@@ -233,34 +377,35 @@ class ModernRevenueManagementUI:
         report_types = [
             ("تقرير الإيرادات اليومية", self.generate_daily_revenue_report),
             ("تقرير تكاليف الموردين", self.generate_supplier_costs_report),
-            ("تقرير الإيرادات الشهرية", self.generate_monthly_revenue_report)
+            ("تقرير الإيرادات الشهرية", self.generate_monthly_revenue_report),
+            ("تقرير الشفتات", self.generate_shift_revenue_report),
+            ("ملخص التكاليف حسب المورد", self.generate_supplier_summary_report),
+            ("تحليلات الطلبات", self.generate_order_analytics_report),
+            ("تقرير مبيعات الأصناف", self.generate_item_sales_report),
+            ("مبيعات الأصناف حسب الساعة", self.generate_item_hours_report),
+            ("مطابقة إيرادات الشفتات", self.generate_shift_reconciliation_report)
         ]
 
         for text, command in report_types:
             btn = ttk.Button(frame, text=text, command=command)
             btn.pack(pady=5, fill="x")
 
-        # Create Treeview for report display
-        self.report_tree = ttk.Treeview(frame, show="headings", selectmode="none")
+        # Virtualized table for report display; only the visible rows are materialized
+        self.report_tree = VirtualTable(frame, (), bg=CONTENT_COLOR, selectmode="none")
         self.report_tree.pack(pady=10, fill="both", expand=True)
 
-        # Add scrollbar to the Treeview
-        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=self.report_tree.yview)
-        scrollbar.pack(side="right", fill="y")
-        self.report_tree.configure(yscrollcommand=scrollbar.set)
-
         # Add print button
         print_button = ttk.Button(frame, text="طباعة التقرير", command=self.print_report)
         print_button.pack(pady=10)
 
     def print_report(self):
-        if not self.report_tree.get_children():
+        if not len(self.report_tree.source):
             messagebox.showwarning("تحذير", "لا يوجد تقرير لطباعته. الرجاء توليد تقرير أولاً.")
             return
 
         report_content = "تقرير\n\n"
         
-        headers = [self.report_tree.heading(col)["text"] for col in self.report_tree["columns"]]
+        headers = [self.report_tree.tree.heading(col)["text"] for col in self.report_tree.tree["columns"]]
 
         if self.current_report_type == "monthly":
             report_content += "تقرير الإيرادات الشهرية\n\n"
@@ -268,9 +413,20 @@ class ModernRevenueManagementUI:
             report_content += "تقرير الإيرادات اليومية\n\n"
         elif self.current_report_type == "supplier":
             report_content += "تقرير تكاليف الموردين\n\n"
-
-        for item in self.report_tree.get_children():
-            values = self.report_tree.item(item)["values"]
+        elif self.current_report_type == "shift":
+            report_content += "تقرير الشفتات\n\n"
+        elif self.current_report_type == "supplier_summary":
+            report_content += "ملخص التكاليف حسب المورد\n\n"
+        elif self.current_report_type == "analytics":
+            report_content += "تحليلات الطلبات\n\n"
+        elif self.current_report_type == "item_sales":
+            report_content += "تقرير مبيعات الأصناف\n\n"
+        elif self.current_report_type == "item_hours":
+            report_content += "مبيعات الأصناف حسب الساعة\n\n"
+        elif self.current_report_type == "shift_reconciliation":
+            report_content += "مطابقة إيرادات الشفتات\n\n"
+
+        for values in self.report_tree.source:
             for header, value in zip(headers, values):
                 report_content += f"{header}: {value}\n"
             report_content += "-" * 40 + "\n"  # Separator between entries
@@ -297,108 +453,210 @@ class ModernRevenueManagementUI:
         os.startfile(file_path, "print")
 
     def generate_monthly_revenue_report(self):
-        # Clear previous data
-        for col in self.report_tree["columns"]:
-            self.report_tree.heading(col, text="")
-        self.report_tree.delete(*self.report_tree.get_children())
-
         # Set up columns
         columns = ("الشهر", "الايراد", "التكاليف", "صافي الربح")
-        self.report_tree["columns"] = columns
-        for col in columns:
-            self.report_tree.heading(col, text=col)
-            self.report_tree.column(col, anchor="center", width=100)
+        self.report_tree.set_columns(columns)
+        rows = []
+
+        if self.db:
+            # Grouped by month in SQL
+            monthly_totals = self.db.monthly_totals()
+            total_revenue = self.db.total_daily_revenue()
+            total_costs = self.db.total_supplier_costs()
+        else:
+            # Month buckets are maintained incrementally, so this is O(months)
+            monthly_totals = self.aggregates.monthly_totals()
+            total_revenue = self.aggregates.total_revenue
+            total_costs = self.aggregates.total_costs
+
+        for month, revenue, costs in monthly_totals:
+            rows.append((month, f"{revenue:.2f}", f"{costs:.2f}", f"{revenue - costs:.2f}"))
+
+        total_profit = total_revenue - total_costs
 
-        monthly_data = {}
-        
-        for entry in self.daily_revenue_data:
-            month = entry[0].strftime("%Y-%m")
-            if month not in monthly_data:
-                monthly_data[month] = {"revenue": 0, "costs": 0}
-            monthly_data[month]["revenue"] += entry[2]
-        
-        for entry in self.supplier_costs_data:
-            month = entry[0].strftime("%Y-%m")
-            if month not in monthly_data:
-                monthly_data[month] = {"revenue": 0, "costs": 0}
-            try:
-                monthly_data[month]["costs"] += float(entry[5])  # Use index 5 for cost and convert to float
-            except ValueError:
-                print(f"Invalid cost value: {entry[5]}")
-        
-        total_revenue = 0
-        total_costs = 0
-        total_profit = 0
-        
-        for month, data in sorted(monthly_data.items()):
-            revenue = data["revenue"]
-            costs = data["costs"]
-            profit = revenue - costs
-            self.report_tree.insert("", "end", values=(month, f"{revenue:.2f}", f"{costs:.2f}", f"{profit:.2f}"))
-            total_revenue += revenue
-            total_costs += costs
-            total_profit += profit
-        
         # Add totals row
-        self.report_tree.insert("", "end", values=("الإجمالي", f"{total_revenue:.2f}", f"{total_costs:.2f}", f"{total_profit:.2f}"))
+        rows.append(("الإجمالي", f"{total_revenue:.2f}", f"{total_costs:.2f}", f"{total_profit:.2f}"))
 
+        self.report_tree.set_source(ListRowSource(rows))
         self.current_report_type = "monthly"
 
     def generate_daily_revenue_report(self):
-        # Clear previous data
-        for col in self.report_tree["columns"]:
-            self.report_tree.heading(col, text="")
-        self.report_tree.delete(*self.report_tree.get_children())
-
         # Set up columns
         columns = ("التاريخ", "الوقت", "الإيراد")
-        self.report_tree["columns"] = columns
-        for col in columns:
-            self.report_tree.heading(col, text=col)
-            self.report_tree.column(col, anchor="center", width=100)
-
-        total_revenue = 0
-        for entry in sorted(self.daily_revenue_data, key=lambda x: (x[0], x[1])):
-            self.report_tree.insert("", "end", values=(entry[0].strftime("%Y-%m-%d"), entry[1], f"{entry[2]:.2f}"))
-            total_revenue += entry[2]
-        
-        self.report_tree.insert("", "end", values=("إجمالي الإيرادات", "", f"{total_revenue:.2f}"))
+        self.report_tree.set_columns(columns)
+        rows = []
+
+        if self.db:
+            for entry_date, entry_time, revenue, _ in self.db.load_daily_revenue():
+                rows.append((entry_date, entry_time, f"{revenue:.2f}"))
+            total_revenue = self.db.total_daily_revenue()
+        else:
+            for entry in self.daily_revenue_data:
+                rows.append((entry[0].isoformat(), entry[1], f"{entry[2]:.2f}"))
+            total_revenue = self.aggregates.total_revenue
+
+        rows.append(("إجمالي الإيرادات", "", f"{total_revenue:.2f}"))
 
+        self.report_tree.set_source(ListRowSource(rows))
         self.current_report_type = "daily"
 
     def generate_supplier_costs_report(self):
-        # Clear previous data
-        for col in self.report_tree["columns"]:
-            self.report_tree.heading(col, text="")
-        self.report_tree.delete(*self.report_tree.get_children())
-
         # Set up columns to match the supplier costs table
         columns = ("التاريخ", "الوقت", "المورد", "نوع البضاعة", "ملاحظات", "التكلفة", "نوع الدفع")
-        self.report_tree["columns"] = columns
-        for col in columns:
-            self.report_tree.heading(col, text=col)
-            self.report_tree.column(col, anchor="center", width=100)
+        self.report_tree.set_columns(columns)
+        rows = []
+
+        if self.db:
+            for entry in self.db.load_supplier_costs():
+                formatted_entry = list(entry)
+                formatted_entry[5] = f"{entry[5]:.2f}"
+                rows.append(formatted_entry)
+            rows.append(("إجمالي التكاليف", "", "", "", "", f"{self.db.total_supplier_costs():.2f}", ""))
+            self.report_tree.set_source(ListRowSource(rows))
+            self.current_report_type = "supplier"
+            return
 
-        total_cost = 0
-        for entry in sorted(self.supplier_costs_data, key=lambda x: (x[0], x[1])):
+        for entry in self.supplier_costs_data:
             try:
                 cost = float(entry[5])  # Use index 5 for cost and convert to float
                 formatted_entry = list(entry)
                 formatted_entry[0] = formatted_entry[0].strftime("%Y-%m-%d")
                 formatted_entry[5] = f"{cost:.2f}"  # Format the cost as a float with 2 decimal places
-                self.report_tree.insert("", "end", values=formatted_entry)
-                total_cost += cost
+                rows.append(formatted_entry)
             except ValueError:
                 print(f"Invalid cost value: {entry[5]}")
                 formatted_entry = list(entry)
                 formatted_entry[0] = formatted_entry[0].strftime("%Y-%m-%d")
                 formatted_entry[5] = "Invalid Cost"
-                self.report_tree.insert("", "end", values=formatted_entry)
+                rows.append(formatted_entry)
 
-        self.report_tree.insert("", "end", values=("إجمالي التكاليف", "", "", "", "", f"{total_cost:.2f}", ""))
+        rows.append(("إجمالي التكاليف", "", "", "", "", f"{self.aggregates.total_costs:.2f}", ""))
 
+        self.report_tree.set_source(ListRowSource(rows))
         self.current_report_type = "supplier"
 
+    def generate_shift_revenue_report(self):
+        columns = ("التاريخ", "نوع الشفت", "الإيراد")
+        self.report_tree.set_columns(columns)
+        rows = [(day, shift_type, f"{revenue:.2f}") for day, shift_type, revenue in self.aggregates.shift_totals()]
+        rows.append(("إجمالي الإيرادات", "", f"{self.aggregates.total_revenue:.2f}"))
+        self.report_tree.set_source(ListRowSource(rows))
+        self.current_report_type = "shift"
+
+    def generate_supplier_summary_report(self):
+        columns = ("المورد / نوع الدفع", "عدد العمليات", "التكلفة")
+        self.report_tree.set_columns(columns)
+        rows = [(supplier, count, f"{cost:.2f}") for supplier, cost, count in self.aggregates.supplier_totals()]
+        rows.append(("", "", ""))
+        rows.extend((payment_type, count, f"{cost:.2f}")
+                    for payment_type, cost, count in self.aggregates.payment_type_totals())
+        rows.append(("إجمالي التكاليف", "", f"{self.aggregates.total_costs:.2f}"))
+        self.report_tree.set_source(ListRowSource(rows))
+        self.current_report_type = "supplier_summary"
+
+    def generate_order_analytics_report(self):
+        if not numpy_available():
+            messagebox.showerror("خطأ", "تحليلات الطلبات تتطلب تثبيت مكتبة numpy")
+            return
+        if self.order_analytics is None:
+            self.order_analytics = OrderAnalytics()
+            self.order_analytics_feed = OrderFeed()
+        get_persistence_worker().flush()  # Include orders still queued for writing
+        # Only the orders placed or changed since the last report are read
+        self.order_analytics.add_orders(self.order_analytics_feed.read())
+        analytics = self.order_analytics
+
+        columns = ("المقياس", "العدد", "الإيراد")
+        self.report_tree.set_columns(columns)
+        rows = [("نسبة الإلغاء", f"{analytics.cancellation_rate() * 100:.1f}%", "")]
+
+        split = analytics.delivery_vs_pickup()
+        rows.append(("طلبات التوصيل", split['delivery'][0], f"{split['delivery'][1]:.2f}"))
+        rows.append(("طلبات الاستلام", split['pickup'][0], f"{split['pickup'][1]:.2f}"))
+
+        rows.append(("", "", ""))
+        for hour, revenue in enumerate(analytics.revenue_per_hour()):
+            if revenue:
+                rows.append((f"الساعة {hour:02d}:00", "", f"{revenue:.2f}"))
+
+        rows.append(("", "", ""))
+        for weekday, revenue in enumerate(analytics.revenue_per_weekday()):
+            rows.append((WEEKDAY_NAMES[weekday], "", f"{revenue:.2f}"))
+
+        rows.append(("", "", ""))
+        for name, quantity, revenue in analytics.revenue_per_item():
+            rows.append((name, quantity, f"{revenue:.2f}"))
+
+        # Manually entered shift revenue, for comparison with the order totals above
+        rows.append(("", "", ""))
+        revenue_analytics = RevenueAnalytics(self.daily_revenue_data)
+        for shift_type, revenue in revenue_analytics.revenue_per_shift():
+            rows.append((shift_type, "", f"{revenue:.2f}"))
+
+        self.report_tree.set_source(ListRowSource(rows))
+        self.current_report_type = "analytics"
+
+    def generate_item_sales_report(self):
+        sales = get_item_sales()
+        columns = ("الصنف / الفئة", "الكمية", "الإيراد", "النسبة")
+        self.report_tree.set_columns(columns)
+
+        rows = [(name, quantity, f"{revenue:.2f}", f"{share * 100:.1f}%")
+                for name, quantity, revenue, share in sales.top_sellers()]
+
+        rows.append(("", "", "", ""))
+        total = sales.total_revenue or 1.0
+        for category, quantity, revenue in sales.category_totals(load_menu_categories()):
+            rows.append((category, quantity, f"{revenue:.2f}", f"{revenue / total * 100:.1f}%"))
+
+        # Attach rates: share of the orders with an item that also had the other one
+        rows.append(("", "", "", ""))
+        for item, attached, together, rate in sales.attach_rates():
+            rows.append((f"{item} + {attached}", together, "", f"{rate * 100:.1f}%"))
+
+        rows.append(("إجمالي المبيعات", sales.order_count, f"{sales.total_revenue:.2f}", ""))
+        self.report_tree.set_source(ListRowSource(rows))
+        self.current_report_type = "item_sales"
+
+    def generate_item_hours_report(self):
+        hours, heatmap = get_item_sales().hour_heatmap()
+        columns = ("الصنف",) + tuple(f"{hour:02d}:00" for hour in hours)
+        self.report_tree.set_columns(columns, width=60)
+        rows = [(name, *counts) for name, counts in heatmap]
+        self.report_tree.set_source(ListRowSource(rows))
+        self.current_report_type = "item_hours"
+
+    def derived_shift_totals(self):
+        # Let the background job finish reading the newly saved orders first
+        job = get_shift_revenue_job()
+        job.schedule()
+        get_persistence_worker().flush()
+        return job
+
+    def fill_revenue_from_orders(self):
+        business_date, _ = shift_for(datetime.now())
+        revenue = self.derived_shift_totals().revenue_for(business_date, self.shift_type.get())
+        self.revenue_entry.delete(0, tk.END)
+        self.revenue_entry.insert(0, f"{revenue:.2f}")
+
+    def generate_shift_reconciliation_report(self):
+        columns = ("التاريخ", "نوع الشفت", "عدد الطلبات", "من الطلبات", "المسجل يدوياً", "الفرق")
+        self.report_tree.set_columns(columns)
+
+        derived = {(day, shift): (revenue, count)
+                   for day, shift, revenue, count in self.derived_shift_totals().shift_totals()}
+        rows = []
+        for day, shift in sorted(set(derived) | set(self.aggregates.by_shift)):
+            revenue, count = derived.get((day, shift), (0.0, 0))
+            manual = self.aggregates.by_shift.get((day, shift))
+            if manual is None:
+                rows.append((day, shift, count, f"{revenue:.2f}", "غير مسجل", ""))
+            else:
+                rows.append((day, shift, count, f"{revenue:.2f}", f"{manual[0]:.2f}", f"{manual[0] - revenue:.2f}"))
+
+        self.report_tree.set_source(ListRowSource(rows))
+        self.current_report_type = "shift_reconciliation"
+
     def clear_content(self):
         for widget in self.content_frame.winfo_children():
             widget.destroy()
@@ -409,18 +667,21 @@ class ModernRevenueManagementUI:
         
         try:
             revenue = float(revenue_str)
-            entry_date = date.today()
-            entry_time = datetime.now().strftime("%H:%M:%S")
+            now = datetime.now()
+            # Same business date fill_revenue_from_orders totals, so a night shift closed after midnight counts for the day it started
+            entry_date, _ = shift_for(now)
+            entry_time = now.strftime("%H:%M:%S")
             
             # Check if an entry for the same shift type already exists for today
-            existing_entry = next((entry for entry in self.daily_revenue_data 
-                                   if entry[0] == entry_date and entry[3] == shift_type), None)
-            
-            if existing_entry:
+            if self.aggregates.has_shift(entry_date, shift_type):
                 messagebox.showerror("خطأ", "عفوا لا يمكنك اضافة أكثر من إيراد لنفس الشفت في نفس اليوم")
                 return
             
-            self.daily_revenue_data.append((entry_date, entry_time, revenue, shift_type))
+            entry = (entry_date, entry_time, revenue, shift_type)
+            insort(self.daily_revenue_data, entry, key=entry_key)
+            self.aggregates.add_revenue(entry)
+            if self.db:
+                self.db.add_daily_revenue(entry_date.strftime("%Y-%m-%d"), entry_time, revenue, shift_type)
             self.update_daily_revenue_table()
             self.save_data()  # Save data after adding new entry
             
@@ -431,7 +692,7 @@ class ModernRevenueManagementUI:
 
     def update_daily_revenue_table(self):
         self.daily_revenue_table.delete(*self.daily_revenue_table.get_children())
-        for entry in sorted(self.daily_revenue_data, key=lambda x: (x[0], x[1]), reverse=True):
+        for entry in reversed(self.daily_revenue_data):
             self.daily_revenue_table.insert("", "end", values=(entry[0].strftime("%Y-%m-%d"), entry[1], f"{entry[2]:.2f}", entry[3]))
 
     def add_supplier_cost(self):
@@ -446,7 +707,12 @@ class ModernRevenueManagementUI:
             entry_date = date.today()
             entry_time = datetime.now().strftime("%H:%M:%S")
             
-            self.supplier_costs_data.append((entry_date, entry_time, supplier, goods_type, notes, cost, payment_type))
+            entry = (entry_date, entry_time, supplier, goods_type, notes, cost, payment_type)
+            insort(self.supplier_costs_data, entry, key=entry_key)
+            self.aggregates.add_cost(entry)
+            if self.db:
+                self.db.add_supplier_cost(entry_date.strftime("%Y-%m-%d"), entry_time, supplier, goods_type,
+                                          notes, cost, payment_type)
             self.update_supplier_costs_table()
             self.save_data()  # Save data after adding new entry
             
@@ -460,45 +726,89 @@ class ModernRevenueManagementUI:
 
     def update_supplier_costs_table(self):
         self.supplier_costs_table.delete(*self.supplier_costs_table.get_children())
-        for entry in sorted(self.supplier_costs_data, key=lambda x: (x[0], x[1]), reverse=True):
+        for entry in reversed(self.supplier_costs_data):
             formatted_entry = list(entry)
             formatted_entry[0] = formatted_entry[0].strftime("%Y-%m-%d")
             formatted_entry[5] = f"{float(entry[5]):.2f}"  # Format the cost as a float with 2 decimal places
             self.supplier_costs_table.insert("", "end", values=formatted_entry, tags=("centered",))
 
     def load_data(self):
-        if os.path.exists(self.data_file):
+        # Only read here; rows are parsed on first use (see the properties below),
+        # so opening the window on the daily-entry tab never touches the supplier costs
+        if self.db:
+            self._raw_daily_revenue = self.db.load_daily_revenue()
+            self._raw_supplier_costs = self.db.load_supplier_costs()
+        elif os.path.exists(self.data_file):
             with open(self.data_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                self.daily_revenue_data = [
-                    (datetime.strptime(item[0], "%Y-%m-%d").date(), item[1], item[2], item[3])
-                    for item in data.get('daily_revenue', [])
-                ]
-                self.supplier_costs_data = [
-                    (datetime.strptime(item[0], "%Y-%m-%d").date(), item[1], item[2], item[3], item[4], item[5], item[6])
-                    for item in data.get('supplier_costs', [])
-                ]
+                self._raw_daily_revenue = data.get('daily_revenue', [])
+                self._raw_supplier_costs = data.get('supplier_costs', [])
         else:
-            self.daily_revenue_data = []
-            self.supplier_costs_data = []
+            self._raw_daily_revenue = []
+            self._raw_supplier_costs = []
+        self._daily_revenue_data = None
+        self._supplier_costs_data = None
+        self._aggregates = None
+
+    @property
+    def daily_revenue_data(self):
+        if self._daily_revenue_data is None:
+            # date.fromisoformat is much cheaper than strptime for 'YYYY-MM-DD'
+            self._daily_revenue_data = [
+                (date.fromisoformat(item[0]), item[1], item[2], item[3])
+                for item in self._raw_daily_revenue
+            ]
+            self._daily_revenue_data.sort(key=entry_key)
+            self._raw_daily_revenue = None
+        return self._daily_revenue_data
+
+    @property
+    def supplier_costs_data(self):
+        if self._supplier_costs_data is None:
+            self._supplier_costs_data = [
+                (date.fromisoformat(item[0]), item[1], item[2], item[3], item[4], item[5], item[6])
+                for item in self._raw_supplier_costs
+            ]
+            self._supplier_costs_data.sort(key=entry_key)
+            self._raw_supplier_costs = None
+        return self._supplier_costs_data
+
+    @property
+    def aggregates(self):
+        if self._aggregates is None:
+            self._aggregates = RevenueAggregates(self.daily_revenue_data, self.supplier_costs_data)
+        return self._aggregates
+
+    def find_entry_index(self, data, entry_date, entry_time):
+        # Binary search on the (date, time) ordering; None if the row is gone
+        index = bisect_left(data, (entry_date, entry_time), key=entry_key)
+        if index < len(data) and entry_key(data[index]) == (entry_date, entry_time):
+            return index
+        return None
 
     def save_data(self):
+        if self.db:
+            # Already written row by row
+            return
+        if self._daily_revenue_data is None and self._supplier_costs_data is None:
+            return  # Nothing was parsed, so nothing was edited
+        # A list that was never parsed is written back as read
         data = {
-            'daily_revenue': [
+            'daily_revenue': self._raw_daily_revenue if self._daily_revenue_data is None else [
                 [item[0].strftime("%Y-%m-%d"), item[1], item[2], item[3]]
-                for item in self.daily_revenue_data
+                for item in self._daily_revenue_data
             ],
-            'supplier_costs': [
+            'supplier_costs': self._raw_supplier_costs if self._supplier_costs_data is None else [
                 [item[0].strftime("%Y-%m-%d"), item[1], item[2], item[3], item[4], item[5], item[6]]
-                for item in self.supplier_costs_data
+                for item in self._supplier_costs_data
             ]
         }
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+        get_persistence_worker().submit_json(self.data_file, data, indent=2)
 
     def exit_application(self):
         if messagebox.askyesno("إغلاق", "هل أنت متأكد من رغبتك في إغلاق التطبيق؟"):
             self.save_data()  # Save data before closing the application
+            get_persistence_worker().flush()
             self.master.destroy()
 
     def edit_daily_revenue(self):
@@ -532,16 +842,20 @@ class ModernRevenueManagementUI:
 
             # Check if changing the shift type would result in a duplicate entry
             if new_shift_type != shift_type:
-                existing_entry = next((entry for entry in self.daily_revenue_data 
-                                       if entry[0] == edit_date and entry[3] == new_shift_type), None)
-                if existing_entry:
+                if self.aggregates.has_shift(edit_date, new_shift_type):
                     messagebox.showerror("خطأ", "عفوا لا يمكنك تغيير نوع الشفت لأنه يوجد إيراد مسجل لهذا الشفت في نفس اليوم")
                     return
 
-            for i, entry in enumerate(self.daily_revenue_data):
-                if entry[0] == edit_date and entry[1] == time:
-                    self.daily_revenue_data[i] = (entry[0], entry[1], new_revenue, new_shift_type)
-                    break
+            i = self.find_entry_index(self.daily_revenue_data, edit_date, time)
+            if i is not None:
+                entry = self.daily_revenue_data[i]
+                new_entry = (entry[0], entry[1], new_revenue, new_shift_type)
+                self.daily_revenue_data[i] = new_entry
+                self.aggregates.remove_revenue(entry)
+                self.aggregates.add_revenue(new_entry)
+
+            if self.db:
+                self.db.update_daily_revenue(date, time, new_revenue, new_shift_type)
 
             self.update_daily_revenue_table()
             self.save_data()
@@ -560,7 +874,11 @@ class ModernRevenueManagementUI:
             item = self.daily_revenue_table.item(selected_item)
             date, time, _, _ = item['values']
 
-            self.daily_revenue_data = [entry for entry in self.daily_revenue_data if not (entry[0] == datetime.strptime(date, "%Y-%m-%d").date() and entry[1] == time)]
+            i = self.find_entry_index(self.daily_revenue_data, datetime.strptime(date, "%Y-%m-%d").date(), time)
+            if i is not None:
+                self.aggregates.remove_revenue(self.daily_revenue_data.pop(i))
+            if self.db:
+                self.db.delete_daily_revenue(date, time)
             self.update_daily_revenue_table()
             self.save_data()
 
@@ -609,10 +927,16 @@ class ModernRevenueManagementUI:
             new_cost = float(cost_entry.get())
             new_payment_type = payment_type_var.get()
 
-            for i, entry in enumerate(self.supplier_costs_data):
-                if entry[0] == datetime.strptime(date, "%Y-%m-%d").date() and entry[1] == time:
-                    self.supplier_costs_data[i] = (entry[0], entry[1], new_supplier, new_goods_type, new_notes, new_cost, new_payment_type)
-                    break
+            i = self.find_entry_index(self.supplier_costs_data, datetime.strptime(date, "%Y-%m-%d").date(), time)
+            if i is not None:
+                entry = self.supplier_costs_data[i]
+                new_entry = (entry[0], entry[1], new_supplier, new_goods_type, new_notes, new_cost, new_payment_type)
+                self.supplier_costs_data[i] = new_entry
+                self.aggregates.remove_cost(entry)
+                self.aggregates.add_cost(new_entry)
+
+            if self.db:
+                self.db.update_supplier_cost(date, time, new_supplier, new_goods_type, new_notes, new_cost, new_payment_type)
 
             self.update_supplier_costs_table()
             self.save_data()
@@ -631,11 +955,16 @@ class ModernRevenueManagementUI:
             item = self.supplier_costs_table.item(selected_item)
             date, time, _, _, _, _, _ = item['values']
 
-            self.supplier_costs_data = [entry for entry in self.supplier_costs_data if not (entry[0] == datetime.strptime(date, "%Y-%m-%d").date() and entry[1] == time)]
+            i = self.find_entry_index(self.supplier_costs_data, datetime.strptime(date, "%Y-%m-%d").date(), time)
+            if i is not None:
+                self.aggregates.remove_cost(self.supplier_costs_data.pop(i))
+            if self.db:
+                self.db.delete_supplier_cost(date, time)
             self.update_supplier_costs_table()
             self.save_data()
 
 if __name__ == "__main__":
     root = tk.Tk()
+    get_persistence_worker().attach(root)
     app = ModernRevenueManagementUI(root)
     root.mainloop()
\ No newline at end of file
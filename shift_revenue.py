@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+
+from order_book import STATUS_DONE
+from order_events import ORDER_FORMAT
+from order_store import OrderFeed, STORAGE_BACKEND
+from persistence import get_persistence_worker, write_json_atomic
+from shifts import shift_for, DAY_SHIFT_START, NIGHT_SHIFT_START
+
+SHIFT_REVENUE_FILE = 'shift_revenue.json'
+
+
+class ShiftRevenueJob:
+    """Per-shift revenue derived from the finished ('ناجح') orders.
+
+    catch_up() runs on the persistence worker, right after the order appends
+    queued before it (and once at startup on the loader thread; runs never
+    overlap), and reads only the orders saved since the last run through an
+    OrderFeed.  The totals and the feed position are saved to
+    SHIFT_REVENUE_FILE, so a restart resumes from the stored position
+    instead of re-reading the history.  Changing the shift boundaries, the
+    storage backend or the history format starts the totals over.
+    """
+
+    def __init__(self, path=SHIFT_REVENUE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._catch_up_lock = threading.Lock()  # Two overlapping runs would count the same orders twice
+        self.settings = {'day_start': DAY_SHIFT_START, 'night_start': NIGHT_SHIFT_START,
+                         'backend': STORAGE_BACKEND, 'format': ORDER_FORMAT}
+        self.totals = {}  # (business date 'YYYY-MM-DD', shift name) -> [revenue, order_count]
+        position = self._load()
+        self.feed = OrderFeed(position=position, statuses=[STATUS_DONE])
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Error decoding JSON in {self.path}. Rebuilding shift revenue.")  # Debug print
+            return None
+        if state.get('settings') != self.settings:
+            print("Shift settings changed. Rebuilding shift revenue.")  # Debug print
+            return None
+        for day, shift, revenue, count in state.get('totals', []):
+            self.totals[(day, shift)] = [revenue, count]
+        return state.get('position')
+
+    def schedule(self):
+        # Coalesced: one pending catch-up covers every order saved before it runs
+        get_persistence_worker().submit(('shift_revenue',), self.catch_up)
+
+    def catch_up(self):
+        with self._catch_up_lock:
+            self._catch_up()
+
+    def _catch_up(self):
+        added = 0
+        for order in self.feed.read():
+            try:
+                business_date, shift = shift_for(order['datetime'])
+            except (KeyError, TypeError, ValueError):
+                print(f"Skipping order without a valid datetime: {order.get('order_number')}")
+                continue
+            with self._lock:
+                bucket = self.totals.setdefault((business_date.isoformat(), shift), [0.0, 0])
+                bucket[0] += order.get('total') or 0.0
+                bucket[1] += 1
+            added += 1
+        if added or not os.path.exists(self.path):
+            with self._lock:
+                totals = [[day, shift, revenue, count] for (day, shift), (revenue, count) in sorted(self.totals.items())]
+            write_json_atomic(self.path, {'settings': self.settings, 'position': self.feed.position,
+                                          'totals': totals})
+
+    def shift_totals(self):
+        # [(business date, shift name, revenue, order_count)] sorted by date
+        with self._lock:
+            return [(day, shift, revenue, count) for (day, shift), (revenue, count) in sorted(self.totals.items())]
+
+    def revenue_for(self, business_date, shift):
+        with self._lock:
+            return self.totals.get((business_date.isoformat(), shift), [0.0, 0])[0]
+
+
+_shift_revenue_job = None
+_shift_revenue_job_lock = threading.Lock()  # Also created by the startup loader thread
+
+
+def get_shift_revenue_job():
+    global _shift_revenue_job
+    if _shift_revenue_job is None:
+        with _shift_revenue_job_lock:
+            if _shift_revenue_job is None:
+                _shift_revenue_job = ShiftRevenueJob()
+    return _shift_revenue_job
@@ -0,0 +1,29 @@
+import os
+from datetime import datetime, timedelta
+
+DAY_SHIFT = "شفت النهار"
+NIGHT_SHIFT = "شفت الليل"
+
+# Shift start times as HH:MM, overridable with POS_DAY_SHIFT_START /
+# POS_NIGHT_SHIFT_START.  The night shift runs past midnight, so orders taken
+# before the day shift starts belong to the previous business day.
+DAY_SHIFT_START = os.environ.get('POS_DAY_SHIFT_START', '08:00')
+NIGHT_SHIFT_START = os.environ.get('POS_NIGHT_SHIFT_START', '17:00')
+
+
+def _minutes(hhmm):
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def shift_for(moment, day_start=DAY_SHIFT_START, night_start=NIGHT_SHIFT_START):
+    """Return (business_date, shift_name) for a datetime or 'YYYY-MM-DD HH:MM:SS' string."""
+    if isinstance(moment, str):
+        moment = datetime.strptime(moment, '%Y-%m-%d %H:%M:%S')
+    minute_of_day = moment.hour * 60 + moment.minute
+    day_minute, night_minute = _minutes(day_start), _minutes(night_start)
+    if day_minute <= minute_of_day < night_minute:
+        return moment.date(), DAY_SHIFT
+    if minute_of_day < day_minute:
+        return (moment - timedelta(days=1)).date(), NIGHT_SHIFT
+    return moment.date(), NIGHT_SHIFT
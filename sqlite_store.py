@@ -0,0 +1,453 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+from order_book import STATUS_DONE
+from order_events import RECORD_STATUS, normalize_history, order_record, status_event
+
+DB_FILE = 'pos.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_number INTEGER,
+    datetime TEXT,
+    status TEXT,
+    total REAL,
+    delivery_location TEXT,
+    phone_number TEXT,
+    delivery_fee REAL
+);
+CREATE TABLE IF NOT EXISTS order_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT,
+    order_number INTEGER,
+    status TEXT,
+    datetime TEXT
+);
+CREATE TABLE IF NOT EXISTS order_status (
+    order_id TEXT PRIMARY KEY,
+    status TEXT,
+    datetime TEXT,
+    event_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS order_lines (
+    order_id INTEGER NOT NULL REFERENCES orders(id),
+    name TEXT,
+    quantity INTEGER,
+    price REAL,
+    total REAL
+);
+CREATE TABLE IF NOT EXISTS current_orders (
+    order_number INTEGER PRIMARY KEY,
+    position INTEGER,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS daily_revenue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT,
+    time TEXT,
+    revenue REAL,
+    shift_type TEXT
+);
+CREATE TABLE IF NOT EXISTS supplier_costs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT,
+    time TEXT,
+    supplier TEXT,
+    goods_type TEXT,
+    notes TEXT,
+    cost REAL,
+    payment_type TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_orders_order_number ON orders(order_number);
+CREATE INDEX IF NOT EXISTS idx_orders_datetime ON orders(datetime);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
+CREATE INDEX IF NOT EXISTS idx_order_lines_order_id ON order_lines(order_id);
+CREATE INDEX IF NOT EXISTS idx_order_events_order_id ON order_events(order_id);
+CREATE INDEX IF NOT EXISTS idx_daily_revenue_date ON daily_revenue(date);
+CREATE INDEX IF NOT EXISTS idx_supplier_costs_date ON supplier_costs(date);
+"""
+
+# All statements are module-level constants with ? placeholders so sqlite3's
+# statement cache keeps them prepared for the lifetime of the connection
+INSERT_ORDER = """INSERT INTO orders (order_id, order_number, datetime, status, total, delivery_location, phone_number,
+delivery_fee) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+INSERT_ORDER_EVENT = "INSERT INTO order_events (order_id, order_number, status, datetime) VALUES (?, ?, ?, ?)"
+UPSERT_ORDER_STATUS = "INSERT OR REPLACE INTO order_status (order_id, status, datetime, event_id) VALUES (?, ?, ?, ?)"
+INSERT_ORDER_LINE = "INSERT INTO order_lines (order_id, name, quantity, price, total) VALUES (?, ?, ?, ?, ?)"
+SELECT_ORDER_LINES = "SELECT order_id, name, quantity, price, total FROM order_lines WHERE order_id IN ({}) ORDER BY rowid"
+
+SELECT_CURRENT_ORDERS = "SELECT data FROM current_orders ORDER BY position"
+DELETE_CURRENT_ORDERS = "DELETE FROM current_orders"
+INSERT_CURRENT_ORDER = "INSERT OR REPLACE INTO current_orders (order_number, position, data) VALUES (?, ?, ?)"
+
+SELECT_DAILY_REVENUE = "SELECT date, time, revenue, shift_type FROM daily_revenue ORDER BY date, time"
+INSERT_DAILY_REVENUE = "INSERT INTO daily_revenue (date, time, revenue, shift_type) VALUES (?, ?, ?, ?)"
+UPDATE_DAILY_REVENUE = "UPDATE daily_revenue SET revenue = ?, shift_type = ? WHERE date = ? AND time = ?"
+DELETE_DAILY_REVENUE = "DELETE FROM daily_revenue WHERE date = ? AND time = ?"
+TOTAL_DAILY_REVENUE = "SELECT COALESCE(SUM(revenue), 0) FROM daily_revenue"
+
+SELECT_SUPPLIER_COSTS = """SELECT date, time, supplier, goods_type, notes, cost, payment_type
+FROM supplier_costs ORDER BY date, time"""
+INSERT_SUPPLIER_COST = """INSERT INTO supplier_costs (date, time, supplier, goods_type, notes, cost, payment_type)
+VALUES (?, ?, ?, ?, ?, ?, ?)"""
+UPDATE_SUPPLIER_COST = """UPDATE supplier_costs SET supplier = ?, goods_type = ?, notes = ?, cost = ?, payment_type = ?
+WHERE date = ? AND time = ?"""
+DELETE_SUPPLIER_COST = "DELETE FROM supplier_costs WHERE date = ? AND time = ?"
+TOTAL_SUPPLIER_COSTS = "SELECT COALESCE(SUM(cost), 0) FROM supplier_costs"
+
+MONTHLY_TOTALS = """SELECT month, SUM(revenue), SUM(costs) FROM (
+    SELECT substr(date, 1, 7) AS month, revenue, 0 AS costs FROM daily_revenue
+    UNION ALL
+    SELECT substr(date, 1, 7) AS month, 0 AS revenue, cost AS costs FROM supplier_costs
+) GROUP BY month ORDER BY month"""
+
+# Orders are fetched in pages so iterating a year of history stays bounded
+ORDER_PAGE_SIZE = 500
+
+# The orders table holds each order as placed (status = initial status);
+# order_status is the materialized latest status, joined only when its event
+# is within the read's upper bound so a resumed read sees each change once
+ORDER_VIEW_COLUMNS = """o.id, o.order_id, o.order_number, o.datetime, {status}, {status_datetime}, o.total,
+o.delivery_location, o.phone_number, o.delivery_fee"""
+SCAN_NEW_ORDERS = """SELECT """ + ORDER_VIEW_COLUMNS.format(status="COALESCE(s.status, o.status)",
+                                                    status_datetime="s.datetime") + """
+FROM orders o LEFT JOIN order_status s ON s.order_id = o.order_id AND s.event_id <= ?
+WHERE o.id > ? AND o.id <= ? {where} ORDER BY o.id LIMIT ?"""
+SCAN_CHANGED_ORDERS = """SELECT e.id, """ + ORDER_VIEW_COLUMNS.format(status="e.status",
+                                                            status_datetime="e.datetime") + """
+FROM order_events e JOIN orders o ON o.order_id = e.order_id
+WHERE e.id > ? AND e.id <= ? AND o.id <= ? {where}
+AND NOT EXISTS (SELECT 1 FROM order_events later
+                WHERE later.order_id = e.order_id AND later.id > e.id AND later.id <= ?)
+ORDER BY e.id LIMIT ?"""
+
+
+class SQLiteStore:
+    """Optional SQLite backend for orders, current orders and revenue data.
+
+    Exposes the same order API as OrderJournalStore (append / scan /
+    iter_orders / end_position / load_all / find / sync / close) so it can be
+    swapped in by get_order_store(), plus the current-orders and revenue
+    helpers the GUIs use when POS_STORAGE_BACKEND=sqlite.
+    """
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._upgrade_schema()
+        self.conn.commit()
+        self.migrate_events()
+
+    def _upgrade_schema(self):
+        # Databases created before order events lack orders.order_id
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(orders)")]
+        if 'order_id' not in columns:
+            self.conn.execute("ALTER TABLE orders ADD COLUMN order_id TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders(order_id)")
+
+    # ----- orders -----------------------------------------------------------
+
+    def _insert_order(self, order):
+        order = order_record(order)
+        cursor = self.conn.execute(INSERT_ORDER, (
+            order['order_id'], order.get('order_number'), order.get('datetime'), order.get('status'), order.get('total'),
+            order.get('delivery_location'), order.get('phone_number'), order.get('delivery_fee')))
+        order_id = cursor.lastrowid
+        self.conn.executemany(INSERT_ORDER_LINE, [
+            (order_id, item.get('name'), item.get('quantity'), item.get('price'), item.get('total'))
+            for item in order.get('items', []) if isinstance(item, dict)])
+        return order_id
+
+    def _insert_event(self, event):
+        cursor = self.conn.execute(INSERT_ORDER_EVENT, (
+            event['order_id'], event.get('order_number'), event['status'], event.get('datetime')))
+        self.conn.execute(UPSERT_ORDER_STATUS, (event['order_id'], event['status'], event.get('datetime'),
+                                                cursor.lastrowid))
+
+    def append(self, order):
+        # A newly placed order; its status changes go through append_status()
+        with self._lock, self.conn:
+            self._insert_order(order)
+
+    def append_status(self, order_id, order_number, status, when=None):
+        with self._lock, self.conn:
+            self._insert_event(status_event(order_id, order_number, status, when))
+
+    def end_position(self):
+        # (last order row id, last event id)
+        with self._lock:
+            return (self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM orders").fetchone()[0],
+                    self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM order_events").fetchone()[0])
+
+    def _filters(self, status_expr, statuses, order_number, start, end):
+        clauses, params = [], []
+        if statuses:
+            # 'ملغي بواسطة' also matches 'ملغي بواسطة <user>'
+            status_clauses = [f"{status_expr} = ? OR {status_expr} LIKE ?"] * len(statuses)
+            if STATUS_DONE in statuses:
+                status_clauses.append(f"{status_expr} IS NULL")
+            clauses.append(f"({' OR '.join(status_clauses)})")
+            for status in statuses:
+                params.extend((status, status + ' %'))
+        if order_number is not None:
+            clauses.append("o.order_number = ?")
+            params.append(order_number)
+        if start is not None:
+            clauses.append("o.datetime >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("o.datetime < ?")
+            params.append(end)
+        return ''.join(f" AND {clause}" for clause in clauses), params
+
+    def _page_views(self, rows):
+        # rows: ORDER_VIEW_COLUMNS tuples; attaches the order lines in one query
+        ids = [row[0] for row in rows]
+        with self._lock:
+            lines = self.conn.execute(SELECT_ORDER_LINES.format(', '.join('?' * len(ids))), ids).fetchall()
+        items_by_order = {}
+        for order_id, name, quantity, price, total in lines:
+            items_by_order.setdefault(order_id, []).append(
+                {'name': name, 'quantity': quantity, 'price': price, 'total': total})
+        views = []
+        for row in rows:
+            view = {
+                'order_id': row[1],
+                'order_number': row[2],
+                'items': items_by_order.get(row[0], []),
+                'total': row[6],
+                'delivery_location': row[7],
+                'phone_number': row[8],
+                'delivery_fee': row[9],
+                'datetime': row[3],
+                'status': row[4],
+            }
+            if row[5] is not None:
+                view['status_datetime'] = row[5]
+            views.append(view)
+        return views
+
+    def scan(self, since=None, until=None, statuses=None, start=None, end=None, order_number=None):
+        # Same contract as OrderJournalStore.scan; a position is
+        # (order row id, event id).  Filtering happens in SQL on the indexed
+        # columns; rows come back one page at a time with their lines attached
+        until = tuple(until) if until is not None else self.end_position()
+        since_order, since_event = tuple(since) if since is not None else (0, 0)
+        until_order, until_event = until
+
+        where, params = self._filters("COALESCE(s.status, o.status)", statuses, order_number, start, end)
+        sql = SCAN_NEW_ORDERS.format(where=where)
+        last_id = since_order
+        while True:
+            with self._lock:
+                rows = self.conn.execute(sql, (until_event, last_id, until_order, *params,
+                                               ORDER_PAGE_SIZE)).fetchall()
+            if not rows:
+                break
+            for row, view in zip(rows, self._page_views(rows)):
+                yield (row[0], since_event), view
+            last_id = rows[-1][0]
+
+        if since is None:
+            return  # Every order already came with its latest status
+        # Orders placed before since whose status changed after it
+        where, params = self._filters("e.status", statuses, order_number, start, end)
+        sql = SCAN_CHANGED_ORDERS.format(where=where)
+        last_event = since_event
+        while True:
+            with self._lock:
+                rows = self.conn.execute(sql, (last_event, until_event, since_order, *params, until_event,
+                                               ORDER_PAGE_SIZE)).fetchall()
+            if not rows:
+                return
+            for row, view in zip(rows, self._page_views([row[1:] for row in rows])):
+                yield (until_order, row[0]), view
+            last_event = rows[-1][0]
+
+    def iter_orders(self, statuses=None, order_number=None, start=None, end=None):
+        for _, order in self.scan(statuses=statuses, start=start, end=end, order_number=order_number):
+            yield order
+
+    def load_all(self):
+        return list(self.iter_orders())
+
+    def find(self, order_number):
+        return list(self.iter_orders(order_number=order_number))
+
+    def sync(self):
+        with self._lock:
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+    # ----- current orders ---------------------------------------------------
+
+    def load_current_orders(self):
+        with self._lock:
+            return [json.loads(row[0]) for row in self.conn.execute(SELECT_CURRENT_ORDERS)]
+
+    def save_current_orders(self, orders):
+        with self._lock, self.conn:
+            self.conn.execute(DELETE_CURRENT_ORDERS)
+            self.conn.executemany(INSERT_CURRENT_ORDER, [
+                (order['order_number'], position, json.dumps(order, ensure_ascii=False))
+                for position, order in enumerate(orders)])
+
+    # ----- revenue ----------------------------------------------------------
+
+    def load_daily_revenue(self):
+        with self._lock:
+            return self.conn.execute(SELECT_DAILY_REVENUE).fetchall()
+
+    def load_supplier_costs(self):
+        with self._lock:
+            return self.conn.execute(SELECT_SUPPLIER_COSTS).fetchall()
+
+    def add_daily_revenue(self, entry_date, entry_time, revenue, shift_type):
+        with self._lock, self.conn:
+            self.conn.execute(INSERT_DAILY_REVENUE, (entry_date, entry_time, revenue, shift_type))
+
+    def update_daily_revenue(self, entry_date, entry_time, revenue, shift_type):
+        with self._lock, self.conn:
+            self.conn.execute(UPDATE_DAILY_REVENUE, (revenue, shift_type, entry_date, entry_time))
+
+    def delete_daily_revenue(self, entry_date, entry_time):
+        with self._lock, self.conn:
+            self.conn.execute(DELETE_DAILY_REVENUE, (entry_date, entry_time))
+
+    def add_supplier_cost(self, entry_date, entry_time, supplier, goods_type, notes, cost, payment_type):
+        with self._lock, self.conn:
+            self.conn.execute(INSERT_SUPPLIER_COST,
+                              (entry_date, entry_time, supplier, goods_type, notes, cost, payment_type))
+
+    def update_supplier_cost(self, entry_date, entry_time, supplier, goods_type, notes, cost, payment_type):
+        with self._lock, self.conn:
+            self.conn.execute(UPDATE_SUPPLIER_COST,
+                              (supplier, goods_type, notes, cost, payment_type, entry_date, entry_time))
+
+    def delete_supplier_cost(self, entry_date, entry_time):
+        with self._lock, self.conn:
+            self.conn.execute(DELETE_SUPPLIER_COST, (entry_date, entry_time))
+
+    def monthly_totals(self):
+        with self._lock:
+            return self.conn.execute(MONTHLY_TOTALS).fetchall()
+
+    def total_daily_revenue(self):
+        with self._lock:
+            return self.conn.execute(TOTAL_DAILY_REVENUE).fetchone()[0]
+
+    def total_supplier_costs(self):
+        with self._lock:
+            return self.conn.execute(TOTAL_SUPPLIER_COSTS).fetchone()[0]
+
+    # ----- migration --------------------------------------------------------
+
+    def migrate_events(self):
+        # Folds the old duplicated history (a full order row per status
+        # change) into order rows plus status events; see normalize_history
+        with self._lock:
+            if self.conn.execute("SELECT value FROM meta WHERE key = 'events_migrated'").fetchone():
+                return
+            rows = self.conn.execute("""SELECT id, order_number, datetime, status, total FROM orders
+ORDER BY id""").fetchall()
+            lines = {}
+            for order_id, name, quantity, price, total in self.conn.execute(
+                    "SELECT order_id, name, quantity, price, total FROM order_lines ORDER BY rowid"):
+                lines.setdefault(order_id, []).append(
+                    {'name': name, 'quantity': quantity, 'price': price, 'total': total})
+            history = ({'_row_id': row[0], 'order_number': row[1], 'datetime': row[2], 'status': row[3],
+                        'total': row[4], 'items': lines.get(row[0], [])} for row in rows)
+            events = 0
+            with self.conn:
+                for record, source in normalize_history(history):
+                    if record['type'] == RECORD_STATUS:
+                        self._insert_event(record)
+                        self.conn.execute("DELETE FROM order_lines WHERE order_id = ?", (source['_row_id'],))
+                        self.conn.execute("DELETE FROM orders WHERE id = ?", (source['_row_id'],))
+                        events += 1
+                    else:
+                        self.conn.execute("UPDATE orders SET order_id = ? WHERE id = ?",
+                                          (record['order_id'], source['_row_id']))
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('events_migrated', '1')")
+        if rows:
+            print(f"Migrated order history: {len(rows) - events} orders, {events} status events.")  # Debug print
+
+    def migrate_from_json(self, orders_source, current_orders_file='current_orders.json',
+                          revenue_file='revenue_management.json'):
+        with self._lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if done:
+            print("JSON data already migrated to SQLite.")
+            return
+
+        with self._lock, self.conn:
+            order_count = 0
+            for order in orders_source:
+                self._insert_order(order)
+                order_count += 1
+
+            current_orders = []
+            if os.path.exists(current_orders_file):
+                with open(current_orders_file, 'r', encoding='utf-8') as f:
+                    current_orders = json.load(f)
+            self.conn.execute(DELETE_CURRENT_ORDERS)
+            self.conn.executemany(INSERT_CURRENT_ORDER, [
+                (order['order_number'], position, json.dumps(order, ensure_ascii=False))
+                for position, order in enumerate(current_orders)])
+
+            revenue = {}
+            if os.path.exists(revenue_file):
+                with open(revenue_file, 'r', encoding='utf-8') as f:
+                    revenue = json.load(f)
+            self.conn.executemany(INSERT_DAILY_REVENUE,
+                                  [tuple(item[:4]) for item in revenue.get('daily_revenue', [])])
+            self.conn.executemany(INSERT_SUPPLIER_COST,
+                                  [tuple(item[:7]) for item in revenue.get('supplier_costs', [])])
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', '1')")
+
+        print(f"Migrated {order_count} orders, {len(current_orders)} current orders, "
+              f"{len(revenue.get('daily_revenue', []))} revenue rows and "
+              f"{len(revenue.get('supplier_costs', []))} supplier cost rows to {self.path}.")
+
+
+_sqlite_store = None
+
+
+def get_sqlite_store():
+    global _sqlite_store
+    if _sqlite_store is None:
+        _sqlite_store = SQLiteStore()
+    return _sqlite_store
+
+
+if __name__ == "__main__":
+    # python sqlite_store.py migrate   -- import orders, current orders and revenue JSON files
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        from order_store import OrderJournalStore
+
+        # The journal already holds the legacy orders.json after its one-time import
+        journal = OrderJournalStore()
+        journal.import_legacy()
+        store = get_sqlite_store()
+        store.migrate_from_json(journal.iter_orders())
+        journal.close()
+        store.close()
+    else:
+        print("Usage: python sqlite_store.py migrate")
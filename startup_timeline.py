@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+
+# One line per milestone is appended here
+STARTUP_LOG = os.environ.get('POS_STARTUP_LOG', 'startup_timeline.log')
+
+# Taken when pos_gui first imports this module, i.e. right at process start
+_STARTED = time.perf_counter()
+
+
+def _append_line(path, line):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line + '\n')
+
+
+class StartupTimeline:
+    """Phase timings from process start to the first order.
+
+    mark(phase) records the time since start (ms); it may be called from
+    any thread.  milestone(phase) also appends the whole timeline so far as
+    one line to STARTUP_LOG, e.g.
+
+        2024-09-15 13:28:59 pid=4242 first_paint: imports=180 login_shown=240 login=5300 ... first_paint=5420
+
+    The line is written on the persistence worker, so logging never slows
+    the startup it measures.  Marks are only printed after echo() (called
+    when the POS actually starts), so importing pos_gui stays quiet.  The login phase includes the time the cashier
+    takes to type, so compare the phases after 'login' across machines.
+    """
+
+    def __init__(self, path=STARTUP_LOG, started=_STARTED):
+        self.path = path
+        self.started = started
+        self.phases = []  # (phase, ms since start) in the order recorded
+        self.echoing = False
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        elapsed = (time.perf_counter() - self.started) * 1000
+        with self._lock:
+            if any(name == phase for name, _ in self.phases):
+                return  # Only the first occurrence counts (e.g. after a user switch)
+            self.phases.append((phase, elapsed))
+            echoing = self.echoing
+        if echoing:
+            print(f"Startup: {phase} at {elapsed:.0f} ms")  # Debug print
+
+    def echo(self):
+        # Print the phases so far, and every later mark as it happens
+        with self._lock:
+            self.echoing = True
+            phases = list(self.phases)
+        for phase, elapsed in phases:
+            print(f"Startup: {phase} at {elapsed:.0f} ms")  # Debug print
+
+    def milestone(self, phase):
+        with self._lock:
+            already = any(name == phase for name, _ in self.phases)
+        if already:
+            return
+        self.mark(phase)
+        with self._lock:
+            timings = ' '.join(f"{name}={elapsed:.0f}" for name, elapsed in self.phases)
+        line = f"{time.strftime('%Y-%m-%d %H:%M:%S')} pid={os.getpid()} {phase}: {timings}"
+        # Imported here so importing this module (pos_gui's first import) starts the clock before tkinter loads
+        from persistence import get_persistence_worker
+        get_persistence_worker().submit(None, _append_line, self.path, line)
+
+
+_timeline = None
+
+
+def get_startup_timeline():
+    global _timeline
+    if _timeline is None:
+        _timeline = StartupTimeline()
+    return _timeline
@@ -0,0 +1,201 @@
+import tkinter as tk
+from tkinter import ttk
+from itertools import islice
+
+
+class ListRowSource:
+    # Row source over an in-memory list
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def fetch(self, start, count):
+        return self.rows[start:start + count]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class PagedRowSource:
+    """Row source that pulls rows from an iterator one page at a time.
+
+    Rows are only read from the underlying iterator (e.g. an order store
+    query) when the table scrolls near them.  Until the iterator is exhausted
+    the reported length is "rows loaded so far + one page", which keeps the
+    scrollbar usable without knowing the final count.
+    """
+
+    def __init__(self, iterable, page_size=200):
+        self._iterator = iter(iterable)
+        self._rows = []
+        self.page_size = page_size
+        self.exhausted = False
+
+    def _load_until(self, end):
+        while not self.exhausted and len(self._rows) < end:
+            page = list(islice(self._iterator, self.page_size))
+            self._rows.extend(page)
+            if len(page) < self.page_size:
+                self.exhausted = True
+
+    def __len__(self):
+        self._load_until(self.page_size)
+        return len(self._rows) + (0 if self.exhausted else self.page_size)
+
+    def fetch(self, start, count):
+        self._load_until(start + count)
+        return self._rows[start:start + count]
+
+    def __iter__(self):
+        # Already loaded rows first, then the rest of the iterator
+        index = 0
+        while True:
+            self._load_until(index + 1)
+            if index >= len(self._rows):
+                return
+            yield self._rows[index]
+            index += 1
+
+
+class VirtualTable(tk.Frame):
+    """ttk.Treeview that only materializes the rows currently on screen.
+
+    A fixed pool of tree items (visible rows + a small buffer) is reused: on
+    scroll their values are rewritten from source.fetch(offset, n) instead of
+    inserting one item per row of data.  Any object with __len__ and
+    fetch(start, count) can be a source.
+
+    By default the selection is kept as row positions.  With row_key the
+    selection is kept as keys instead (e.g. the order number), so it stays on
+    the same record when rows are inserted or removed above it; the source
+    must then also provide get(key) and `key in source`, and keys that have
+    left the source are dropped from the selection on refresh.
+    """
+
+    def __init__(self, master, columns, format_row=None, buffer_rows=5, bg="#ffffff", row_key=None, **tree_kwargs):
+        super().__init__(master, bg=bg)
+        self.format_row = format_row or (lambda row: row)
+        self.row_key = row_key
+        self._rows_on_screen = []
+        self.buffer_rows = buffer_rows
+        self.source = ListRowSource([])
+        self.offset = 0
+        self._slots = []
+        self._selected_rows = set()
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', **tree_kwargs)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.tree.bind("<Configure>", lambda e: self.refresh())
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_mousewheel)
+        self.tree.bind("<Prior>", lambda e: self.scroll(-self._visible_count()) or "break")
+        self.tree.bind("<Next>", lambda e: self.scroll(self._visible_count()) or "break")
+
+    # ----- columns / data ---------------------------------------------------
+
+    def set_columns(self, columns, width=100, anchor="center"):
+        self.tree["columns"] = columns
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width, anchor=anchor)
+
+    def set_source(self, source):
+        self.source = source
+        self.offset = 0
+        self._selected_rows = set()
+        self.refresh()
+
+    # ----- rendering --------------------------------------------------------
+
+    def _visible_count(self):
+        style = ttk.Style()
+        row_height = int(style.lookup(self.tree.cget("style") or "Treeview", "rowheight") or 25)
+        height = self.tree.winfo_height()
+        if height <= 1:
+            height = int(self.tree.cget("height") or 10) * row_height
+        # One row's worth of space is taken by the headings
+        return max(1, height // row_height - 1)
+
+    def refresh(self):
+        total = len(self.source)
+        visible = self._visible_count()
+        self.offset = max(0, min(self.offset, total - visible))
+        rows = self.source.fetch(self.offset, visible + self.buffer_rows)
+        self._rows_on_screen = rows
+
+        for index, row in enumerate(rows):
+            values = self.format_row(row)
+            if index < len(self._slots):
+                self.tree.item(self._slots[index], values=values)
+            else:
+                self._slots.append(self.tree.insert("", "end", values=values))
+        if len(self._slots) > len(rows):
+            self.tree.delete(*self._slots[len(rows):])
+            del self._slots[len(rows):]
+
+        # Selection follows the data rows, not the reused tree items
+        if self.row_key:
+            self._selected_rows = {key for key in self._selected_rows if key in self.source}
+            selected = [slot for slot, row in zip(self._slots, rows) if self.row_key(row) in self._selected_rows]
+        else:
+            selected = [slot for index, slot in enumerate(self._slots) if self.offset + index in self._selected_rows]
+        self.tree.selection_set(selected)
+        self.tree.yview_moveto(0)
+
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + visible) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll(self, rows):
+        self.offset += rows
+        self.refresh()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.offset = int(float(amount) * len(self.source))
+            self.refresh()
+        elif action == "scroll":
+            step = self._visible_count() if unit == "pages" else 1
+            self.scroll(int(amount) * step)
+
+    def _on_mousewheel(self, event):
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self.scroll(-3)
+        else:
+            self.scroll(3)
+        return "break"
+
+    def _on_select(self, event=None):
+        selected = set(self.tree.selection())
+        if self.row_key:
+            on_screen = [self.row_key(row) for row in self._rows_on_screen]
+            self._selected_rows -= set(on_screen)
+            self._selected_rows |= {key for slot, key in zip(self._slots, on_screen) if slot in selected}
+            return
+        on_screen = {self.offset + index for index in range(len(self._slots))}
+        self._selected_rows -= on_screen
+        self._selected_rows |= {self.offset + index for index, slot in enumerate(self._slots) if slot in selected}
+
+    # ----- selection --------------------------------------------------------
+
+    def selected_rows(self):
+        if self.row_key:
+            rows = [self.source.get(key) for key in self._selected_rows]
+            return [row for row in rows if row is not None]
+        rows = []
+        for index in sorted(self._selected_rows):
+            fetched = self.source.fetch(index, 1)
+            if fetched:
+                rows.append(fetched[0])
+        return rows
+
+    def clear_selection(self):
+        self._selected_rows = set()
+        self.tree.selection_set([])